@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import sys
+import tomllib
+
+import pandas as pd
+
+from schema import HEADERS
+from importacao import IGNORAR, linhas_planilha, processar_pedaco
+from particoes import ano_atual, carregar_particoes, podar
+from fila import FilaEscrita
+from storage import obter_backend
+from coordenacao import CanalVersoes, CANAL_PATH_PADRAO
+
+# ==============================================================================
+# 🛰️ API DE INGESTÃO DE MATRÍCULAS (ASGI + CLI, SEM STREAMLIT)
+# ==============================================================================
+# Entrada para os sistemas das escolas mandarem matrículas sem passar pelo rerun do app:
+#   POST /matriculas  corpo: uma matrícula, uma lista, ou {"matriculas": [...]}
+#   GET  /saude       pendências da fila de escrita
+# Cada matrícula usa os nomes de HEADERS; "tipo_matricula" ("Nova Matrícula" ou "Rematrícula",
+# padrão Nova) e "unidade" escolhem a aba do ano letivo atual (ver particoes.py).
+# A validação é a mesma da importação em lote (importacao.processar_pedaco, com INSE em lote).
+# Requisições que chegam juntas são validadas num único DataFrame (micro-lote de alguns ms),
+# então o custo fixo do pandas é dividido entre elas. As linhas válidas vão para a FilaEscrita
+# e a resposta (202) sai na hora; o worker da fila envia ao backend e publica no canal de
+# versões, para as réplicas do painel sincronizarem.
+#
+# Uso:
+#   python api.py servir --porta 8502              (precisa do uvicorn)
+#   uvicorn --factory api:criar_app --port 8502
+#   python api.py enviar matriculas.json [--simular]
+# A configuração vem de .streamlit/secrets.toml ([storage], [particoes] e [api] token).
+
+SECRETS_PATH_PADRAO = os.path.join(".streamlit", "secrets.toml")
+TAMANHO_MAXIMO_CORPO = 5 * 1024 * 1024
+ESPERA_LOTE = 0.005
+MAXIMO_LOTE = 2000
+CONTROLE = {"tipo_matricula", "unidade"}
+TIPOS = {"nova matrícula": "novas", "nova matricula": "novas", "nova": "novas",
+         "rematrícula": "rematriculas", "rematricula": "rematriculas"}
+
+
+def carregar_config(caminho=SECRETS_PATH_PADRAO):
+    if not caminho or not os.path.exists(caminho):
+        return {}
+    with open(caminho, "rb") as f:
+        return tomllib.load(f)
+
+
+def _texto(valor):
+    # Mesmo formato que o formulário grava: listas (bens) viram "a, b"; nulos viram vazio
+    if valor is None:
+        return ""
+    if isinstance(valor, (list, tuple)):
+        return ", ".join(str(v) for v in valor)
+    return str(valor)
+
+
+def registros_do_corpo(corpo):
+    if isinstance(corpo, dict) and isinstance(corpo.get("matriculas"), list):
+        return corpo["matriculas"]
+    if isinstance(corpo, dict):
+        return [corpo]
+    if isinstance(corpo, list):
+        return corpo
+    raise ValueError("o corpo deve ser uma matrícula, uma lista ou {\"matriculas\": [...]}")
+
+
+class Ingestao:
+    # Validação + enfileiramento, síncrono; usado pelo serviço HTTP e pela CLI
+    def __init__(self, config, fila=None):
+        particoes = carregar_particoes(dict(config.get("particoes", {})))
+        self.particoes = podar(particoes, [ano_atual(particoes)])
+        self.fila = fila or FilaEscrita()
+
+    def _destino(self, registro):
+        tipo = TIPOS.get(str(registro.get("tipo_matricula") or "Nova Matrícula").strip().lower())
+        if tipo is None:
+            raise ValueError("tipo_matricula inválido")
+        unidade = registro.get("unidade")
+        particoes = [p for p in self.particoes if not unidade or p.unidade == unidade]
+        if not particoes:
+            raise ValueError(f"unidade desconhecida no ano letivo atual: {unidade}")
+        return getattr(particoes[0], tipo)
+
+    def processar(self, registros, simular=False):
+        # Devolve uma situação por registro, na ordem: ("aceita", aba) ou ("rejeitada", motivo)
+        situacoes, linhas, destinos = [None] * len(registros), [], []
+        for i, registro in enumerate(registros):
+            if not isinstance(registro, dict):
+                situacoes[i] = ("rejeitada", "matrícula não é um objeto JSON")
+                continue
+            try:
+                destinos.append((i, self._destino(registro)))
+            except ValueError as e:
+                situacoes[i] = ("rejeitada", str(e))
+                continue
+            linhas.append({c: _texto(v) for c, v in registro.items() if c not in CONTROLE})
+        if not linhas:
+            return situacoes
+
+        pedaco = pd.DataFrame(linhas, dtype=object).fillna("")
+        mapeamento = {c: c if c in HEADERS else IGNORAR for c in pedaco.columns}
+        validas, rejeitadas = processar_pedaco(pedaco, mapeamento)
+        for posicao, motivo in rejeitadas["motivo"].items():
+            situacoes[destinos[posicao][0]] = ("rejeitada", motivo)
+
+        abas = pd.Series([destinos[p][1] for p in validas.index], index=validas.index, dtype=object)
+        for tab_name, grupo in validas.groupby(abas, sort=False):
+            if not simular:
+                self.fila.enfileirar(tab_name, linhas_planilha(grupo))
+            for posicao in grupo.index:
+                situacoes[destinos[posicao][0]] = ("aceita", tab_name)
+        return situacoes
+
+
+def resumo(situacoes):
+    aceitas = {}
+    for situacao, detalhe in situacoes:
+        if situacao == "aceita":
+            aceitas[detalhe] = aceitas.get(detalhe, 0) + 1
+    return {
+        "recebidas": len(situacoes), "aceitas": sum(aceitas.values()), "abas": aceitas,
+        "rejeitadas": [{"indice": i, "motivo": d} for i, (s, d) in enumerate(situacoes) if s == "rejeitada"],
+    }
+
+
+class LoteAssincrono:
+    # Junta as requisições que chegam em ESPERA_LOTE e valida todas numa chamada, fora do loop
+    def __init__(self, ingestao, espera=ESPERA_LOTE, maximo=MAXIMO_LOTE):
+        self.ingestao = ingestao
+        self.espera = espera
+        self.maximo = maximo
+        self._fila = asyncio.Queue()
+        self._tarefa = None
+
+    async def processar(self, registros):
+        if self._tarefa is None:
+            self._tarefa = asyncio.get_running_loop().create_task(self._rodar())
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((registros, futuro))
+        return await futuro
+
+    async def _rodar(self):
+        while True:
+            pedidos = [await self._fila.get()]
+            total, limite = len(pedidos[0][0]), asyncio.get_running_loop().time() + self.espera
+            while total < self.maximo:
+                restante = limite - asyncio.get_running_loop().time()
+                try:
+                    pedido = self._fila.get_nowait() if restante <= 0 else await asyncio.wait_for(self._fila.get(), restante)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                pedidos.append(pedido)
+                total += len(pedido[0])
+            todos = [r for registros, _ in pedidos for r in registros]
+            try:
+                situacoes = await asyncio.to_thread(self.ingestao.processar, todos)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            inicio = 0
+            for registros, futuro in pedidos:
+                if not futuro.done():
+                    futuro.set_result(situacoes[inicio:inicio + len(registros)])
+                inicio += len(registros)
+
+
+class ServicoMatriculas:
+    # Aplicação ASGI pura (sem framework): qualquer servidor ASGI roda, e os testes chamam direto
+    def __init__(self, config=None, fila=None, backend=None, canal=None, iniciar_worker=True):
+        config = config if config is not None else carregar_config()
+        self.ingestao = Ingestao(config, fila)
+        self.token = dict(config.get("api", {})).get("token")
+        self.lote = LoteAssincrono(self.ingestao)
+        if canal is None:
+            try:
+                canal = CanalVersoes(dict(config.get("storage", {})).get("canal_path", CANAL_PATH_PADRAO))
+            except Exception:
+                canal = None
+        if iniciar_worker:
+            self.ingestao.fila.iniciar_worker(
+                (lambda: backend) if backend is not None else (lambda: obter_backend(config)),
+                ao_enviar=canal.publicar if canal is not None else None,
+            )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                mensagem = await receive()
+                if mensagem["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif mensagem["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        caminho, metodo = scope["path"].rstrip("/") or "/", scope["method"]
+        if not self._autorizado(scope):
+            return await _responder(send, 401, {"erro": "token inválido"})
+        if caminho == "/saude":
+            if metodo != "GET":
+                return await _responder(send, 405, {"erro": "use GET"})
+            fila = self.ingestao.fila
+            return await _responder(send, 200, {"pendentes": fila.pendentes(), "falhas": len(fila.falhas()),
+                                                "ultimo_erro": fila.ultimo_erro})
+        if caminho != "/matriculas":
+            return await _responder(send, 404, {"erro": "rota não encontrada"})
+        if metodo != "POST":
+            return await _responder(send, 405, {"erro": "use POST"})
+
+        corpo = await _ler_corpo(receive)
+        if corpo is None:
+            return await _responder(send, 413, {"erro": f"corpo maior que {TAMANHO_MAXIMO_CORPO} bytes"})
+        try:
+            registros = registros_do_corpo(json.loads(corpo))
+        except ValueError as e:
+            return await _responder(send, 400, {"erro": f"JSON inválido: {e}"})
+        if not registros:
+            return await _responder(send, 400, {"erro": "nenhuma matrícula no corpo"})
+        try:
+            situacoes = await self.lote.processar(registros)
+        except Exception as e:
+            return await _responder(send, 503, {"erro": f"não foi possível registrar agora: {e}"})
+        resultado = resumo(situacoes)
+        await _responder(send, 202 if resultado["aceitas"] else 422, resultado)
+
+    def _autorizado(self, scope):
+        if not self.token:
+            return True
+        cabecalhos = dict(scope.get("headers") or [])
+        return hmac.compare_digest(cabecalhos.get(b"authorization", b""), f"Bearer {self.token}".encode())
+
+
+async def _ler_corpo(receive):
+    partes, tamanho = [], 0
+    while True:
+        mensagem = await receive()
+        corpo = mensagem.get("body", b"")
+        tamanho += len(corpo)
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            return None
+        partes.append(corpo)
+        if not mensagem.get("more_body"):
+            return b"".join(partes)
+
+
+async def _responder(send, status, dados):
+    corpo = json.dumps(dados, ensure_ascii=False, default=str).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json; charset=utf-8"), (b"content-length", str(len(corpo)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+def criar_app(config=None):
+    return ServicoMatriculas(config)
+
+
+def _ler_arquivo(caminho):
+    with open(caminho, encoding="utf-8-sig") as f:
+        if caminho.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(l) for l in f if l.strip()]
+        return registros_do_corpo(json.load(f))
+
+
+def enviar(caminho, config, simular=False, tamanho=MAXIMO_LOTE):
+    # Valida e grava sem servidor: enfileira e esvazia a fila na hora, pelo mesmo caminho do worker
+    ingestao = Ingestao(config)
+    registros = _ler_arquivo(caminho)
+    situacoes = []
+    for inicio in range(0, len(registros), tamanho):
+        situacoes += ingestao.processar(registros[inicio:inicio + tamanho], simular)
+    resultado = resumo(situacoes)
+    if not simular and resultado["aceitas"]:
+        backend = obter_backend(config)
+        try:
+            canal = CanalVersoes(dict(config.get("storage", {})).get("canal_path", CANAL_PATH_PADRAO))
+        except Exception:
+            canal = None
+        while True:
+            tab_name, enviados = ingestao.fila.drenar_lote(backend)
+            if not enviados:
+                break
+            if canal is not None:
+                canal.publicar(tab_name)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão de matrículas sem o app Streamlit.")
+    parser.add_argument("--secrets", default=SECRETS_PATH_PADRAO, help="Arquivo TOML com [storage], [particoes] e [api].")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    servir = comandos.add_parser("servir", help="Sobe o serviço HTTP (ASGI via uvicorn).")
+    servir.add_argument("--host", default="127.0.0.1")
+    servir.add_argument("--porta", type=int, default=8502)
+    envio = comandos.add_parser("enviar", help="Valida e grava matrículas de um arquivo .json ou .jsonl.")
+    envio.add_argument("arquivo")
+    envio.add_argument("--simular", action="store_true", help="Só valida, não grava nada.")
+    args = parser.parse_args()
+    config = carregar_config(args.secrets)
+
+    if args.comando == "servir":
+        try:
+            import uvicorn
+        except ImportError:
+            sys.exit("O comando servir precisa do uvicorn (pip install uvicorn).")
+        uvicorn.run(ServicoMatriculas(config), host=args.host, port=args.porta, log_level="warning")
+        return
+
+    resultado = enviar(args.arquivo, config, args.simular)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    if not resultado["aceitas"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
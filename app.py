@@ -1,12 +1,29 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import numpy as np
 from datetime import datetime
 import plotly.express as px
-from faker import Faker
-import random
+import plotly.io as pio
 import os
+import time
+
+from schema import HEADERS, BAIRROS_MARICA, combinar_abas
+from storage import obter_backend, chave_backend
+from sync import SincronizadorDelta
+from snapshot import SnapshotDisco, SNAPSHOT_PATH_PADRAO
+from coordenacao import CanalVersoes, CANAL_PATH_PADRAO
+from diff import calcular_diff, EdicoesPendentes, ConflitoEdicao
+from fila import FilaEscrita
+import cubo as cubo_agregados
+import geo
+import particoes as particoes_mod
+from inse import calcular_inse, calcular_inse_batch
+from fake_data import gerar_linhas_fake
+import exportacao
+import importacao
+from duplicados import chave_duplicata, quase_duplicatas, BLOCOS
+import instrumentacao
+from instrumentacao import medir, etapa
 
 # --- Configuração da Página ---
 st.set_page_config(layout="wide", page_title="NAVE LÚCIO THOME | Dashboard", page_icon="🚀")
@@ -72,28 +89,6 @@ st.markdown(f"""
 # ==============================================================================
 
 PASSWORD = "NAVE2026"
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-
-HEADERS = [
-    "data_registro", "nm_estudante", "dt_nasc_estudante", "nm_responsavel", "dt_nasc_responsavel", 
-    "parentesco", "telefone", "email", "logradouro", "numero", "bairro", "municipio", "cep", 
-    "ano_serie", "turno", "escola_origem", "consentimento", "raca", "genero", 
-    "escolaridade_resp1", "escolaridade_resp2", "qtd_pessoas_domicilio", "qtd_banheiros", "bens", 
-    "livros_qtd", "bolsa_familia", "inse_pontos", "inse_classificacao", 
-    "pratica_local_estudo", "pratica_horario_fixo", "pratica_acompanhamento_pais", 
-    "pratica_leitura_compartilhada", "pratica_conversa_escola"
-]
-
-COORDENADAS_BAIRROS = {
-    "Araçatiba": {"lat": -22.9275, "lon": -42.8098}, "Bambuí": {"lat": -22.9231, "lon": -42.7482},
-    "Barra de Maricá": {"lat": -22.9567, "lon": -42.8374}, "Boqueirão": {"lat": -22.9224, "lon": -42.8336},
-    "Centro": {"lat": -22.9194, "lon": -42.8183}, "Cordeirinho": {"lat": -22.9602, "lon": -42.7561},
-    "Inoã": {"lat": -22.9188, "lon": -42.8712}, "Itaipuaçu": {"lat": -22.9658, "lon": -42.9242},
-    "Itapeba": {"lat": -22.9080, "lon": -42.8300}, "Ponta Negra": {"lat": -22.9610, "lon": -42.6930},
-    "São José do Imbassaí": {"lat": -22.9380, "lon": -42.8440}, "Ubatiba": {"lat": -22.8800, "lon": -42.7900}
-}
-BAIRROS_MARICA = sorted(list(COORDENADAS_BAIRROS.keys()))
-
 def login():
     st.markdown("### 🔒 Acesso Restrito NAVE")
     senha = st.text_input("Digite a senha de acesso:", type="password")
@@ -104,46 +99,59 @@ def login():
         else:
             st.error("Senha incorreta!")
 
+def _config_secrets():
+    try:
+        return st.secrets.to_dict()
+    except Exception:
+        return {}
+
+@medir("conexao")
 def get_spreadsheet_object():
+    # Retorna o backend configurado em [storage] (Google Sheets ou SQLite local), já autorizado e
+    # reaproveitado entre reruns; falhas não ficam em cache e são tentadas de novo no próximo rerun.
     try:
-        if "gsheets" in st.secrets:
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(st.secrets["gsheets"], SCOPES)
-        else:
-            creds = ServiceAccountCredentials.from_json_keyfile_name("rwilliammelo-7509a86c9df0.json", SCOPES)
-        client = gspread.authorize(creds)
-        return client.open_by_key("1lKH8BrZ0LVi_tufuv9_kEeOhJGLueSQahh-6Ft1_idA")
+        return obter_backend(_config_secrets())
     except Exception as e:
         st.error(f"Erro de Conexão: {e}")
         return None
 
 def init_headers(sh, tab_name):
     try:
-        ws = sh.worksheet(tab_name)
-        if not ws.acell('A1').value:
-            ws.append_row(HEADERS)
+        sh.init_headers(tab_name)
     except:
         pass
 
-def save_data(sh, tab_name, data):
+@medir("salvar_matricula")
+def save_data(tab_name, data):
+    # Grava no journal local e retorna na hora; o worker da fila envia em lotes (ver fila.py)
     try:
-        init_headers(sh, tab_name)
-        worksheet = sh.worksheet(tab_name)
-        worksheet.append_row(data)
+        get_fila().enfileirar(tab_name, [data])
+        return True
     except Exception as e:
         st.error(f"Erro ao salvar: {e}")
+        return False
 
-# --- NOVA FUNÇÃO: ATUALIZAR DADOS (EDITAR) ---
-def update_data(sh, tab_name, df):
+# --- ATUALIZAR DADOS (EDITAR): grava só as células, linhas novas e excluídas ---
+@medir("salvar_edicoes")
+def update_data(sh, tab_name, df_original, df_editado=None, diff=None):
+    # Aceita a tabela editada inteira (calcula o diff) ou um diff já montado pelo editor paginado
     try:
-        worksheet = sh.worksheet(tab_name)
-        worksheet.clear()
-        # Converte DataFrame para lista de listas (incluindo header)
-        # fillna("") evita erros de NaN no JSON do Google
-        dados_lista = [df.columns.values.tolist()] + df.fillna("").values.tolist()
-        worksheet.update(range_name='A1', values=dados_lista)
+        if diff is None:
+            diff = calcular_diff(df_original, df_editado)
+        if diff.vazio:
+            st.info("Nenhuma alteração para salvar.")
+            return False
+        sh.apply_diff(tab_name, diff)
+        get_sincronizador().marcar_alterada(tab_name, completa=True)
+        st.toast(f"Salvo: {diff.resumo()}")
         return True
+    except ConflitoEdicao as e:
+        # Nada foi gravado: recarrega a aba para mostrar o que a outra pessoa salvou
+        get_sincronizador().marcar_alterada(tab_name, completa=True)
+        st.error(f"Não salvo: {e}. Confira os dados atuais e refaça essas alterações.")
+        return False
     except Exception as e:
-        st.error(f"Erro ao atualizar planilha: {e}")
+        st.error(f"Erro ao atualizar planilha (nenhuma alteração foi aplicada): {e}")
         return False
 
 def check_password():
@@ -151,97 +159,182 @@ def check_password():
         st.session_state.password_correct = False
     return st.session_state.password_correct
 
-@st.cache_data(ttl=60)
+@st.cache_resource
+def get_sincronizador():
+    # DataFrames locais compartilhados entre sessões, atualizados por delta (ver sync.py) e
+    # espelhados em disco para reinícios e quedas da API (ver snapshot.py). O canal avisa as
+    # outras réplicas do app quando esta grava (ver coordenacao.py)
+    config = _config_secrets()
+    opcoes = dict(config.get("storage", {}))
+    pasta = opcoes.get("snapshot_path", SNAPSHOT_PATH_PADRAO)
+    try:
+        canal = CanalVersoes(opcoes.get("canal_path", CANAL_PATH_PADRAO))
+    except Exception:
+        canal = None
+    return SincronizadorDelta(ttl=60, snapshot=SnapshotDisco(pasta, origem=chave_backend(config)), canal=canal)
+
+@st.cache_resource
+def get_fila():
+    fila = FilaEscrita()
+    config = _config_secrets()
+    fila.iniciar_worker(lambda: obter_backend(config), ao_enviar=get_sincronizador().marcar_alterada)
+    return fila
+
+@medir("carregar_aba")
 def load_data_cached(tab_name):
+    # Sem conexão (sh None) o sincronizador ainda serve a última cópia em memória ou em disco
+    # Devolve (DataFrame, versão desse DataFrame)
     sh = get_spreadsheet_object()
-    if not sh: return pd.DataFrame()
     try:
-        init_headers(sh, tab_name)
-        worksheet = sh.worksheet(tab_name)
-        data = worksheet.get_all_records()
-        return pd.DataFrame(data)
+        tabelas, versoes = get_sincronizador().obter_varias(sh, [tab_name])
+        return tabelas[tab_name], versoes[tab_name]
     except:
-        return pd.DataFrame()
-
-def calcular_inse(escolaridade1, escolaridade2, bens, banheiros, qtd_pessoas):
-    pontos = 0
-    mapa_escolaridade = {
-        "Não alfabetizado": 0, "Fundamental Incompleto": 1, "Fundamental Completo": 2,
-        "Médio Incompleto": 3, "Médio Completo": 4, "Superior Incompleto": 5, "Superior Completo": 6,
-        "Não informado": 0
-    }
-    pontos += mapa_escolaridade.get(escolaridade1, 0) * 2
-    if escolaridade2: pontos += mapa_escolaridade.get(escolaridade2, 0)
-    
-    if isinstance(bens, str): lista_bens = bens.split(",")
-    elif isinstance(bens, list): lista_bens = bens
-    else: lista_bens = []
-        
-    pontos += len(lista_bens)
-    pontos += int(banheiros) * 2
-    if "Carro" in lista_bens: pontos += 3
-    if "Computador/Notebook" in lista_bens: pontos += 2
-    
-    classificacao = ""
-    if pontos <= 5: classificacao = "Baixo"
-    elif pontos <= 10: classificacao = "Médio-Baixo"
-    elif pontos <= 18: classificacao = "Médio"
-    elif pontos <= 25: classificacao = "Médio-Alto"
-    else: classificacao = "Alto"
-    return pontos, classificacao
-
-def agrupar_raca(df):
-    if 'raca' not in df.columns: return df
-    df['raca_grupo'] = df['raca'].apply(lambda x: "Negra (Preta+Parda)" if x in ["Preta", "Parda"] else x)
-    return df
+        return pd.DataFrame(), None
 
-def generate_fake_data(sh, qtd=10):
-    fake = Faker('pt_BR')
-    rows_novas, rows_rematriculas = [], []
-    init_headers(sh, "Novas_Matriculas")
-    init_headers(sh, "Rematriculas")
-
-    for _ in range(qtd):
-        tipo = random.choice(["Nova", "Rematricula"])
-        esc1 = random.choice(["Fundamental Completo", "Médio Completo", "Superior Completo"])
-        esc2 = random.choice(["", "Fundamental Completo", "Médio Completo"])
-        bens_lista = random.sample(["TV", "Geladeira", "Máquina de Lavar", "Carro", "Computador/Notebook", "Internet Wifi", "Ar Condicionado"], k=random.randint(1, 7))
-        bens_str = ", ".join(bens_lista)
-        banheiros = random.randint(1, 3)
-        qtd_pessoas = random.randint(2, 7)
-        pontos, inse_class = calcular_inse(esc1, esc2, bens_lista, banheiros, qtd_pessoas)
-        bairro_escolhido = random.choice(BAIRROS_MARICA)
-        raca_fake = random.choice(["Branca", "Preta", "Parda", "Indígena"])
-
-        dados_comuns_inicio = [
-            fake.date_time_this_year().strftime("%Y-%m-%d %H:%M:%S"),
-            fake.name(), str(fake.date_of_birth(minimum_age=6, maximum_age=15)),
-            fake.name(), str(fake.date_of_birth(minimum_age=25, maximum_age=60)),
-            random.choice(["Mãe", "Pai", "Avó"]), fake.phone_number(), fake.email(),
-            fake.street_name(), fake.building_number(), bairro_escolhido, "Maricá", fake.postcode(),
-            f"{random.randint(1, 9)}º Ano", random.choice(["Manhã", "Tarde"])
-        ]
-        
-        dados_comuns_fim = [
-            "Sim", raca_fake, random.choice(["Masculino", "Feminino"]),
-            esc1, esc2, qtd_pessoas, banheiros, bens_str,
-            random.choice(["0-10", "11-50", "Mais de 100"]), random.choice(["Sim", "Não"]),
-            pontos, inse_class,
-            random.choice(["Nunca", "Às vezes", "Sempre"]),
-            random.choice(["Nunca", "Às vezes", "Sempre"]),
-            random.choice(["Raramente", "Semanalmente", "Diariamente"]),
-            random.choice(["Raramente", "Semanalmente", "Diariamente"]),
-            random.choice(["Raramente", "Semanalmente", "Diariamente"])
-        ]
-        
-        if tipo == "Nova":
-            rows_novas.append(dados_comuns_inicio + [f"Escola {fake.last_name()}"] + dados_comuns_fim)
+@st.cache_resource
+def obter_particoes():
+    # Partições (ano letivo, unidade) -> abas, de [particoes] no secrets.toml (ver particoes.py)
+    return particoes_mod.carregar_particoes(dict(_config_secrets().get("particoes", {})))
+
+def particoes_do_ano(unidade=None):
+    particoes = obter_particoes()
+    return particoes_mod.podar(particoes, [particoes_mod.ano_atual(particoes)], [unidade] if unidade else None)
+
+def rotulos_abas():
+    # {aba: "2026 · Unidade · Novas"} para os seletores de aba, da partição mais recente para a mais antiga
+    return {t: f"{p.rotulo} · {'Novas' if t == p.novas else 'Rematrículas'}" for p in reversed(obter_particoes()) for t in p.tabs}
+
+@medir("carregar_abas")
+def carregar_abas(tabs):
+    # Todas as abas de uma vez: carga fria num único batchGet (ver SincronizadorDelta.obter_varias).
+    # Devolve ({aba: DataFrame}, chave de versão): a chave é a dos DataFrames entregues, lidos juntos
+    sh = get_spreadsheet_object()
+    try:
+        tabelas, versoes = get_sincronizador().obter_varias(sh, list(tabs))
+    except Exception:
+        return {tab_name: pd.DataFrame() for tab_name in tabs}, (tuple(tabs), None)
+    return tabelas, (tuple(tabs), tuple(versoes[t] for t in tabs))
+
+COLUNAS_GRAFICOS = [
+    "ano_serie", "turno", "inse_classificacao", "bolsa_familia", "escolaridade_resp1",
+    "qtd_pessoas_domicilio", "livros_qtd", "pratica_local_estudo", "pratica_horario_fixo",
+    "pratica_acompanhamento_pais", "pratica_leitura_compartilhada", "pratica_conversa_escola", "bairro"
+]
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def obter_dados_tipados(versao, _tabelas):
+    # Concat + esquema tipado uma vez por versão dos dados (os DataFrames não entram na chave).
+    # cache_resource não copia o resultado a cada rerun: trate-o como somente leitura.
+    with etapa("tipagem", linhas=sum(len(df) for df in _tabelas.values())):
+        return combinar_abas(_tabelas, particoes_mod.colunas_por_aba(obter_particoes()))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_agregado(particao, versao, _tabelas):
+    # Resumo de uma partição, recalculado só quando as abas dela mudam de versão
+    with etapa("agregado_particao", linhas=sum(len(_tabelas.get(t, [])) for t in particao.tabs)):
+        return particoes_mod.agregar(particao, _tabelas)
+
+@st.cache_resource
+def get_agregados_fechados():
+    opcoes = dict(_config_secrets().get("storage", {}))
+    return particoes_mod.AgregadosDisco(opcoes.get("agregados_path", particoes_mod.AGREGADOS_PATH_PADRAO), origem=chave_backend(_config_secrets()))
+
+def agregados_particoes(particoes):
+    # Só o ano atual passa pelo sincronizador (abas brutas, revalidadas); os encerrados vêm do disco
+    atual = particoes_mod.ano_atual(obter_particoes())
+    abertas = [p for p in particoes if p.ano >= atual]
+    agregados = agregados_fechados([p for p in particoes if p.ano < atual])
+    if abertas:
+        tabelas, (tabs, versoes) = carregar_abas(particoes_mod.tabs_de(abertas))
+        versoes = dict(zip(tabs, versoes or [None] * len(tabs)))
+        agregados.update({p: obter_agregado(p, tuple(versoes[t] for t in p.tabs), tabelas) for p in abertas})
+    return agregados
+
+def agregados_fechados(particoes):
+    # Chave de cada agregado: os contadores do canal das abas da partição. Uma escrita do app numa
+    # aba de ano encerrado (Admin, importação) muda o contador e o resumo é refeito numa leitura
+    # avulsa do backend, que não fica no sincronizador nem é revalidada depois.
+    if not particoes:
+        return {}
+    disco, canal = get_agregados_fechados(), get_sincronizador().canal
+    try:
+        versoes = canal.versoes(particoes_mod.tabs_de(particoes)) if canal is not None else {}
+    except Exception:
+        versoes = {}
+    agregados, faltam = {}, []
+    for p in particoes:
+        chave = [versoes.get(t) for t in p.tabs]
+        agregado = disco.carregar(p, chave)
+        if agregado is None:
+            faltam.append((p, chave))
         else:
-            rows_rematriculas.append(dados_comuns_inicio + [f"7{random.randint(10, 99)}"] + dados_comuns_fim)
-            
-    if rows_novas: sh.worksheet("Novas_Matriculas").append_rows(rows_novas)
-    if rows_rematriculas: sh.worksheet("Rematriculas").append_rows(rows_rematriculas)
-    st.cache_data.clear()
+            agregados[p] = agregado
+    sh = get_spreadsheet_object()
+    if faltam and sh is not None:
+        with etapa("agregados_fechados"):
+            try:
+                tabelas = sh.read_many(particoes_mod.tabs_de([p for p, _ in faltam]))
+            except Exception:
+                return agregados
+            for p, chave in faltam:
+                agregados[p] = particoes_mod.agregar(p, tabelas)
+                disco.salvar(p, chave, agregados[p])
+    return agregados
+
+@st.cache_resource
+def obter_ceps():
+    # Tabela versionada (cep,lat,lon) para posicionar endereços fora dos bairros conhecidos
+    return geo.carregar_ceps(dict(_config_secrets().get("geo", {})).get("ceps_path", geo.CEPS_PATH_PADRAO))
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def obter_cubo(versao, _df_total):
+    # Como obter_dados_tipados: sem cópia nem pickle a cada rerun; o cubo é somente leitura
+    with etapa("cubo", linhas=len(_df_total)):
+        cubo = cubo_agregados.construir_cubo(_df_total, COLUNAS_GRAFICOS)
+    if cubo:
+        with etapa("camada_geo", linhas=len(_df_total)):
+            cubo[geo.GEO] = geo.construir_camada(_df_total, cubo_agregados.DIMENSOES_FILTRO, obter_ceps())
+    return cubo
+
+def buscar_duplicata(chave, tabs):
+    # Só o índice em memória e as chaves recém-enfileiradas: o envio do formulário não espera
+    # sincronização (a revalidação das abas do ano roda em segundo plano)
+    return get_sincronizador().buscar_duplicata(chave, tabs, get_spreadsheet_object())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def contar_repetidos(versao, tabs):
+    # Cadastros além do primeiro em cada grupo de chave igual (rematrícula em outro ano não conta)
+    return sum(len(locais) - 1 for locais in get_sincronizador().duplicatas_exatas(tabs).values())
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def obter_quase_duplicatas(versao, bloco, _tabelas):
+    with etapa("quase_duplicatas", linhas=sum(len(df) for df in _tabelas.values())):
+        return quase_duplicatas(_tabelas, bloco)
+
+def aviso_atualizacao(tabs):
+    situacao = get_sincronizador().situacao(*tabs)
+    if not situacao:
+        return
+    momentos = [s[0] for s in situacao.values() if s[0]]
+    idade = time.time() - min(momentos) if momentos else None
+    texto_idade = "agora" if idade is None or idade < 60 else f"há {int(idade // 60)} min" if idade < 3600 else f"há {idade / 3600:.1f} h"
+    erros = sorted({s[2] for s in situacao.values() if s[2]})
+    if erros:
+        st.warning(f"Sem acesso à planilha agora ({'; '.join(erros)}). Mostrando a última cópia boa, de {texto_idade}.")
+    elif any(s[1] == "snapshot" for s in situacao.values()):
+        st.caption(f"🕒 Cópia salva em disco, de {texto_idade} · atualizando em segundo plano")
+    elif any(s[3] for s in situacao.values()):
+        st.caption(f"🕒 Dados de {texto_idade} · atualizando em segundo plano")
+
+def generate_fake_data(sh, qtd=10):
+    particao = particoes_do_ano()[0]
+    init_headers(sh, particao.novas)
+    init_headers(sh, particao.rematriculas)
+    rows_novas, rows_rematriculas = gerar_linhas_fake(qtd)
+    if rows_novas: sh.append_rows(particao.novas, rows_novas)
+    if rows_rematriculas: sh.append_rows(particao.rematriculas, rows_rematriculas)
+    for tab_name in particao.tabs:
+        get_sincronizador().marcar_alterada(tab_name)
 
 # ==============================================================================
 # 📊 3. FUNÇÕES VISUAIS
@@ -259,52 +352,369 @@ def gamified_card(title, value, icon, color_key):
     </div>
     """, unsafe_allow_html=True)
 
-def apply_theme_plotly(fig):
+def apply_theme_plotly(fig, tema=None):
+    t = themes[tema] if tema else current_theme
     fig.update_layout(
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
-        font={'color': current_theme['text'], 'family': 'Poppins, sans-serif'},
-        title_font={'size': 18, 'color': current_theme['text'], 'family': 'Poppins, sans-serif', 'weight': 700},
-        legend={'font': {'color': current_theme['text']}, 'bgcolor': 'rgba(0,0,0,0)', 'title': {'font': {'color': current_theme['text']}}},
-        xaxis={'tickfont': {'color': current_theme['text_secondary']}, 'title_font': {'color': current_theme['text']}, 'gridcolor': current_theme['border']},
-        yaxis={'tickfont': {'color': current_theme['text_secondary']}, 'title_font': {'color': current_theme['text']}, 'gridcolor': current_theme['border']}
+        font={'color': t['text'], 'family': 'Poppins, sans-serif'},
+        title_font={'size': 18, 'color': t['text'], 'family': 'Poppins, sans-serif', 'weight': 700},
+        legend={'font': {'color': t['text']}, 'bgcolor': 'rgba(0,0,0,0)', 'title': {'font': {'color': t['text']}}},
+        xaxis={'tickfont': {'color': t['text_secondary']}, 'title_font': {'color': t['text']}, 'gridcolor': t['border']},
+        yaxis={'tickfont': {'color': t['text_secondary']}, 'title_font': {'color': t['text']}, 'gridcolor': t['border']}
     )
     return fig
 
-def plot_analise_completa(df, coluna, titulo, ordem=None):
-    if coluna not in df.columns:
+# ==============================================================================
+# 📈 FIGURAS JÁ SERIALIZADAS
+# ==============================================================================
+# O st.plotly_chart valida e serializa a figura a cada rerun (~1 ms por gráfico, dezenas por
+# página). As figuras em cache guardam o JSON pronto, que vai direto no elemento do Streamlit.
+try:
+    from streamlit.elements.plotly_chart import PlotlyChartProto, LayoutConfig, current_form_id, compute_and_register_element_id
+except ImportError:
+    PlotlyChartProto = None
+
+def serializar_figura(fig):
+    altura = fig.layout.height if isinstance(fig.layout.height, (int, float)) and fig.layout.height > 0 else 450
+    return pio.to_json(fig, validate=False), int(altura)
+
+def mostrar_grafico(figura):
+    spec, altura = figura
+    if PlotlyChartProto is None:
+        st.plotly_chart(pio.from_json(spec), use_container_width=True)
         return
-
-    st.markdown(f"#### {titulo}")
-    if ordem:
-        if "Não informado" in df[coluna].unique() and "Não informado" not in ordem:
-             ordem.append("Não informado")
-        cat_existentes = [x for x in ordem if x in df[coluna].unique()]
-        if cat_existentes:
-            df[coluna] = pd.Categorical(df[coluna], categories=cat_existentes, ordered=True)
-            df = df.sort_values(coluna)
-
-    c1, c2 = st.columns(2)
-    with c1:
-        df_uni = df[coluna].value_counts().reset_index()
-        df_uni.columns = [coluna, 'count']
+    proto = PlotlyChartProto(spec=spec, config="{}", theme="streamlit", form_id=current_form_id(st._main))
+    proto.id = compute_and_register_element_id(
+        "plotly_chart", user_key=None, key_as_main_identity=False, dg=st._main, plotly_spec=spec, plotly_config="{}",
+        selection_mode=("points", "box", "lasso"), is_selection_activated=False, theme="streamlit", width="stretch", height="content", alt=None)
+    st._main._enqueue("plotly_chart", proto, layout_config=LayoutConfig(width="stretch", height=altura))
+
+def chave_figuras(versao, filtros):
+    # (versão dos dados, seleção dos filtros, tema): identifica um conjunto de figuras já montado
+    return versao, tuple((k, tuple(sorted(map(str, v)))) for k, v in filtros.items()), st.session_state.theme
+
+@st.cache_resource(max_entries=512, show_spinner=False)
+def figuras_analise(chave, coluna, titulo, ordem, _cubo):
+    # Figuras montadas, tematizadas e serializadas uma vez por chave; trocar filtro ou tema de volta reaproveita
+    versao, filtros, tema = chave
+    with etapa("montar_figuras"):
+        df = cubo_agregados.tabela(_cubo, coluna, dict(filtros))
+        category_orders = {}
+        if ordem:
+            valores = set(df[coluna].unique())
+            ordem = list(ordem) + ["Não informado"] if "Não informado" in valores and "Não informado" not in ordem else list(ordem)
+            cat_existentes = [x for x in ordem if x in valores]
+            if cat_existentes:
+                category_orders = {coluna: cat_existentes}
+        cores = themes[tema]['chart_colors']
+
+        df_uni = cubo_agregados.contagem(df, coluna)
         fig1 = px.bar(df_uni, x=coluna, y='count', text_auto=True, title=f"Total Absoluto: {titulo}",
-                      color_discrete_sequence=[current_theme['chart_colors'][0]])
-        st.plotly_chart(apply_theme_plotly(fig1), use_container_width=True)
-
-    with c2:
-        df_bi = df.groupby([coluna, 'raca_grupo']).size().reset_index(name='count')
-        total_por_raca = df_bi.groupby('raca_grupo')['count'].transform('sum')
-        df_bi['percent'] = (df_bi['count'] / total_por_raca) * 100
-        df_bi['label'] = df_bi.apply(lambda x: f"{x['percent']:.1f}% (N={x['count']})", axis=1)
-        
+                      category_orders=category_orders, color_discrete_sequence=[cores[0]])
+
+        df_bi = cubo_agregados.contagem_por_raca(df, coluna)
         fig2 = px.bar(df_bi, x=coluna, y='percent', color='raca_grupo', barmode='group',
                       text='label', title=f"Perfil por Raça (% dentro do grupo)",
-                      color_discrete_sequence=current_theme['chart_colors'])
+                      category_orders=category_orders, color_discrete_sequence=cores)
         fig2.update_layout(yaxis_title="% do Grupo Racial")
-        st.plotly_chart(apply_theme_plotly(fig2), use_container_width=True)
+        return serializar_figura(apply_theme_plotly(fig1, tema)), serializar_figura(apply_theme_plotly(fig2, tema))
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def figura_mapa(chave, _cubo):
+    # Mapa de calor sobre a grade pré-agregada: poucas centenas de células, seja qual for o nº de alunos
+    versao, filtros, tema = chave
+    with etapa("mapa"):
+        pontos, por_precisao = geo.densidade(cubo_agregados.filtrar(_cubo[geo.GEO], dict(filtros)))
+        if pontos.empty:
+            return None, por_precisao
+        fig_map = px.density_mapbox(pontos, lat="lat", lon="lon", z="count", radius=35, zoom=10.5,
+                                    center={"lat": geo.CENTRO_MUNICIPIO["lat"], "lon": geo.CENTRO_MUNICIPIO["lon"]},
+                                    color_continuous_scale=["#FFC0CB", "#BE185D", "#4B0082"], mapbox_style="open-street-map",
+                                    hover_data={"count": True}, title="Matrículas por Bairro")
+        return serializar_figura(apply_theme_plotly(fig_map, tema)), por_precisao
+
+@medir("grafico")
+def plot_analise_completa(cubo, chave, coluna, titulo, ordem=None):
+    if coluna not in cubo:
+        return
+
+    st.markdown(f"#### {titulo}")
+    fig1, fig2 = figuras_analise(chave, coluna, titulo, tuple(ordem) if ordem else None, cubo)
+    c1, c2 = st.columns(2)
+    with c1, etapa("plotly_envio"):
+        mostrar_grafico(fig1)
+    with c2, etapa("plotly_envio"):
+        mostrar_grafico(fig2)
     st.markdown("---")
 
+def editor_paginado(sh, tab_name, df, versao):
+    # Filtro, busca, ordenação e paginação no servidor: só a página atual vai para o navegador.
+    # As edições de cada página ficam em EdicoesPendentes até o "Salvar". `versao` é a do `df`.
+    chave_pendentes = f"pendentes_{tab_name}"
+    if chave_pendentes not in st.session_state:
+        st.session_state[chave_pendentes] = EdicoesPendentes(versao)
+    pendentes = st.session_state[chave_pendentes]
+    if pendentes.vazio:
+        # Sem nada pendente, a edição começa na versão atual (ex.: logo depois de salvar)
+        pendentes.versao = versao
+
+    b1, b2, b3 = st.columns([2, 2, 2])
+    busca = b1.text_input("🔎 Buscar estudante:", key=f"busca_{tab_name}")
+    sel_bairro = b2.multiselect("Bairro:", sorted(df['bairro'].astype(str).unique()) if 'bairro' in df.columns else [], key=f"bairro_{tab_name}")
+    sel_serie = b3.multiselect("Série:", sorted(df['ano_serie'].astype(str).unique()) if 'ano_serie' in df.columns else [], key=f"serie_{tab_name}")
+    o1, o2, o3 = st.columns([2, 1, 1])
+    ordenar_por = o1.selectbox("Ordenar por:", ["(ordem da planilha)", "nm_estudante", "bairro", "ano_serie", "data_registro"], key=f"ordem_{tab_name}")
+    decrescente = o2.toggle("Decrescente", key=f"desc_{tab_name}")
+    por_pagina = o3.selectbox("Linhas/página:", [25, 50, 100, 250], index=1, key=f"tam_{tab_name}")
+
+    mask = np.ones(len(df), dtype=bool)
+    if busca and 'nm_estudante' in df.columns:
+        mask &= df['nm_estudante'].astype(str).str.contains(busca, case=False, regex=False).to_numpy()
+    if sel_bairro: mask &= df['bairro'].astype(str).isin(sel_bairro).to_numpy()
+    if sel_serie: mask &= df['ano_serie'].astype(str).isin(sel_serie).to_numpy()
+    indice = df.index[mask]
+    if ordenar_por in df.columns:
+        indice = df.loc[indice, ordenar_por].astype(str).sort_values(ascending=not decrescente, kind="stable").index
+    elif decrescente:
+        indice = indice[::-1]
+
+    total_paginas = max(1, -(-len(indice) // por_pagina))
+    if st.session_state.get(f"pagina_{tab_name}", 1) > total_paginas:
+        st.session_state[f"pagina_{tab_name}"] = total_paginas
+    pagina = st.number_input(f"Página (de {total_paginas}):", 1, total_paginas, 1, key=f"pagina_{tab_name}")
+    indice_pagina = indice[(pagina - 1) * por_pagina:pagina * por_pagina]
+    df_pagina = pendentes.aplicar(df.loc[indice_pagina])
+    st.caption(f"{len(indice)} registro(s) encontrados · mostrando {len(df_pagina)}")
+
+    # A chave muda a cada edição registrada: o editor recomeça limpo sobre a página já atualizada
+    geracao = st.session_state.get(f"geracao_{tab_name}", 0)
+    chave_editor = f"editor_{tab_name}_{geracao}"
+    st.data_editor(df_pagina, use_container_width=True, num_rows="dynamic", key=chave_editor)
+    estado_editor = st.session_state.get(chave_editor, {})
+    if pendentes.registrar(df_pagina.index, estado_editor, df):
+        st.session_state[f"geracao_{tab_name}"] = geracao + 1
+        st.rerun()
+
+    # Linhas sendo adicionadas ficam no editor até salvar; entram no diff direto do estado do editor
+    adicionadas = pendentes.adicionadas(estado_editor)
+    if not pendentes.vazio or adicionadas:
+        diff = pendentes.montar_diff(df, adicionadas)
+        st.info(f"Alterações pendentes: {diff.resumo()}")
+        if pendentes.versao != versao:
+            st.warning("A tabela mudou desde que você começou a editar. Confira as alterações antes de salvar.")
+        s1, s2 = st.columns([1, 4])
+        if s1.button("💾 Salvar Alterações na Nuvem", type="primary"):
+            with st.spinner("Atualizando Google Sheets..."):
+                if update_data(sh, tab_name, df, diff=diff):
+                    st.session_state[chave_pendentes] = EdicoesPendentes(versao)
+                    st.session_state[f"geracao_{tab_name}"] = geracao + 1
+                    st.success("Planilha atualizada com sucesso!")
+                    st.rerun()
+        if s2.button("↩️ Descartar alterações"):
+            st.session_state[chave_pendentes] = EdicoesPendentes(versao)
+            st.session_state[f"geracao_{tab_name}"] = geracao + 1
+            st.rerun()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def gerar_exportacao(chave, formato, titulo, texto, _pedacos):
+    # Só roda quando alguém pede o arquivo; a chave inclui a versão dos dados, então repetir
+    # o download (ou outra sessão pedir o mesmo arquivo) sai do cache
+    with etapa(f"exportar_{formato.lower()}"):
+        return exportacao.exportar(_pedacos(), formato, titulo, texto)
+
+def botao_exportacao(chave, titulo, pedacos, texto=False):
+    # `pedacos` é uma função que devolve o iterável de DataFrames; nada é lido antes do clique.
+    # `texto=True` para abas cruas: o Parquet grava tudo como texto, como está na planilha
+    c1, c2 = st.columns([1, 3])
+    formato = c1.selectbox("Formato:", list(exportacao.FORMATOS), key=f"formato_{titulo}")
+    pedido = (chave, formato)
+    prontas = st.session_state.setdefault("exportacoes_prontas", set())
+    if pedido not in prontas:
+        if not c2.button("📦 Preparar arquivo", key=f"preparar_{titulo}"):
+            return
+        prontas.add(pedido)
+    try:
+        with st.spinner("Gerando arquivo..."):
+            dados = gerar_exportacao(chave, formato, titulo, texto, pedacos)
+    except Exception as e:
+        prontas.discard(pedido)
+        st.error(f"Erro ao exportar: {e}")
+        return
+    extensao, mime = exportacao.FORMATOS[formato]
+    c2.download_button(f"⬇️ Baixar {formato}", dados, f"{titulo}.{extensao}", mime, key=f"baixar_{titulo}")
+
+def pagina_importacao(sh):
+    st.title("📥 Importação em Lote")
+    st.caption("Listas de matrícula em CSV ou XLSX: as colunas são mapeadas, os valores validados e o INSE calculado antes de gravar.")
+    rotulos = rotulos_abas()
+    tab_destino = st.selectbox("Destino:", list(rotulos), format_func=rotulos.get, key="import_destino",
+                               index=list(rotulos).index(particoes_do_ano()[0].rematriculas))
+    arquivo = st.file_uploader("Arquivo CSV ou XLSX", type=["csv", "xlsx"], key="import_arquivo")
+    if arquivo is None:
+        return
+
+    try:
+        amostra = next(importacao.ler_pedacos(arquivo, arquivo.name, tamanho=3), pd.DataFrame())
+    except Exception as e:
+        st.error(f"Não foi possível ler o arquivo: {e}")
+        return
+    finally:
+        arquivo.seek(0)
+
+    st.markdown("**Mapeamento de colunas** (ajuste o destino de cada coluna do arquivo)")
+    sugerido = importacao.sugerir_mapeamento(list(amostra.columns))
+    df_mapa = pd.DataFrame({
+        "coluna_arquivo": list(sugerido),
+        "exemplo": [str(amostra[c].iloc[0]) if len(amostra) else "" for c in sugerido],
+        "destino": list(sugerido.values()),
+    })
+    df_mapa = st.data_editor(
+        df_mapa, hide_index=True, use_container_width=True, disabled=["coluna_arquivo", "exemplo"],
+        column_config={"destino": st.column_config.SelectboxColumn("destino", options=[importacao.IGNORAR] + HEADERS, required=True)},
+        key=f"mapa_{arquivo.file_id}",
+    )
+    mapeamento = dict(zip(df_mapa["coluna_arquivo"], df_mapa["destino"]))
+    destinos = [d for d in mapeamento.values() if d != importacao.IGNORAR]
+    repetidos = sorted({d for d in destinos if destinos.count(d) > 1})
+    if repetidos:
+        st.error(f"Mais de uma coluna do arquivo aponta para: {', '.join(repetidos)}")
+        return
+    if "nm_estudante" not in destinos:
+        st.warning("Nenhuma coluna mapeada para nm_estudante: todas as linhas seriam rejeitadas.")
+        return
+
+    c1, c2 = st.columns([1, 1])
+    simular = c1.button("🔍 Validar sem gravar")
+    gravar = c2.button(f"📥 Importar para {tab_destino}", type="primary")
+    if simular or gravar:
+        total = importacao.contar_linhas(arquivo, arquivo.name)
+        barra = st.progress(0.0, text="Lendo arquivo...")
+        verbo = "gravadas" if gravar else "válidas"
+        na_fila = []
+
+        def ao_progredir(lidas, gravadas):
+            barra.progress(min(lidas / total, 1.0), text=f"{lidas} linha(s) lidas · {gravadas} {verbo}")
+
+        def gravar_lote(linhas):
+            # Lote que o backend recusar vai para o journal da fila e é reenviado pelo worker
+            try:
+                sh.append_rows(tab_destino, linhas)
+            except Exception:
+                get_fila().enfileirar(tab_destino, linhas)
+                na_fila.append(len(linhas))
+
+        with etapa("importacao") as info:
+            n, rejeitadas = importacao.importar(
+                importacao.ler_pedacos(arquivo, arquivo.name), mapeamento,
+                gravar=gravar_lote if gravar else None, ao_progredir=ao_progredir,
+            )
+            info["linhas"] = n
+        if gravar:
+            get_sincronizador().marcar_alterada(tab_destino)
+        st.session_state["import_resultado"] = {
+            "arquivo": arquivo.file_id, "gravar": gravar, "linhas": n, "na_fila": sum(na_fila), "rejeitadas": rejeitadas,
+        }
+
+    resultado = st.session_state.get("import_resultado")
+    if resultado and resultado["arquivo"] == arquivo.file_id:
+        if resultado["gravar"]:
+            st.success(f"{resultado['linhas']} linha(s) importadas para {tab_destino}.")
+            if resultado["na_fila"]:
+                st.warning(f"{resultado['na_fila']} linha(s) ficaram na fila de escrita e serão enviadas em seguida.")
+        else:
+            st.info(f"Simulação: {resultado['linhas']} linha(s) válidas, nada foi gravado.")
+        rejeitadas = resultado["rejeitadas"]
+        if not rejeitadas.empty:
+            st.error(f"{len(rejeitadas)} linha(s) rejeitadas.")
+            st.dataframe(rejeitadas.head(500), use_container_width=True, hide_index=True)
+            st.download_button("⬇️ Relatório de rejeitadas (CSV)", rejeitadas.to_csv(index=False).encode("utf-8"),
+                               "rejeitadas.csv", "text/csv")
+
+def painel_duplicatas():
+    with st.expander("👯 Possíveis duplicatas (Novas + Rematrículas do ano letivo atual)", expanded=False):
+        tabs = particoes_mod.tabs_de(particoes_do_ano())
+        tabelas, versao = carregar_abas(tabs)
+        exatas = get_sincronizador().duplicatas_exatas(tabs)
+        st.markdown(f"**Mesmo nome, nascimento e telefone:** {len(exatas)} grupo(s)")
+        if exatas:
+            st.dataframe(pd.DataFrame(
+                [(chave, tab, pos + 2) for chave, locais in exatas.items() for tab, pos in locais],
+                columns=["chave", "aba", "linha_planilha"],
+            ), use_container_width=True, hide_index=True)
+
+        st.markdown("**Nomes parecidos** (comparados só dentro de cada bloco)")
+        d1, d2 = st.columns([2, 1])
+        bloco = d1.selectbox("Agrupar por:", list(BLOCOS), key="bloco_duplicatas")
+        if d2.button("🔎 Procurar parecidos"):
+            st.session_state["procurar_duplicatas"] = True
+        if st.session_state.get("procurar_duplicatas"):
+            with st.spinner("Comparando nomes..."):
+                pares, ignorados = obter_quase_duplicatas(versao, bloco, tabelas)
+            st.caption(f"{len(pares)} par(es) encontrados" + (f" · {ignorados} bloco(s) grandes demais foram ignorados" if ignorados else ""))
+            st.dataframe(pares, use_container_width=True, hide_index=True)
+
+def painel_desempenho():
+    with st.expander("⏱️ Desempenho (instrumentação)", expanded=False):
+        cota = instrumentacao.uso_cota()
+        q1, q2 = st.columns(2)
+        for col, (tipo, (usadas, limite)) in zip([q1, q2], cota.items()):
+            with col:
+                st.metric(f"Cota Sheets: {tipo}s no último minuto", f"{usadas} / {limite}")
+                st.progress(min(usadas / limite, 1.0))
+
+        df_resumo = instrumentacao.resumo()
+        if df_resumo.empty:
+            st.info("Nenhuma etapa medida ainda.")
+            return
+        st.markdown("**p50/p95 por etapa** (últimos registros do buffer)")
+        st.dataframe(df_resumo, use_container_width=True)
+
+        df_reg = instrumentacao.registros()
+        ultimo = df_reg['rerun'].dropna().max()
+        if pd.notna(ultimo):
+            st.markdown(f"**Último rerun (#{int(ultimo)})**")
+            st.dataframe(df_reg[df_reg['rerun'] == ultimo][['etapa', 'duracao_ms', 'linhas', 'chamadas_api']].round(2), use_container_width=True)
+
+        e1, e2, e3 = st.columns(3)
+        e1.download_button("⬇️ Log JSON", instrumentacao.exportar("json"), "instrumentacao.json", "application/json")
+        e2.download_button("⬇️ Log CSV", instrumentacao.exportar("csv"), "instrumentacao.csv", "text/csv")
+        if e3.button("🧹 Limpar medições"):
+            instrumentacao.limpar()
+            st.rerun()
+
+def secao_evolucao(particoes):
+    # Comparativo entre anos a partir dos agregados por partição (cada um em cache pela versão das suas abas)
+    st.caption("Todos os anos letivos das unidades escolhidas; os filtros de série, bairro e INSE não se aplicam aqui.")
+    with st.spinner("Resumindo os anos letivos..."):
+        agregados = agregados_particoes(particoes)
+
+    df_ret = particoes_mod.retencao(particoes, agregados)
+    st.markdown("**Retenção: alunos de um ano que se rematricularam no ano seguinte**")
+    if df_ret.empty:
+        st.info("É preciso ter dois anos letivos seguidos da mesma unidade para calcular a retenção.")
+    else:
+        df_ret["periodo"] = df_ret["de"].astype(str) + "→" + df_ret["para"].astype(str)
+        fig = px.bar(df_ret, x="periodo", y="retencao_pct", color="unidade", barmode="group", text="retencao_pct",
+                     labels={"periodo": "", "retencao_pct": "% rematriculados"})
+        st.plotly_chart(apply_theme_plotly(fig), use_container_width=True)
+        st.dataframe(df_ret.drop(columns="periodo"), use_container_width=True, hide_index=True)
+
+    df_inse = particoes_mod.tendencia_inse(particoes, agregados)
+    st.markdown("**INSE ao longo dos anos**")
+    if df_inse.empty:
+        st.info("Sem classificação INSE nos anos letivos escolhidos.")
+        return
+    ordem = ["Baixo", "Médio-Baixo", "Médio", "Médio-Alto", "Alto"]
+    df_inse["ano"] = df_inse["ano_letivo"].astype(str)
+    fig = px.bar(df_inse, x="ano", y="percent", color="inse_classificacao", facet_col="unidade" if df_inse["unidade"].nunique() > 1 else None,
+                 category_orders={"inse_classificacao": ordem}, labels={"ano": "Ano letivo", "percent": "%", "inse_classificacao": "INSE"})
+    st.plotly_chart(apply_theme_plotly(fig), use_container_width=True)
+    medias = df_inse.drop_duplicates(["ano_letivo", "unidade"])
+    fig = px.line(medias, x="ano", y="inse_pontos_medio", color="unidade", markers=True,
+                  labels={"ano": "Ano letivo", "inse_pontos_medio": "Pontos INSE (média)"})
+    st.plotly_chart(apply_theme_plotly(fig), use_container_width=True)
+
 # ==============================================================================
 # 🚀 4. INTERFACE PRINCIPAL
 # ==============================================================================
@@ -322,100 +732,115 @@ def main():
             st.toggle('🌗', value=(st.session_state.theme == 'dark'), on_change=toggle_theme)
         
         st.title("Painel de dados de matrícula da NAVE")
-        page = st.radio("Navegação:", ["Dashboard", "Formulário de Matrícula", "Administração"])
+        page = st.radio("Navegação:", ["Dashboard", "Formulário de Matrícula", "Importação em Lote", "Administração"])
     
     sh = get_spreadsheet_object()
-    if not sh: return
+    # Sem conexão o Dashboard usa o snapshot em disco e o formulário grava no journal da fila
+    if not sh and page not in ("Dashboard", "Formulário de Matrícula"): return
 
     if page == "Dashboard":
         st.title("🚀 NAVE LÚCIO THOME: ESTUDANTES A DECOLAR")
         st.markdown(f"Modo: **{st.session_state.theme.title()}** | Sistema de Monitorização")
 
         if st.button("🔄 Atualizar Dados"):
-            st.cache_data.clear()
+            get_sincronizador().marcar_todas(completa=True)
+            get_agregados_fechados().descartar()
             st.rerun()
 
-        df_novas = load_data_cached("Novas_Matriculas")
-        df_rematriculas = load_data_cached("Rematriculas")
-        
-        if not df_novas.empty: df_novas['tipo_matricula'] = 'Nova Matrícula'
-        if not df_rematriculas.empty: df_rematriculas['tipo_matricula'] = 'Rematrícula'
-        df_total = pd.concat([df_novas, df_rematriculas], ignore_index=True)
-        
-        df_total = agrupar_raca(df_total)
-
-        if df_total.empty:
+        # Só as partições escolhidas aqui são lidas; anos anteriores ficam fora da carga
+        particoes = obter_particoes()
+        p1, p2 = st.columns(2)
+        sel_anos = p1.multiselect("Ano letivo:", sorted({p.ano for p in particoes}, reverse=True), default=[particoes_mod.ano_atual(particoes)])
+        sel_unidades = p2.multiselect("Unidade:", sorted({p.unidade for p in particoes}))
+        tabs = particoes_mod.tabs_de(particoes_mod.podar(particoes, sel_anos, sel_unidades))
+        tabelas, versao = carregar_abas(tabs)
+        aviso_atualizacao(tabs)
+        df_total = obter_dados_tipados(versao, tabelas)
+        cubo = obter_cubo(versao, df_total)
+
+        if not cubo:
             st.warning("Sem dados. Gere dados de teste na aba Administração.")
         else:
             with st.expander("🔍 Filtros Avançados", expanded=False):
                 st.markdown('<div class="filter-box">', unsafe_allow_html=True)
                 f1, f2, f3 = st.columns(3)
                 with f1:
-                    opcoes_serie = sorted(df_total['ano_serie'].astype(str).unique()) if 'ano_serie' in df_total.columns else []
-                    sel_serie = st.multiselect("Série:", options=opcoes_serie)
+                    sel_serie = st.multiselect("Série:", options=cubo_agregados.opcoes(cubo, 'ano_serie'))
                 with f2:
-                    opcoes_bairro = sorted(df_total['bairro'].astype(str).unique()) if 'bairro' in df_total.columns else []
-                    sel_bairro = st.multiselect("Bairro:", options=opcoes_bairro)
+                    sel_bairro = st.multiselect("Bairro:", options=cubo_agregados.opcoes(cubo, 'bairro'))
                 with f3:
-                    opcoes_inse = sorted(df_total['inse_classificacao'].astype(str).unique()) if 'inse_classificacao' in df_total.columns else []
-                    sel_inse = st.multiselect("INSE:", options=opcoes_inse)
+                    sel_inse = st.multiselect("INSE:", options=cubo_agregados.opcoes(cubo, 'inse_classificacao'))
                 st.markdown('</div>', unsafe_allow_html=True)
 
-            df_filtered = df_total.copy()
-            if sel_serie: df_filtered = df_filtered[df_filtered['ano_serie'].isin(sel_serie)]
-            if sel_bairro: df_filtered = df_filtered[df_filtered['bairro'].isin(sel_bairro)]
-            if sel_inse: df_filtered = df_filtered[df_filtered['inse_classificacao'].isin(sel_inse)]
+            filtros = {'ano_serie': sel_serie, 'bairro': sel_bairro, 'inse_classificacao': sel_inse}
+            kpis = cubo_agregados.indicadores(cubo_agregados.filtrar(cubo[cubo_agregados.BASE], filtros))
 
-            if df_filtered.empty:
+            if kpis['total'] == 0:
                 st.warning("Filtro retornou vazio.")
             else:
                 c1, c2, c3, c4 = st.columns(4)
-                with c1: gamified_card("Total Alunos", len(df_filtered), "🎓", 'primary')
-                with c2: gamified_card("Novas", len(df_filtered[df_filtered['tipo_matricula'] == 'Nova Matrícula']), "✨", 'primary')
-                with c3: gamified_card("Rematrículas", len(df_filtered[df_filtered['tipo_matricula'] == 'Rematrícula']), "🛡️", 'primary')
-                inse_moda = df_filtered['inse_classificacao'].mode()[0] if 'inse_classificacao' in df_filtered.columns and not df_filtered['inse_classificacao'].mode().empty else "N/A"
-                with c4: gamified_card("Nível INSE Típico", inse_moda, "📊", 'primary')
+                with c1: gamified_card("Total Alunos", kpis['total'], "🎓", 'primary')
+                with c2: gamified_card("Novas", kpis['novas'], "✨", 'primary')
+                with c3: gamified_card("Rematrículas", kpis['rematriculas'], "🛡️", 'primary')
+                with c4: gamified_card("Nível INSE Típico", kpis['inse_moda'], "📊", 'primary')
+                repetidos = contar_repetidos(versao, tabs)
+                if repetidos:
+                    st.caption(f"⚠️ {repetidos} cadastro(s) repetidos (mesmo nome, nascimento e telefone) entram no total. Veja em Administração.")
+
+                with st.expander("📦 Exportar visão filtrada (Novas + Rematrículas)", expanded=False):
+                    botao_exportacao(
+                        ("combinado", versao, chave_figuras(versao, filtros)[1]), "Matriculas_filtradas",
+                        lambda: exportacao.fatiar(cubo_agregados.filtrar(df_total, filtros)),
+                    )
 
                 st.markdown("---")
 
-                tab1, tab2, tab3, tab4, tab5 = st.tabs(["📈 Visão Geral", "💰 Socioeconômico", "🏠 Estrutura & Bens", "👨‍👩‍👧‍👦 Práticas Familiares", "🗺️ Mapa"])
+                # Só a seção escolhida é montada; st.tabs montaria as cinco a cada rerun
+                secao = st.radio("Seção:", ["📈 Visão Geral", "💰 Socioeconômico", "🏠 Estrutura & Bens", "👨‍👩‍👧‍👦 Práticas Familiares", "🗺️ Mapa", "📆 Evolução"], horizontal=True, key="secao_dashboard", label_visibility="collapsed")
+                chave = chave_figuras(versao, filtros)
 
-                with tab1:
-                    plot_analise_completa(df_filtered, "ano_serie", "Matrículas por Série", ordem=[f"{i}º Ano" for i in range(1,10)])
-                    plot_analise_completa(df_filtered, "turno", "Distribuição por Turno")
+                if secao == "📈 Visão Geral":
+                    plot_analise_completa(cubo, chave, "ano_serie", "Matrículas por Série", ordem=[f"{i}º Ano" for i in range(1,10)])
+                    plot_analise_completa(cubo, chave, "turno", "Distribuição por Turno")
 
-                with tab2:
-                    plot_analise_completa(df_filtered, "inse_classificacao", "INSE (Nível Socioeconômico)", ordem=["Baixo", "Médio-Baixo", "Médio", "Médio-Alto", "Alto"])
-                    plot_analise_completa(df_filtered, "bolsa_familia", "Bolsa Família")
-                    plot_analise_completa(df_filtered, "escolaridade_resp1", "Escolaridade Resp. 1", ordem=["Não informado", "Não alfabetizado", "Fundamental Incompleto", "Fundamental Completo", "Médio Incompleto", "Médio Completo", "Superior Incompleto", "Superior Completo"])
+                elif secao == "💰 Socioeconômico":
+                    plot_analise_completa(cubo, chave, "inse_classificacao", "INSE (Nível Socioeconômico)", ordem=["Baixo", "Médio-Baixo", "Médio", "Médio-Alto", "Alto"])
+                    plot_analise_completa(cubo, chave, "bolsa_familia", "Bolsa Família")
+                    plot_analise_completa(cubo, chave, "escolaridade_resp1", "Escolaridade Resp. 1", ordem=["Não informado", "Não alfabetizado", "Fundamental Incompleto", "Fundamental Completo", "Médio Incompleto", "Médio Completo", "Superior Incompleto", "Superior Completo"])
 
-                with tab3:
-                    if 'qtd_pessoas_domicilio' in df_filtered.columns:
-                        plot_analise_completa(df_filtered, "qtd_pessoas_domicilio", "Pessoas no Domicílio")
-                    if 'livros_qtd' in df_filtered.columns:
-                        plot_analise_completa(df_filtered, "livros_qtd", "Quantidade de Livros em Casa", ordem=["Não informado", "0-10", "11-50", "Mais de 100"])
+                elif secao == "🏠 Estrutura & Bens":
+                    plot_analise_completa(cubo, chave, "qtd_pessoas_domicilio", "Pessoas no Domicílio")
+                    plot_analise_completa(cubo, chave, "livros_qtd", "Quantidade de Livros em Casa", ordem=["Não informado", "0-10", "11-50", "Mais de 100"])
 
-                with tab4:
+                elif secao == "👨‍👩‍👧‍👦 Práticas Familiares":
                     opcoes_freq = ["Não informado", "Nunca", "Raramente", "Às vezes", "Frequentemente", "Sempre", "Semanalmente", "Diariamente"]
                     for col_db, pergunta in {'pratica_local_estudo': 'Local adequado?', 'pratica_horario_fixo': 'Horário fixo?', 'pratica_acompanhamento_pais': 'Pais ajudam?', 'pratica_leitura_compartilhada': 'Leitura em família?', 'pratica_conversa_escola': 'Conversam sobre escola?'}.items():
-                        plot_analise_completa(df_filtered, col_db, pergunta, ordem=opcoes_freq)
-
-                with tab5:
-                    if 'bairro' in df_filtered.columns:
-                        df_mapa = df_filtered['bairro'].value_counts().reset_index()
-                        df_mapa.columns = ['bairro', 'count']
-                        df_mapa['lat'] = df_mapa['bairro'].apply(lambda x: COORDENADAS_BAIRROS.get(x, {}).get('lat'))
-                        df_mapa['lon'] = df_mapa['bairro'].apply(lambda x: COORDENADAS_BAIRROS.get(x, {}).get('lon'))
-                        df_mapa = df_mapa.dropna(subset=['lat', 'lon'])
-                        if not df_mapa.empty:
-                            fig_map = px.scatter_mapbox(df_mapa, lat="lat", lon="lon", hover_name="bairro", size="count", color="count", color_continuous_scale=["#FFC0CB", "#BE185D", "#4B0082"], size_max=40, zoom=10.5, mapbox_style="open-street-map", title="Geolocalização (Centróide)")
-                            st.plotly_chart(apply_theme_plotly(fig_map), use_container_width=True)
+                        plot_analise_completa(cubo, chave, col_db, pergunta, ordem=opcoes_freq)
+
+                elif secao == "🗺️ Mapa":
+                    if geo.GEO in cubo:
+                        fig_map, por_precisao = figura_mapa(chave, cubo)
+                        if fig_map is not None:
+                            mostrar_grafico(fig_map)
+                        rotulos = {"bairro": "pelo nome do bairro", "cep": "pelo CEP"}
+                        contagens = " · ".join(f"{n} {rotulos[p]}" for p, n in por_precisao.items() if p in rotulos)
+                        if obter_ceps():
+                            st.caption(f"📍 Posição aproximada ({contagens}): CEPs da tabela da escola têm coordenada própria, o resto fica no centro do bairro.")
+                        else:
+                            st.caption(f"📍 Precisão de bairro ({contagens}): cada matrícula é contada no centro do seu bairro, não no endereço.")
+                        if por_precisao.get("sem_posicao"):
+                            st.caption(f"⚠️ {por_precisao['sem_posicao']} matrícula(s) sem bairro nem CEP reconhecidos ficam fora do mapa.")
+
+                elif secao == "📆 Evolução":
+                    secao_evolucao(particoes_mod.podar(particoes, None, sel_unidades))
 
     elif page == "Formulário de Matrícula":
         st.title("📝 Nova Matrícula")
+        particoes_ano = particoes_do_ano()
         with st.container():
             st.markdown('<div class="filter-box">', unsafe_allow_html=True)
             tipo_matricula = st.radio("Tipo:", ["Nova Matrícula", "Rematrícula"], horizontal=True)
+            particao = st.selectbox("Unidade:", particoes_ano, format_func=lambda p: p.unidade) if len(particoes_ano) > 1 else particoes_ano[0]
             st.markdown('</div>', unsafe_allow_html=True)
         st.write("") 
         with st.form("matricula_form"):
@@ -439,10 +864,12 @@ def main():
             c10, c11 = st.columns(2)
             bairro_sel = c10.selectbox("Bairro", BAIRROS_MARICA + ["Outro"])
             bairro_final = bairro_sel if bairro_sel != "Outro" else c10.text_input("Digite o Bairro")
+            # Grafias de bairros conhecidos ("itaipuacu", "Sao Jose") viram o nome canônico
+            bairro_final = geo.normalizar_bairro(bairro_final) or bairro_final
             cep = c11.text_input("CEP")
             
             c12, c13 = st.columns(2)
-            serie = c12.selectbox("Série 2026", [f"{i}º Ano" for i in range(1, 10)])
+            serie = c12.selectbox(f"Série {particao.ano}", [f"{i}º Ano" for i in range(1, 10)])
             turno = c13.radio("Turno", ["Manhã", "Tarde"], horizontal=True)
             
             complemento = st.text_input("Escola Anterior") if tipo_matricula == "Nova Matrícula" else st.text_input("Turma Anterior")
@@ -471,10 +898,17 @@ def main():
                  p4 = st.radio("Leitura em família?", opcoes_freq, horizontal=True)
                  p5 = st.radio("Conversam sobre a escola?", opcoes_freq, horizontal=True)
 
+            aceitar_duplicata = st.checkbox("Registrar mesmo que já exista cadastro com o mesmo nome, nascimento e telefone")
             submitted = st.form_submit_button("✅ Registrar Aluno")
             if submitted:
+                chave = chave_duplicata(nm_estudante, dt_nasc, telefone)
+                existentes = buscar_duplicata(chave, particao.tabs) if nm_estudante else []
                 if not nm_estudante:
                     st.error("Nome é obrigatório!")
+                elif existentes and not aceitar_duplicata:
+                    st.warning("Possível duplicata: " + "; ".join(
+                        f"{tab} (linha {pos + 2})" if pos is not None else f"{tab} (registrado agora há pouco)" for tab, pos in existentes
+                    ) + ". Marque a confirmação acima para registrar mesmo assim.")
                 else:
                     pontos, inse_nivel = calcular_inse(esc1, esc2, bens, banheiros, pessoas)
                     dados = [
@@ -487,34 +921,51 @@ def main():
                         livros, bolsa, pontos, inse_nivel, 
                         p1, p2, p3, p4, p5
                     ]
-                    target = "Novas_Matriculas" if tipo_matricula == "Nova Matrícula" else "Rematriculas"
-                    save_data(sh, target, dados)
-                    st.success(f"Matrícula realizada! INSE: {inse_nivel}")
+                    target = particao.novas if tipo_matricula == "Nova Matrícula" else particao.rematriculas
+                    if save_data(target, dados):
+                        get_sincronizador().registrar_salva(target, chave)
+                        st.success(f"Matrícula realizada! INSE: {inse_nivel}")
+
+    elif page == "Importação em Lote":
+        pagina_importacao(sh)
 
     elif page == "Administração":
         st.title("⚙️ Painel Admin")
-        tab_admin = st.radio("Tabela:", ["Novas_Matriculas", "Rematriculas"], horizontal=True)
-        df_admin = load_data_cached(tab_admin)
+        rotulos = rotulos_abas()
+        tab_admin = st.selectbox("Tabela:", list(rotulos), format_func=rotulos.get)
+        df_admin, versao_admin = load_data_cached(tab_admin)
+        aviso_atualizacao([tab_admin])
         
         if not df_admin.empty:
             st.markdown(f"### Visualizando: {tab_admin} ({len(df_admin)} registros)")
-            # EDITOR HABILITADO
-            df_edited = st.data_editor(df_admin, use_container_width=True, num_rows="dynamic", key=f"editor_{tab_admin}")
-            
-            c_save, c_space = st.columns([1, 4])
-            with c_save:
-                if st.button("💾 Salvar Alterações na Nuvem", type="primary"):
-                    with st.spinner("Atualizando Google Sheets..."):
-                        if update_data(sh, tab_admin, df_edited):
-                            st.success("Planilha atualizada com sucesso!")
-                            st.cache_data.clear()
-                            st.rerun()
-            
-            csv = df_edited.to_csv(index=False).encode('utf-8')
-            st.download_button("⬇️ Baixar CSV", csv, f"{tab_admin}.csv", "text/csv")
+            editor_paginado(sh, tab_admin, df_admin, versao_admin)
+
+            if st.button("🧮 Recalcular INSE de toda a tabela", help="Aplica a rubrica atual do INSE a todos os registros e salva só o que mudou."):
+                with st.spinner("Recalculando INSE..."):
+                    if update_data(sh, tab_admin, df_admin, calcular_inse_batch(df_admin)):
+                        st.rerun()
+
+            st.markdown("**📦 Exportar tabela**")
+            botao_exportacao(
+                ("aba", tab_admin, versao_admin), tab_admin,
+                lambda: exportacao.fatiar(df_admin), texto=True,
+            )
         else:
             st.info("Nenhum dado encontrado nesta tabela.")
 
+        fila = get_fila()
+        pendentes, falhas = fila.pendentes(), fila.falhas()
+        if pendentes:
+            st.caption("📮 Aguardando envio: " + ", ".join(f"{tab}: {n}" for tab, n in pendentes.items()))
+        if fila.ultimo_erro:
+            st.warning(f"Fila de escrita tentando novamente após erro: {fila.ultimo_erro}")
+        if falhas:
+            st.error(f"{len(falhas)} matrícula(s) não puderam ser enviadas e continuam guardadas no journal local.")
+            st.dataframe(pd.DataFrame(falhas, columns=["id", "tab", "tentativas", "ultimo_erro"]), use_container_width=True)
+
+        painel_duplicatas()
+        painel_desempenho()
+
         st.divider()
         st.subheader("🛠️ Ferramentas de Teste")
         if st.button("🎲 Gerar 10 Alunos Fakes"):
@@ -523,4 +974,6 @@ def main():
             st.success("Dados gerados com sucesso!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    instrumentacao.iniciar_rerun()
+    with etapa("rerun_total"):
+        main()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import plotly.express as px
+
+import cubo as cubo_agregados
+from diff import calcular_diff
+from fake_data import gerar_linhas_fake
+from inse import calcular_inse_batch
+from planilha_memoria import PlanilhaMemoria
+from schema import TABS, combinar_abas
+from storage import GoogleSheetsBackend, SQLiteBackend
+from sync import SincronizadorDelta
+
+# ==============================================================================
+# ⏱️ BENCHMARK: CARGA SINTÉTICA + TEMPOS DOS CAMINHOS QUENTES
+# ==============================================================================
+# Uso:
+#   python benchmark.py --linhas 1000 10000 100000 --backend sqlite
+#   python benchmark.py --linhas 5000 --backend memoria --latencia-ms 150 --saida bench.json
+# Gera matrículas com seed fixa, grava no backend local (SQLite) ou numa planilha em memória
+# que imita o gspread, e mede gravação, carga (aba por aba e em lote), delta, tipagem, cubo, filtros, gráficos,
+# diff do Admin e INSE em lote. Mostra vazão e percentis de latência por etapa.
+
+COLUNAS_BENCH = ["ano_serie", "turno", "inse_classificacao", "bolsa_familia", "escolaridade_resp1",
+                 "livros_qtd", "pratica_local_estudo", "bairro"]
+
+
+class Medidor:
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, etapa, fn, repeticoes=1, linhas=0):
+        resultado = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = fn()
+            self.etapas.setdefault(etapa, {"amostras": [], "linhas": linhas})["amostras"].append(time.perf_counter() - inicio)
+        return resultado
+
+    def relatorio(self):
+        saida = {}
+        for etapa, dados in self.etapas.items():
+            amostras = np.array(dados["amostras"]) * 1000
+            p50, p95, p99 = np.percentile(amostras, [50, 95, 99])
+            saida[etapa] = {
+                "n": len(amostras), "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+                "linhas_por_s": round(dados["linhas"] / (p50 / 1000)) if dados["linhas"] and p50 else None,
+            }
+        return saida
+
+
+def criar_backend_bench(nome, pasta, latencia):
+    if nome == "sqlite":
+        return SQLiteBackend(os.path.join(pasta, "bench.db")), None
+    planilha = PlanilhaMemoria(latencia=latencia)
+    return GoogleSheetsBackend(planilha), planilha
+
+
+def rodar(linhas, backend_nome, seed, repeticoes, lote, latencia):
+    med = Medidor()
+    rng = random.Random(seed)
+    rows_novas, rows_rematriculas = med.medir("gerar", lambda: gerar_linhas_fake(linhas, seed=seed), linhas=linhas)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        backend, planilha = criar_backend_bench(backend_nome, pasta, latencia)
+        for tab_name, rows in zip(TABS, [rows_novas, rows_rematriculas]):
+            backend.init_headers(tab_name)
+            for i in range(0, len(rows), lote):
+                med.medir("salvar_lote", lambda: backend.append_rows(tab_name, rows[i:i + lote]), linhas=len(rows[i:i + lote]))
+
+        def carga_fria():
+            sync = SincronizadorDelta()
+            return sync, [sync.obter(backend, t) for t in TABS]
+        sync, dfs = med.medir("carga_completa", carga_fria, repeticoes, linhas=linhas)
+        med.medir("carga_lote", lambda: SincronizadorDelta().obter_varias(backend, TABS), repeticoes, linhas=linhas)
+
+        novas = gerar_linhas_fake(max(1, linhas // 100), seed=seed + 1)[0]
+        backend.append_rows(TABS[0], novas)
+        # Como a fila faz depois de cada lote: a escrita anunciada vai pelo delta, não pela carga completa
+        sync.marcar_alterada(TABS[0])
+        med.medir("delta_sync", lambda: sync.obter(backend, TABS[0], forcar=True), linhas=len(novas))
+        med.medir("sync_sem_mudanca", lambda: sync.obter(backend, TABS[0], forcar=True), repeticoes)
+        dfs = [sync.obter(backend, t) for t in TABS]
+        n_total = sum(len(df) for df in dfs)
+
+        tipar = lambda: combinar_abas(dict(zip(TABS, dfs)))
+        df_total = med.medir("tipar", tipar, repeticoes, linhas=n_total)
+        cubo = med.medir("cubo", lambda: cubo_agregados.construir_cubo(df_total, COLUNAS_BENCH), repeticoes, linhas=n_total)
+
+        series, bairros = cubo_agregados.opcoes(cubo, "ano_serie"), cubo_agregados.opcoes(cubo, "bairro")
+        def filtrar():
+            filtros = {"ano_serie": rng.sample(series, k=min(2, len(series))), "bairro": rng.sample(bairros, k=min(3, len(bairros)))}
+            cubo_agregados.indicadores(cubo_agregados.filtrar(cubo[cubo_agregados.BASE], filtros))
+            return [cubo_agregados.contagem_por_raca(cubo_agregados.tabela(cubo, c, filtros), c) for c in COLUNAS_BENCH]
+        med.medir("filtrar", filtrar, repeticoes * 5)
+
+        def graficos():
+            for coluna in COLUNAS_BENCH:
+                tabela = cubo_agregados.tabela(cubo, coluna, {})
+                px.bar(cubo_agregados.contagem(tabela, coluna), x=coluna, y="count").to_json()
+                df_bi = cubo_agregados.contagem_por_raca(tabela, coluna)
+                px.bar(df_bi, x=coluna, y="percent", color="raca_grupo", barmode="group", text="label").to_json()
+        med.medir("graficos", graficos, repeticoes)
+
+        df_admin = sync.obter(backend, TABS[1])
+        df_editado = df_admin.copy()
+        alvos = df_editado.sample(n=max(1, len(df_editado) // 1000), random_state=seed).index
+        df_editado.loc[alvos, "turno"] = "Integral"
+        diff = med.medir("diff_calcular", lambda: calcular_diff(df_admin, df_editado), repeticoes, linhas=len(df_admin))
+        med.medir("diff_gravar", lambda: backend.apply_diff(TABS[1], diff), linhas=len(diff.celulas))
+
+        med.medir("inse_batch", lambda: calcular_inse_batch(df_admin), repeticoes, linhas=len(df_admin))
+
+    resultado = {"linhas": linhas, "backend": backend_nome, "etapas": med.relatorio()}
+    if planilha is not None:
+        resultado["chamadas_api"] = dict(planilha.chamadas)
+    return resultado
+
+
+def imprimir(resultado):
+    print(f"\n=== {resultado['linhas']} linhas | backend: {resultado['backend']} ===")
+    print(f"{'etapa':<18}{'n':>4}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'linhas/s':>13}")
+    for etapa, r in resultado["etapas"].items():
+        vazao = f"{r['linhas_por_s']:,}" if r["linhas_por_s"] else "-"
+        print(f"{etapa:<18}{r['n']:>4}{r['p50_ms']:>11.2f}{r['p95_ms']:>11.2f}{r['p99_ms']:>11.2f}{vazao:>13}")
+    if "chamadas_api" in resultado:
+        print("chamadas à API:", resultado["chamadas_api"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do painel de matrículas com dados sintéticos.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backend", choices=["sqlite", "memoria"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--lote", type=int, default=500, help="Linhas por append_rows.")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência simulada por chamada (backend memoria).")
+    parser.add_argument("--saida", help="Grava os resultados em JSON neste arquivo.")
+    args = parser.parse_args()
+
+    resultados = []
+    for linhas in args.linhas:
+        resultado = rodar(linhas, args.backend, args.seed, args.repeticoes, args.lote, args.latencia_ms / 1000)
+        imprimir(resultado)
+        resultados.append(resultado)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
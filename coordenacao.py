@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import threading
+import time
+
+# ==============================================================================
+# 📡 CANAL DE VERSÕES ENTRE PROCESSOS (VÁRIAS RÉPLICAS DO STREAMLIT)
+# ==============================================================================
+# Cada réplica tem o seu SincronizadorDelta e os seus caches (st.cache_data é por processo).
+# Quem grava publica aqui um contador por aba, num SQLite local compartilhado pelas réplicas;
+# as outras conferem o contador a cada leitura (um SELECT no arquivo, sem rede) e, se ele
+# andou, sincronizam a aba na hora em vez de esperar o TTL. Como os caches de dados e de
+# gráficos são chaveados pela versão das abas, eles se renovam sozinhos depois disso.
+#   mudancas: aumenta a cada escrita (append da fila, import, dados de teste)
+#   edicoes:  aumenta só nas escritas que alteram linhas existentes (exige carga completa)
+
+CANAL_PATH_PADRAO = os.path.join("dados", "canal.db")
+
+
+class CanalVersoes:
+    def __init__(self, caminho=CANAL_PATH_PADRAO):
+        pasta = os.path.dirname(caminho)
+        if pasta and caminho != ":memory:":
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS versoes (
+                tab TEXT PRIMARY KEY,
+                mudancas INTEGER NOT NULL DEFAULT 0,
+                edicoes INTEGER NOT NULL DEFAULT 0,
+                publicado_em REAL
+            )
+        """)
+
+    def publicar(self, tab_name, completa=False):
+        # Devolve (mudancas, edicoes) já com esta publicação, para quem publicou não reagir a si mesmo.
+        # Incremento e leitura na mesma transação: outro processo não incrementa entre os dois
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO versoes (tab, mudancas, edicoes, publicado_em) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(tab) DO UPDATE SET mudancas = mudancas + 1, edicoes = edicoes + excluded.edicoes, "
+                    "publicado_em = excluded.publicado_em",
+                    (tab_name, int(completa), time.time()),
+                )
+                versao = self._conn.execute("SELECT mudancas, edicoes FROM versoes WHERE tab = ?", (tab_name,)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return versao
+
+    def versoes(self, tabs):
+        # {aba: (mudancas, edicoes)}; abas nunca publicadas ficam (0, 0)
+        tabs = list(tabs)
+        with self._lock:
+            linhas = self._conn.execute(
+                f"SELECT tab, mudancas, edicoes FROM versoes WHERE tab IN ({', '.join('?' * len(tabs))})", tabs
+            ).fetchall()
+        encontradas = {tab: (mudancas, edicoes) for tab, mudancas, edicoes in linhas}
+        return {t: encontradas.get(t, (0, 0)) for t in tabs}
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# 🧊 CUBO DE AGREGADOS DO DASHBOARD
+# ==============================================================================
+# Conta as matrículas uma única vez e filtros, cards e gráficos trabalham sobre essas
+# contagens em vez de reagrupar as linhas brutas a cada rerun. Cada tabela agrupa só pelo
+# que quem a lê usa: os filtros da tela mais a tipo_matricula (cards) ou mais raca_grupo e
+# a coluna (um gráfico). As tabelas dos gráficos crescem com bairro x série x INSE x raça x
+# coluna: com 100k matrículas fake (12 bairros) ficam entre ~1.300 e ~6.600 linhas, e mais com
+# os bairros reais. Sem filtro ativo, que é o caso comum, o gráfico lê de TOTAIS, a mesma
+# contagem já somada só por raca_grupo e coluna (dezenas de linhas).
+
+DIMENSOES_FILTRO = ["ano_serie", "bairro", "inse_classificacao"]
+DIMENSOES_BASE = ["tipo_matricula"]
+DIMENSOES_GRAFICO = ["raca_grupo"]
+BASE = "_base"
+TOTAIS = "_totais"
+
+
+def construir_cubo(df, colunas):
+    cubo = {}
+    if df.empty:
+        return cubo
+    dims = [d for d in DIMENSOES_FILTRO if d in df.columns]
+    cubo[BASE] = _contar(df, dims + DIMENSOES_BASE)
+    cubo[TOTAIS] = {}
+    for coluna in colunas:
+        if coluna not in df.columns or coluna in cubo:
+            continue
+        cubo[coluna] = _contar(df, dims + DIMENSOES_GRAFICO + [coluna])
+        cubo[TOTAIS][coluna] = _contar(cubo[coluna], DIMENSOES_GRAFICO + [coluna])
+    return cubo
+
+
+def _contar(df, chaves):
+    # Linhas brutas viram contagens; uma tabela de contagens é somada de novo por menos chaves
+    chaves = list(dict.fromkeys(c for c in chaves if c in df.columns))
+    agrupado = df.groupby(chaves, dropna=False, observed=True)
+    contagem = agrupado["count"].sum() if "count" in df.columns else agrupado.size()
+    return contagem.reset_index(name="count")
+
+
+def tabela(cubo, coluna, filtros):
+    if not any(filtros.values()) and coluna in cubo.get(TOTAIS, {}):
+        return cubo[TOTAIS][coluna]
+    return filtrar(cubo[coluna], filtros)
+
+
+def filtrar(tabela, filtros):
+    mask = np.ones(len(tabela), dtype=bool)
+    for dim, valores in filtros.items():
+        if valores and dim in tabela.columns:
+            mask &= tabela[dim].isin(valores).to_numpy()
+    return tabela[mask]
+
+
+def opcoes(cubo, dim):
+    base = cubo.get(BASE)
+    if base is None or dim not in base.columns:
+        return []
+    return sorted(base[dim].astype(str).unique())
+
+
+def contagem(tabela, coluna):
+    df_uni = tabela.groupby(coluna, observed=True)["count"].sum()
+    df_uni = df_uni[df_uni > 0].sort_values(ascending=False).reset_index()
+    return df_uni
+
+
+def contagem_por_raca(tabela, coluna):
+    df_bi = tabela.groupby([coluna, "raca_grupo"], observed=True)["count"].sum()
+    df_bi = df_bi[df_bi > 0].reset_index()
+    total_por_raca = df_bi.groupby("raca_grupo", observed=True)["count"].transform("sum")
+    df_bi["percent"] = (df_bi["count"] / total_por_raca) * 100
+    df_bi["label"] = df_bi["percent"].map("{:.1f}".format) + "% (N=" + df_bi["count"].astype(str) + ")"
+    return df_bi
+
+
+def indicadores(tabela):
+    total = int(tabela["count"].sum())
+    por_tipo = tabela.groupby("tipo_matricula", observed=True)["count"].sum() if "tipo_matricula" in tabela.columns else pd.Series(dtype=int)
+    inse_moda = "N/A"
+    if "inse_classificacao" in tabela.columns:
+        por_inse = tabela.groupby("inse_classificacao", observed=True)["count"].sum()
+        por_inse = por_inse[por_inse > 0]
+        if not por_inse.empty:
+            inse_moda = por_inse.idxmax()
+    return {
+        "total": total,
+        "novas": int(por_tipo.get("Nova Matrícula", 0)),
+        "rematriculas": int(por_tipo.get("Rematrícula", 0)),
+        "inse_moda": inse_moda,
+    }
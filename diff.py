@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# ✏️ DIFF ENTRE A TABELA CARREGADA E A EDITADA NO st.data_editor
+# ==============================================================================
+# As posições são as do índice original (0 = primeira linha de dados da aba).
+# O data_editor preserva o índice das linhas existentes, remove o das excluídas
+# e cria índices novos para as linhas adicionadas.
+#
+# Concorrência otimista: o diff leva a versão (hash do texto das células) de cada linha que
+# altera ou exclui, tirada de quando a edição começou. O backend confere essas versões contra
+# a aba atual antes de gravar e recusa o diff inteiro (ConflitoEdicao) se outra pessoa mexeu
+# nas mesmas linhas. Linhas novas não conflitam: vão sempre para o fim da aba.
+
+
+class ConflitoEdicao(RuntimeError):
+    def __init__(self, posicoes):
+        self.posicoes = sorted(posicoes)
+        linhas = ", ".join(str(p + 2) for p in self.posicoes[:10]) + ("..." if len(self.posicoes) > 10 else "")
+        super().__init__(f"{len(self.posicoes)} linha(s) foram alteradas por outra pessoa desde o início da edição (linhas {linhas})")
+
+
+@dataclass
+class DiffTabela:
+    colunas: list
+    celulas: list = field(default_factory=list)    # (posicao, coluna, valor)
+    novas: list = field(default_factory=list)      # linhas completas, na ordem de `colunas`
+    excluidas: list = field(default_factory=list)  # posições, em ordem crescente
+    versoes: dict = field(default_factory=dict)    # posicao -> versão da linha quando a edição começou
+
+    @property
+    def vazio(self):
+        return not (self.celulas or self.novas or self.excluidas)
+
+    def resumo(self):
+        return f"{len(self.celulas)} célula(s) alterada(s), {len(self.novas)} linha(s) nova(s), {len(self.excluidas)} excluída(s)"
+
+
+def valor_planilha(v):
+    # Converte para um tipo que o JSON do Google e o sqlite3 aceitam
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NA or v is pd.NaT:
+        return ""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, (pd.Timestamp, np.datetime64)):
+        return str(v)
+    return v
+
+
+def _como_texto(df):
+    mapear = df.map if hasattr(df, "map") else df.applymap
+    return mapear(lambda v: str(valor_planilha(v)))
+
+
+def versoes_linhas(df, colunas=None):
+    # Versão de cada linha: igual para a cópia local e para a releitura do backend
+    colunas = colunas or list(df.columns)
+    if df.empty:
+        return np.array([], dtype="uint64")
+    return pd.util.hash_pandas_object(_como_texto(df.reindex(columns=colunas)), index=False).to_numpy()
+
+
+def posicoes_tocadas(diff):
+    return sorted({p for p, _, _ in diff.celulas} | set(diff.excluidas))
+
+
+def conflitos(diff, linhas_atuais):
+    # linhas_atuais: {posicao: valores da linha hoje no backend, na ordem de diff.colunas (None = não existe mais)}
+    if not diff.versoes:
+        return []
+    existentes = {p: l for p, l in linhas_atuais.items() if l is not None}
+    atuais = pd.DataFrame(list(existentes.values()), columns=diff.colunas, dtype=object)
+    hoje = dict(zip(existentes, versoes_linhas(atuais)))
+    return [p for p, versao in diff.versoes.items() if hoje.get(p) != versao]
+
+
+def calcular_diff(df_original, df_editado):
+    colunas = list(df_original.columns)
+    df_editado = df_editado.reindex(columns=colunas)
+    diff = DiffTabela(colunas=colunas)
+
+    diff.excluidas = sorted(int(p) for p in df_original.index.difference(df_editado.index))
+    for posicao in df_editado.index.difference(df_original.index):
+        linha = [valor_planilha(v) for v in df_editado.loc[posicao, colunas].tolist()]
+        if any(v != "" for v in linha):
+            diff.novas.append(linha)
+
+    comuns = df_original.index.intersection(df_editado.index)
+    if len(comuns):
+        antes = _como_texto(df_original.loc[comuns, colunas]).to_numpy()
+        depois = df_editado.loc[comuns, colunas]
+        linhas, cols = np.nonzero(antes != _como_texto(depois).to_numpy())
+        valores = depois.to_numpy()
+        diff.celulas = [
+            (int(comuns[i]), colunas[j], valor_planilha(valores[i, j])) for i, j in zip(linhas, cols)
+        ]
+    tocadas = posicoes_tocadas(diff)
+    diff.versoes = dict(zip(tocadas, versoes_linhas(df_original.loc[tocadas, colunas])))
+    return diff
+
+
+class EdicoesPendentes:
+    # Edições do editor paginado do Admin, acumuladas por posição original da aba.
+    # Cada página é editada separadamente; ao salvar, vira um único DiffTabela só
+    # com as linhas tocadas. Linhas adicionadas continuam no editor enquanto são preenchidas:
+    # só são guardadas aqui quando o editor recomeça (edição/exclusão registrada) e voltam
+    # ao fim da página com índices negativos (-1 = novas[0]), ainda editáveis.
+    def __init__(self, versao=None):
+        self.versao = versao
+        self.versoes = {}  # posicao -> versão da linha na primeira vez em que foi tocada
+        self.celulas = {}
+        self.excluidas = set()
+        self.novas = []
+
+    @property
+    def vazio(self):
+        return not (self.celulas or self.excluidas or self.novas)
+
+    @staticmethod
+    def adicionadas(estado_editor):
+        # Linhas novas ainda no editor, ignorando as totalmente vazias
+        return [dict(l) for l in estado_editor.get("added_rows", []) if any(valor_planilha(v) != "" for v in l.values())]
+
+    def registrar(self, indice_pagina, estado_editor, df_original=None):
+        # `estado_editor` é o dict do st.data_editor: edited_rows, added_rows, deleted_rows.
+        # Com `df_original`, guarda a versão das linhas tocadas agora (base da checagem de conflito).
+        if df_original is not None:
+            tocadas = [int(indice_pagina[int(i)]) for i in list(estado_editor.get("edited_rows", {})) + list(estado_editor.get("deleted_rows", []))]
+            tocadas = [p for p in tocadas if p not in self.versoes and p in df_original.index]
+            self.versoes.update(zip(tocadas, versoes_linhas(df_original.loc[tocadas])))
+        # Devolve True quando o editor precisa recomeçar; linhas novas sozinhas não contam
+        mudou, novas_removidas = False, set()
+        for i, alteracoes in estado_editor.get("edited_rows", {}).items():
+            posicao = int(indice_pagina[int(i)])
+            if posicao < 0:
+                self.novas[-posicao - 1].update(alteracoes)
+            else:
+                self.celulas.setdefault(posicao, {}).update(alteracoes)
+            mudou = True
+        for i in estado_editor.get("deleted_rows", []):
+            posicao = int(indice_pagina[int(i)])
+            if posicao < 0:
+                novas_removidas.add(-posicao - 1)
+            else:
+                self.excluidas.add(posicao)
+            mudou = True
+        if mudou:
+            self.novas = [l for k, l in enumerate(self.novas) if k not in novas_removidas]
+            self.novas += self.adicionadas(estado_editor)
+        return mudou
+
+    def aplicar(self, df_pagina):
+        # Mostra a página já com as edições pendentes (e sem as linhas marcadas para excluir)
+        df_pagina = df_pagina[~df_pagina.index.isin(self.excluidas)].copy()
+        for posicao, alteracoes in self.celulas.items():
+            if posicao in df_pagina.index:
+                for coluna, valor in alteracoes.items():
+                    if df_pagina[coluna].dtype != object:
+                        df_pagina[coluna] = df_pagina[coluna].astype(object)
+                    df_pagina.at[posicao, coluna] = valor
+        if self.novas:
+            novas = pd.DataFrame(self.novas, index=[-(k + 1) for k in range(len(self.novas))])
+            df_pagina = pd.concat([df_pagina.astype(object), novas.reindex(columns=df_pagina.columns).astype(object)])
+        return df_pagina
+
+    def montar_diff(self, df_original, adicionadas=()):
+        # `adicionadas`: linhas novas que ainda estão no editor (ver `adicionadas()`)
+        colunas = list(df_original.columns)
+        diff = DiffTabela(colunas=colunas, excluidas=sorted(p for p in self.excluidas if p in df_original.index))
+        for posicao, alteracoes in sorted(self.celulas.items()):
+            if posicao in self.excluidas or posicao not in df_original.index:
+                continue
+            for coluna, valor in alteracoes.items():
+                novo = valor_planilha(valor)
+                if coluna in colunas and str(novo) != str(valor_planilha(df_original.at[posicao, coluna])):
+                    diff.celulas.append((posicao, coluna, novo))
+        diff.novas = [[valor_planilha(linha.get(c)) for c in colunas] for linha in self.novas + list(adicionadas)]
+        tocadas = posicoes_tocadas(diff)
+        atuais = dict(zip(tocadas, versoes_linhas(df_original.loc[tocadas, colunas])))
+        diff.versoes = {p: self.versoes.get(p, atuais[p]) for p in tocadas}
+        return diff
@@ -0,0 +1,108 @@
+import difflib
+
+import numpy as np
+import pandas as pd
+
+from schema import chave_texto
+
+# ==============================================================================
+# 👯 DETECÇÃO DE CADASTROS DUPLICADOS
+# ==============================================================================
+# Chave normalizada: nome do estudante sem acentos/caixa + data de nascimento + últimos
+# dígitos do telefone do responsável. O SincronizadorDelta mantém um índice chave -> posições
+# por aba, atualizado a cada carga/delta, então conferir um cadastro novo é um lookup no dict.
+# O relatório de quase-duplicatas compara nomes só dentro de blocos (mesma data de nascimento,
+# ou mesmo bairro + inicial), nunca todos os pares da tabela.
+
+# Últimos 8 dígitos: ignora DDD, +55 e o 9 extra dos celulares
+DIGITOS_TELEFONE = 8
+LIMIAR_SIMILARIDADE = 0.88
+TAMANHO_MAXIMO_BLOCO = 400
+BLOCOS = {
+    "Data de nascimento": lambda df: df["data"],
+    "Bairro + inicial do nome": lambda df: df["bairro"].astype(str).map(chave_texto) + "|" + df["nome_chave"].str[:1],
+}
+
+
+def _nomes(serie):
+    # chave_texto uma vez por nome distinto
+    serie = serie.astype(str)
+    return serie.map({v: chave_texto(v) for v in serie.unique()})
+
+
+def chaves_duplicata(df):
+    if df.empty or "nm_estudante" not in df.columns:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    nome = _nomes(df["nm_estudante"])
+    data = df.get("dt_nasc_estudante", pd.Series("", index=df.index)).astype(str).str.strip().str[:10]
+    telefone = df.get("telefone", pd.Series("", index=df.index)).astype(str).str.replace(r"\D", "", regex=True).str[-DIGITOS_TELEFONE:]
+    chaves = (nome + "|" + data + "|" + telefone).astype(object)
+    return chaves.where(nome != "", "")
+
+
+def chaves_aluno(df):
+    # Identidade do estudante entre anos (nome + nascimento, sem telefone) como hash uint64
+    if df.empty or "nm_estudante" not in df.columns:
+        return np.array([], dtype="uint64")
+    nome = _nomes(df["nm_estudante"])
+    data = df.get("dt_nasc_estudante", pd.Series("", index=df.index)).astype(str).str.strip().str[:10]
+    validas = nome != ""
+    return pd.util.hash_array((nome + "|" + data)[validas].to_numpy(dtype=object))
+
+
+def chave_duplicata(nome, dt_nasc, telefone):
+    linha = pd.DataFrame({"nm_estudante": [nome], "dt_nasc_estudante": [str(dt_nasc)], "telefone": [telefone]})
+    return chaves_duplicata(linha).iloc[0]
+
+
+def indexar(indice, chaves, inicio=0):
+    # chave -> lista de posições na aba; `inicio` é a posição da primeira chave recebida
+    for posicao, chave in enumerate(chaves, start=inicio):
+        if chave:
+            indice.setdefault(chave, []).append(posicao)
+    return indice
+
+
+def quase_duplicatas(tabelas, bloco="Data de nascimento", limiar=LIMIAR_SIMILARIDADE):
+    # tabelas: {aba: DataFrame bruto}. Devolve (pares parecidos, nº de blocos grandes demais ignorados)
+    partes = []
+    for tab_name, df in tabelas.items():
+        if df.empty or "nm_estudante" not in df.columns:
+            continue
+        partes.append(pd.DataFrame({
+            "aba": tab_name, "posicao": range(len(df)), "nome": df["nm_estudante"].astype(str).to_numpy(),
+            "nome_chave": _nomes(df["nm_estudante"]).to_numpy(),
+            "data": df.get("dt_nasc_estudante", pd.Series("", index=df.index)).astype(str).str[:10].to_numpy(),
+            "telefone": df.get("telefone", pd.Series("", index=df.index)).astype(str).to_numpy(),
+            "bairro": df.get("bairro", pd.Series("", index=df.index)).astype(str).to_numpy(),
+        }))
+    colunas = ["similaridade", "aba_a", "posicao_a", "nome_a", "aba_b", "posicao_b", "nome_b", "nascimento_a", "nascimento_b", "telefone_a", "telefone_b"]
+    if not partes:
+        return pd.DataFrame(columns=colunas), 0
+    todos = pd.concat(partes, ignore_index=True)
+    todos = todos[todos["nome_chave"] != ""]
+    todos["bloco"] = BLOCOS[bloco](todos)
+
+    pares, ignorados = [], 0
+    for _, grupo in todos.groupby("bloco", sort=False):
+        if len(grupo) < 2:
+            continue
+        if len(grupo) > TAMANHO_MAXIMO_BLOCO:
+            ignorados += 1
+            continue
+        linhas = list(grupo.itertuples(index=False))
+        matcher = difflib.SequenceMatcher(None)
+        for j, b in enumerate(linhas):
+            # seq2 é a que o SequenceMatcher pré-processa: fixa uma vez e varia a outra
+            matcher.set_seq2(b.nome_chave)
+            for a in linhas[:j]:
+                matcher.set_seq1(a.nome_chave)
+                # real_quick_ratio/quick_ratio são limites superiores baratos do ratio completo
+                if matcher.real_quick_ratio() < limiar or matcher.quick_ratio() < limiar:
+                    continue
+                similaridade = matcher.ratio()
+                if similaridade >= limiar:
+                    pares.append((round(similaridade, 3), a.aba, a.posicao, a.nome, b.aba, b.posicao, b.nome,
+                                  a.data, b.data, a.telefone, b.telefone))
+    resultado = pd.DataFrame(pares, columns=colunas).sort_values("similaridade", ascending=False, kind="stable")
+    return resultado.reset_index(drop=True), ignorados
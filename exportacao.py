@@ -0,0 +1,103 @@
+import io
+
+import pandas as pd
+
+# ==============================================================================
+# 📦 EXPORTAÇÃO EM CSV, PARQUET E XLSX (POR PEDAÇOS)
+# ==============================================================================
+# Os arquivos são montados a partir de um iterável de DataFrames (fatias de uma tabela já
+# em memória, ou o iter_chunks de um backend), sem materializar uma cópia inteira em texto.
+# O app só chama estas funções quando o usuário pede o arquivo, sempre sobre o DataFrame
+# que está exibindo, e guarda o resultado em cache pela versão desse DataFrame.
+
+TAMANHO_PEDACO = 5000
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def fatiar(df, tamanho=TAMANHO_PEDACO):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def _exportar_csv(pedacos):
+    saida = io.BytesIO()
+    cabecalho = True
+    for pedaco in pedacos:
+        saida.write(pedaco.to_csv(index=False, header=cabecalho).encode("utf-8"))
+        cabecalho = False
+    return saida.getvalue()
+
+
+def _coluna_parquet(serie):
+    # Categóricas e colunas mistas (texto + número) viram texto; o resto mantém o tipo
+    if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object:
+        return serie.astype("string")
+    return serie
+
+
+def _exportar_parquet(pedacos, texto=False):
+    # O schema sai do 1º pedaço e vale para o arquivo todo. Com `texto=True` (abas cruas, em que
+    # uma coluna pode ser só dígitos num pedaço e ter "S/N" no seguinte) todas as colunas vão como texto.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportar Parquet requer o pacote pyarrow (pip install pyarrow).")
+
+    saida, writer, schema = io.BytesIO(), None, None
+    for pedaco in pedacos:
+        pedaco = pedaco.astype("string") if texto else pedaco.apply(_coluna_parquet)
+        if writer is None:
+            schema = pa.Schema.from_pandas(pedaco, preserve_index=False)
+            # Coluna toda vazia no 1º pedaço não define tipo: trata como texto
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+            writer = pq.ParquetWriter(saida, schema, compression="snappy")
+        else:
+            for campo in schema:
+                if pa.types.is_string(campo.type) or pa.types.is_large_string(campo.type):
+                    pedaco[campo.name] = pedaco[campo.name].astype("string")
+        writer.write_table(pa.Table.from_pandas(pedaco, schema=schema, preserve_index=False))
+    if writer is not None:
+        writer.close()
+    return saida.getvalue()
+
+
+def _valor_xlsx(v):
+    if v is None or v is pd.NA or v is pd.NaT or (isinstance(v, float) and v != v):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v
+
+
+def _exportar_xlsx(pedacos, titulo="Dados"):
+    from openpyxl import Workbook
+
+    # write_only grava as linhas em fluxo, sem montar a planilha inteira na memória
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo[:31])
+    cabecalho = True
+    for pedaco in pedacos:
+        if cabecalho:
+            ws.append([str(c) for c in pedaco.columns])
+            cabecalho = False
+        for linha in pedaco.itertuples(index=False, name=None):
+            ws.append([_valor_xlsx(v) for v in linha])
+    saida = io.BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+def exportar(pedacos, formato, titulo="Dados", texto=False):
+    # `texto`: as colunas não têm tipo fixo entre pedaços (só importa para o Parquet)
+    if formato == "CSV":
+        return _exportar_csv(pedacos)
+    if formato == "Parquet":
+        return _exportar_parquet(pedacos, texto)
+    if formato == "XLSX":
+        return _exportar_xlsx(pedacos, titulo)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
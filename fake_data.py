@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+from schema import HEADERS, BAIRROS_MARICA
+from inse import calcular_inse_batch
+
+# ==============================================================================
+# 🎲 GERADOR DE MATRÍCULAS FAKES (TESTES E BENCHMARKS)
+# ==============================================================================
+# Mesmas distribuições do antigo laço do generate_fake_data, mas vetorizado: os campos
+# do Faker pt_BR são sorteados de um "pool" gerado uma vez, e o INSE é calculado em lote.
+# Com a mesma `seed` o resultado é sempre o mesmo.
+
+BENS_FAKE = ["TV", "Geladeira", "Máquina de Lavar", "Carro", "Computador/Notebook", "Internet Wifi", "Ar Condicionado"]
+TAMANHO_POOL = 2000
+
+
+def _pool(n, gerar):
+    return np.array([gerar() for _ in range(n)], dtype=object)
+
+
+def gerar_linhas_fake(qtd, seed=None, tamanho_pool=TAMANHO_POOL):
+    rng = np.random.default_rng(seed)
+    fake = Faker('pt_BR')
+    fake.seed_instance(seed)
+    n_pool = max(1, min(qtd, tamanho_pool))
+    sortear = lambda pool: pool[rng.integers(0, len(pool), qtd)]
+    escolher = lambda opcoes: np.array(opcoes, dtype=object)[rng.integers(0, len(opcoes), qtd)]
+
+    # Bens: k entre 1 e 7 itens em ordem aleatória, como random.sample
+    k = rng.integers(1, len(BENS_FAKE) + 1, qtd)
+    ordem = rng.random((qtd, len(BENS_FAKE))).argsort(axis=1)
+    bens = [", ".join(BENS_FAKE[j] for j in linha[:n]) for linha, n in zip(ordem, k)]
+
+    tipo_nova = rng.random(qtd) < 0.5
+    escola_nova = np.char.add("Escola ", sortear(_pool(n_pool, fake.last_name)).astype(str))
+    turma_anterior = np.char.add("7", rng.integers(10, 100, qtd).astype(str))
+
+    df = pd.DataFrame({
+        "data_registro": sortear(_pool(n_pool, lambda: fake.date_time_this_year().strftime("%Y-%m-%d %H:%M:%S"))),
+        "nm_estudante": sortear(_pool(n_pool, fake.name)),
+        "dt_nasc_estudante": sortear(_pool(n_pool, lambda: str(fake.date_of_birth(minimum_age=6, maximum_age=15)))),
+        "nm_responsavel": sortear(_pool(n_pool, fake.name)),
+        "dt_nasc_responsavel": sortear(_pool(n_pool, lambda: str(fake.date_of_birth(minimum_age=25, maximum_age=60)))),
+        "parentesco": escolher(["Mãe", "Pai", "Avó"]),
+        "telefone": sortear(_pool(n_pool, fake.phone_number)),
+        "email": sortear(_pool(n_pool, fake.email)),
+        "logradouro": sortear(_pool(n_pool, fake.street_name)),
+        "numero": sortear(_pool(n_pool, fake.building_number)),
+        "bairro": escolher(BAIRROS_MARICA),
+        "municipio": "Maricá",
+        "cep": sortear(_pool(n_pool, fake.postcode)),
+        "ano_serie": np.char.add(rng.integers(1, 10, qtd).astype(str), "º Ano"),
+        "turno": escolher(["Manhã", "Tarde"]),
+        "escola_origem": np.where(tipo_nova, escola_nova, turma_anterior),
+        "consentimento": "Sim",
+        "raca": escolher(["Branca", "Preta", "Parda", "Indígena"]),
+        "genero": escolher(["Masculino", "Feminino"]),
+        "escolaridade_resp1": escolher(["Fundamental Completo", "Médio Completo", "Superior Completo"]),
+        "escolaridade_resp2": escolher(["", "Fundamental Completo", "Médio Completo"]),
+        "qtd_pessoas_domicilio": rng.integers(2, 8, qtd),
+        "qtd_banheiros": rng.integers(1, 4, qtd),
+        "bens": bens,
+        "livros_qtd": escolher(["0-10", "11-50", "Mais de 100"]),
+        "bolsa_familia": escolher(["Sim", "Não"]),
+        "pratica_local_estudo": escolher(["Nunca", "Às vezes", "Sempre"]),
+        "pratica_horario_fixo": escolher(["Nunca", "Às vezes", "Sempre"]),
+        "pratica_acompanhamento_pais": escolher(["Raramente", "Semanalmente", "Diariamente"]),
+        "pratica_leitura_compartilhada": escolher(["Raramente", "Semanalmente", "Diariamente"]),
+        "pratica_conversa_escola": escolher(["Raramente", "Semanalmente", "Diariamente"]),
+    })
+    df = calcular_inse_batch(df)[HEADERS]
+
+    linhas = df.astype(object).values.tolist()
+    rows_novas = [l for l, nova in zip(linhas, tipo_nova) if nova]
+    rows_rematriculas = [l for l, nova in zip(linhas, tipo_nova) if not nova]
+    return rows_novas, rows_rematriculas
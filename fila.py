@@ -0,0 +1,171 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# ==============================================================================
+# 📮 FILA DE ESCRITA (WRITE-BEHIND) PARA AS MATRÍCULAS
+# ==============================================================================
+# O formulário grava a matrícula num journal SQLite local e responde na hora.
+# Um worker em segundo plano esvazia a fila com append_rows em lotes por aba,
+# com backoff exponencial quando a API devolve 429/5xx. As linhas só saem do
+# journal depois de confirmadas pelo backend, então um restart do Streamlit não
+# perde nada (no pior caso uma linha pode ser reenviada: entrega "pelo menos uma vez").
+
+FILA_PATH_PADRAO = os.path.join("dados", "fila_escrita.db")
+TAMANHO_LOTE = 200
+BACKOFF_MAXIMO = 64
+RESERVA_EXPIRA = 300
+MAX_TENTATIVAS_ERRO_PERMANENTE = 5
+STATUS_TEMPORARIOS = {408, 429, 500, 502, 503, 504}
+
+
+def erro_temporario(e):
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return status in STATUS_TEMPORARIOS
+    # Sem status HTTP: falha de rede/timeout, vale tentar de novo
+    return isinstance(e, (ConnectionError, TimeoutError, OSError))
+
+
+class FilaEscrita:
+    def __init__(self, caminho=FILA_PATH_PADRAO, tamanho_lote=TAMANHO_LOTE):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._worker = None
+        self._tabs_prontas = set()
+        self.ultimo_erro = None
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pendentes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tab TEXT NOT NULL,
+                linha TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                reserva TEXT,
+                reservado_em REAL,
+                falhou INTEGER NOT NULL DEFAULT 0,
+                ultimo_erro TEXT
+            )
+        """)
+
+    def enfileirar(self, tab_name, linhas):
+        agora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO pendentes (tab, linha, criado_em) VALUES (?, ?, ?)",
+                [(tab_name, json.dumps(list(l), ensure_ascii=False, default=str), agora) for l in linhas],
+            )
+        self._acordar.set()
+
+    def pendentes(self):
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT tab, COUNT(*) FROM pendentes WHERE falhou = 0 GROUP BY tab"
+            ).fetchall())
+
+    def falhas(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, tab, tentativas, ultimo_erro FROM pendentes WHERE falhou = 1 ORDER BY id"
+            ).fetchall()
+
+    def _reservar(self):
+        # Reserva um lote da aba mais antiga; a reserva expira se o processo morrer no meio
+        token, agora = uuid.uuid4().hex, time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                linha = self._conn.execute(
+                    "SELECT tab FROM pendentes WHERE falhou = 0 AND (reserva IS NULL OR reservado_em < ?) ORDER BY id LIMIT 1",
+                    (agora - RESERVA_EXPIRA,),
+                ).fetchone()
+                if linha is None:
+                    self._conn.execute("COMMIT")
+                    return None, []
+                self._conn.execute(
+                    """UPDATE pendentes SET reserva = ?, reservado_em = ? WHERE id IN (
+                           SELECT id FROM pendentes WHERE tab = ? AND falhou = 0
+                           AND (reserva IS NULL OR reservado_em < ?) ORDER BY id LIMIT ?)""",
+                    (token, agora, linha[0], agora - RESERVA_EXPIRA, self.tamanho_lote),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            lote = self._conn.execute(
+                "SELECT id, linha FROM pendentes WHERE reserva = ? ORDER BY id", (token,)
+            ).fetchall()
+        return linha[0], lote
+
+    def _liberar(self, ids, erro, permanente):
+        marcadores = ", ".join("?" * len(ids))
+        with self._lock:
+            self._conn.execute(
+                f"""UPDATE pendentes SET reserva = NULL, reservado_em = NULL, tentativas = tentativas + 1,
+                    ultimo_erro = ?, falhou = CASE WHEN ? AND tentativas + 1 >= ? THEN 1 ELSE 0 END
+                    WHERE id IN ({marcadores})""",
+                [str(erro)[:500], int(permanente), MAX_TENTATIVAS_ERRO_PERMANENTE] + ids,
+            )
+
+    def drenar_lote(self, backend):
+        # Envia um lote; devolve (aba, quantidade). Exceções do backend sobem para o chamador.
+        tab_name, lote = self._reservar()
+        if not lote:
+            return None, 0
+        ids = [i for i, _ in lote]
+        try:
+            if tab_name not in self._tabs_prontas:
+                backend.init_headers(tab_name)
+                self._tabs_prontas.add(tab_name)
+            backend.append_rows(tab_name, [json.loads(l) for _, l in lote])
+        except Exception as e:
+            self._liberar(ids, e, permanente=not erro_temporario(e))
+            raise
+        with self._lock:
+            self._conn.execute(f"DELETE FROM pendentes WHERE id IN ({', '.join('?' * len(ids))})", ids)
+        return tab_name, len(ids)
+
+    def _loop(self, obter_backend, ao_enviar, intervalo):
+        backend, falhas_seguidas = None, 0
+        while True:
+            # Tudo dentro do try: um erro do próprio journal ("database is locked") não pode matar o worker
+            try:
+                if not self.pendentes():
+                    self._acordar.wait(intervalo)
+                    self._acordar.clear()
+                    continue
+                backend = backend or obter_backend()
+                tab_name, enviados = self.drenar_lote(backend) if backend else (None, 0)
+                falhas_seguidas, self.ultimo_erro = 0, None
+                if not enviados:
+                    # Tudo reservado por outro processo: espera a reserva terminar ou expirar
+                    self._acordar.wait(intervalo)
+                    self._acordar.clear()
+                elif ao_enviar:
+                    ao_enviar(tab_name)
+            except Exception as e:
+                # Backoff exponencial com jitter; o backend é pedido de novo a obter_backend na próxima
+                # tentativa (em geral a mesma instância em cache: o 401 já reautoriza nela, ver _reconecta)
+                backend, falhas_seguidas = None, falhas_seguidas + 1
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                time.sleep(min(BACKOFF_MAXIMO, 2 ** falhas_seguidas) * random.uniform(0.5, 1.0))
+
+    def iniciar_worker(self, obter_backend, ao_enviar=None, intervalo=2.0):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._loop, args=(obter_backend, ao_enviar, intervalo), daemon=True, name="fila-escrita"
+            )
+            self._worker.start()
+        return self._worker
@@ -0,0 +1,175 @@
+import csv
+import difflib
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from schema import COORDENADAS_BAIRROS, chave_texto
+
+# ==============================================================================
+# 🗺️ GEOLOCALIZAÇÃO LOCAL (SEM GEOCODIFICAÇÃO EXTERNA)
+# ==============================================================================
+# Cada matrícula recebe uma coordenada aproximada, nesta ordem de precisão:
+#   1. bairro reconhecido (nome normalizado, com tolerância a erros de digitação) -> centróide do bairro
+#   2. CEP de Maricá com posição conhecida: a tabela versionada ceps_marica.csv (cep,lat,lon), mantida
+#      pela escola, somada aos CEPs aprendidos das próprias matrículas (aprender_ceps)
+#   3. sem posição: fica fora do mapa de calor (empilhar no Centro inflaria o bairro) e é só contada
+# A precisão é de bairro: sem coordenadas por CEP/logradouro na ceps_marica.csv (ela vem só com
+# o cabeçalho), todo ponto é o centróide de um bairro, e os CEPs aprendidos só recuperam o bairro
+# de quem o digitou fora da lista. Linhas com coordenada própria na tabela da escola saem do centróide.
+# As posições são agrupadas numa grade (células de ~TAMANHO_CELULA graus) uma vez por versão
+# dos dados; o mapa de calor só soma as células que passam nos filtros.
+
+CENTRO_MUNICIPIO = COORDENADAS_BAIRROS["Centro"]
+# Faixa de CEP dos Correios para o município de Maricá/RJ
+FAIXA_CEP_MUNICIPIO = (24900000, 24999999)
+CEPS_PATH_PADRAO = "ceps_marica.csv"
+MIN_MATRICULAS_CEP = 3  # concordâncias mínimas para aprender a posição de um CEP
+TAMANHO_CELULA = 0.005  # ~550 m
+GEO = "_geo"
+PRECISOES = ["bairro", "cep", "sem_posicao"]
+
+# Grafias comuns que o difflib sozinho não resolve
+APELIDOS_BAIRROS = {
+    "sao jose": "São José do Imbassaí", "imbassai": "São José do Imbassaí",
+    "barra": "Barra de Maricá", "itaipuacu": "Itaipuaçu", "itaipu acu": "Itaipuaçu",
+}
+_BAIRROS_CHAVE = {chave_texto(b): b for b in COORDENADAS_BAIRROS}
+_BAIRROS_CHAVE.update({chave: b for chave, b in APELIDOS_BAIRROS.items()})
+
+
+@functools.lru_cache(maxsize=4096)
+def normalizar_bairro(nome, corte=0.85):
+    # Nome canônico de COORDENADAS_BAIRROS, ou None se não for um bairro conhecido
+    chave = chave_texto(nome)
+    if not chave:
+        return None
+    if chave in _BAIRROS_CHAVE:
+        return _BAIRROS_CHAVE[chave]
+    parecidos = difflib.get_close_matches(chave, list(_BAIRROS_CHAVE), n=1, cutoff=corte)
+    return _BAIRROS_CHAVE[parecidos[0]] if parecidos else None
+
+
+def normalizar_bairros(serie):
+    # Versão para colunas inteiras: mantém o texto original quando o bairro não é reconhecido
+    serie = serie.astype(str)
+    mapa = {}
+    for valor in serie.unique():
+        mapa[valor] = normalizar_bairro(valor) or valor.strip()
+    return serie.map(mapa)
+
+
+def _no_municipio(cep):
+    return FAIXA_CEP_MUNICIPIO[0] <= cep <= FAIXA_CEP_MUNICIPIO[1]
+
+
+def carregar_ceps(caminho=CEPS_PATH_PADRAO):
+    # {cep (8 dígitos, int): (lat, lon)}; linhas com CEP de fora do município são ignoradas
+    if not caminho or not os.path.exists(caminho):
+        return {}
+    tabela = {}
+    with open(caminho, encoding="utf-8") as f:
+        for linha in csv.DictReader(f):
+            try:
+                cep = int(re.sub(r"\D", "", linha["cep"]))
+                if _no_municipio(cep):
+                    tabela[cep] = (float(linha["lat"]), float(linha["lon"]))
+            except (KeyError, ValueError):
+                continue
+    return tabela
+
+
+def _ceps_numericos(serie):
+    # CEP de 8 dígitos dentro da faixa do município, ou NaN
+    digitos = serie.astype(str).str.replace(r"\D", "", regex=True)
+    cep = pd.to_numeric(digitos.where(digitos.str.len() == 8), errors="coerce")
+    return cep.where(cep.between(*FAIXA_CEP_MUNICIPIO))
+
+
+def _bairros_canonicos(df):
+    # Bairro canônico de cada linha (ou None), normalizando só as categorias
+    bairros = df["bairro"] if isinstance(df["bairro"].dtype, pd.CategoricalDtype) else df["bairro"].astype("category")
+    canonicos = [normalizar_bairro(str(c)) for c in bairros.cat.categories]
+    return bairros, canonicos
+
+
+def aprender_ceps(df, minimo=MIN_MATRICULAS_CEP):
+    # {cep: (lat, lon)} tirado das próprias matrículas: um CEP herda o centróide do bairro reconhecido
+    # quando pelo menos `minimo` registros e a maioria dos que têm bairro concordam nele
+    if df.empty or "bairro" not in df.columns or "cep" not in df.columns:
+        return {}
+    bairros, canonicos = _bairros_canonicos(df)
+    pares = pd.DataFrame({
+        "cep": _ceps_numericos(df["cep"]).to_numpy(),
+        "bairro": np.array(canonicos + [None], dtype=object)[bairros.cat.codes.to_numpy()],
+    }).dropna()
+    if pares.empty:
+        return {}
+    contagem = pares.groupby(["cep", "bairro"]).size()
+    total = contagem.groupby(level="cep").sum()
+    melhor = contagem.sort_values(ascending=False).groupby(level="cep").head(1).reset_index(level="bairro")
+    melhor = melhor[(melhor[0] >= minimo) & (melhor[0] * 2 > total.reindex(melhor.index))]
+    return {
+        int(cep): (COORDENADAS_BAIRROS[b]["lat"], COORDENADAS_BAIRROS[b]["lon"])
+        for cep, b in melhor["bairro"].items()
+    }
+
+
+def localizar(df, ceps=None):
+    # DataFrame (lat, lon, precisao) alinhado a `df`, sem apply linha a linha; sem posição = NaN
+    n = len(df)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    precisao = np.full(n, len(PRECISOES) - 1, dtype=np.int8)
+
+    if "bairro" in df.columns:
+        # Normaliza só as categorias (poucas) e indexa pelos códigos
+        bairros, canonicos = _bairros_canonicos(df)
+        lat_cat = np.array([COORDENADAS_BAIRROS[b]["lat"] if b else np.nan for b in canonicos] + [np.nan])
+        lon_cat = np.array([COORDENADAS_BAIRROS[b]["lon"] if b else np.nan for b in canonicos] + [np.nan])
+        codigos = bairros.cat.codes.to_numpy()
+        achou = ~np.isnan(lat_cat[codigos])
+        lat[achou], lon[achou], precisao[achou] = lat_cat[codigos][achou], lon_cat[codigos][achou], 0
+    else:
+        achou = np.zeros(n, dtype=bool)
+
+    if ceps and "cep" in df.columns:
+        cep = _ceps_numericos(df["cep"]).to_numpy()
+        for i in np.flatnonzero(~achou & ~np.isnan(cep)):
+            coordenada = ceps.get(int(cep[i]))
+            if coordenada:
+                lat[i], lon[i], precisao[i] = coordenada[0], coordenada[1], 1
+
+    return pd.DataFrame({
+        "lat": lat, "lon": lon,
+        "precisao": pd.Categorical.from_codes(precisao, categories=PRECISOES),
+    }, index=df.index)
+
+
+def construir_camada(df, dimensoes, ceps=None, tamanho=TAMANHO_CELULA):
+    # Contagem por (dimensões de filtro, célula da grade, precisão); o centro da célula é a posição.
+    # Linhas sem posição entram com lat/lon NaN, só para a contagem por precisão.
+    if df.empty:
+        return pd.DataFrame()
+    pos = localizar(df, {**aprender_ceps(df), **(ceps or {})})
+    celulas = pd.DataFrame({
+        "lat": (np.floor(pos["lat"].to_numpy() / tamanho) + 0.5) * tamanho,
+        "lon": (np.floor(pos["lon"].to_numpy() / tamanho) + 0.5) * tamanho,
+        "precisao": pos["precisao"],
+    }, index=df.index)
+    dims = [d for d in dimensoes if d in df.columns]
+    tabela = pd.concat([df[dims], celulas], axis=1)
+    return tabela.groupby(dims + ["lat", "lon", "precisao"], dropna=False, observed=True).size().reset_index(name="count")
+
+
+def densidade(camada):
+    # Soma as células (já filtradas) para o mapa de calor; devolve também o total por precisão,
+    # incluindo as matrículas sem posição, que não entram nos pontos
+    if camada.empty:
+        return camada, {}
+    pontos = camada.dropna(subset=["lat", "lon"]).groupby(["lat", "lon"], observed=True)["count"].sum().reset_index()
+    por_precisao = camada.groupby("precisao", observed=True)["count"].sum()
+    return pontos[pontos["count"] > 0], {p: int(c) for p, c in por_precisao.items() if c}
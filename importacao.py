@@ -0,0 +1,224 @@
+import csv
+import difflib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from schema import BAIRROS_MARICA, HEADERS, chave_texto
+from geo import normalizar_bairros
+from inse import calcular_inse_batch
+
+# ==============================================================================
+# 📥 IMPORTAÇÃO EM LOTE (CSV / XLSX)
+# ==============================================================================
+# O arquivo é lido em pedaços, as colunas são mapeadas para HEADERS e cada pedaço é
+# validado e normalizado de forma vetorizada (bairro via geo.py, série, datas), pontuado pelo INSE
+# em lote e devolvido como linhas prontas para append_rows. Linhas inválidas vão para
+# um relatório de rejeitadas com o número da linha no arquivo e o motivo: cada pedaço lido
+# traz esse número no índice, já descontadas as linhas em branco puladas.
+
+TAMANHO_PEDACO = 2000
+IGNORAR = "(ignorar)"
+
+# Nomes comuns nas listas das escolas -> coluna de HEADERS (comparados via chave_texto)
+SINONIMOS = {
+    "nome": "nm_estudante", "aluno": "nm_estudante", "estudante": "nm_estudante", "nome do aluno": "nm_estudante",
+    "nome do estudante": "nm_estudante", "data de nascimento": "dt_nasc_estudante", "nascimento": "dt_nasc_estudante",
+    "responsavel": "nm_responsavel", "nome do responsavel": "nm_responsavel",
+    "celular": "telefone", "whatsapp": "telefone", "fone": "telefone", "e-mail": "email",
+    "endereco": "logradouro", "rua": "logradouro", "n": "numero", "numero": "numero",
+    "serie": "ano_serie", "ano": "ano_serie", "ano/serie": "ano_serie", "turma anterior": "escola_origem",
+    "escola anterior": "escola_origem", "cor/raca": "raca", "cor": "raca", "sexo": "genero",
+}
+# Campos de múltipla escolha que o formulário grava como "Não informado" quando vazios
+NAO_INFORMADO = [
+    "raca", "escolaridade_resp1", "livros_qtd", "bolsa_familia", "pratica_local_estudo", "pratica_horario_fixo",
+    "pratica_acompanhamento_pais", "pratica_leitura_compartilhada", "pratica_conversa_escola",
+]
+
+
+def _sem_linhas_vazias(pedaco):
+    vazias = pedaco.apply(lambda s: s.astype(str).str.strip() == "").all(axis=1)
+    return pedaco[~vazias]
+
+
+def ler_pedacos(arquivo, nome, tamanho=TAMANHO_PEDACO):
+    # Tudo é lido como texto: a normalização decide o tipo de cada campo. O índice de cada
+    # pedaço é o número da linha no arquivo (1 = cabeçalho); linhas em branco não vêm.
+    if nome.lower().endswith((".xlsx", ".xlsm")):
+        yield from _pedacos_xlsx(arquivo, tamanho)
+        return
+    bruto = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    encoding = "utf-8-sig"
+    try:
+        amostra = bruto.decode(encoding)
+    except UnicodeDecodeError:
+        encoding, amostra = "latin-1", bruto.decode("latin-1")
+    try:
+        sep = csv.Sniffer().sniff(amostra.split("\n", 1)[0], delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    # Linhas em branco são lidas (e descartadas aqui) para a contagem de linhas não se perder
+    leitor = pd.read_csv(arquivo, sep=sep, dtype=str, keep_default_na=False, encoding=encoding,
+                         chunksize=tamanho, skipinitialspace=True, skip_blank_lines=False)
+    try:
+        for pedaco in leitor:
+            pedaco.index = pedaco.index + 2
+            pedaco = _sem_linhas_vazias(pedaco)
+            if not pedaco.empty:
+                yield pedaco
+    finally:
+        # close() solta o arquivo sem fechá-lo (o coletor de lixo fecharia o upload do Streamlit)
+        leitor.close()
+
+
+def _pedacos_xlsx(arquivo, tamanho):
+    from openpyxl import load_workbook
+
+    # read_only percorre as linhas do XML sem montar a planilha inteira
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else f"coluna_{i + 1}" for i, c in enumerate(next(linhas, []))]
+        bloco, numeros = [], []
+        for numero, linha in enumerate(linhas, start=2):
+            if linha is None or all(v is None or v == "" for v in linha):
+                continue
+            bloco.append([_texto_celula(v) for v in linha[:len(cabecalho)]])
+            numeros.append(numero)
+            if len(bloco) >= tamanho:
+                yield pd.DataFrame(bloco, columns=cabecalho, index=numeros)
+                bloco, numeros = [], []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho, index=numeros)
+    finally:
+        wb.close()
+
+
+def _texto_celula(v):
+    # Datas e números do Excel voltam ao texto que a planilha mostraria ("2012-05-03", "21999990000")
+    if v is None:
+        return ""
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d")
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def contar_linhas(arquivo, nome):
+    # Estimativa para a barra de progresso (linhas de dados, sem o cabeçalho)
+    if nome.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        wb = load_workbook(arquivo, read_only=True)
+        total = (wb.worksheets[0].max_row or 1) - 1
+        wb.close()
+    else:
+        total = arquivo.getvalue().count(b"\n")
+    arquivo.seek(0)
+    return max(total, 1)
+
+
+def sugerir_mapeamento(colunas):
+    # coluna do arquivo -> coluna de HEADERS (ou IGNORAR); cada coluna de destino usada uma vez
+    por_chave = {chave_texto(h.replace("_", " ")): h for h in HEADERS}
+    por_chave.update({chave_texto(h): h for h in HEADERS})
+    mapeamento, usadas = {}, set()
+    for coluna in colunas:
+        chave = chave_texto(coluna).replace("_", " ")
+        destino = por_chave.get(chave) or por_chave.get(chave.replace(" ", "_")) or SINONIMOS.get(chave)
+        if destino is None:
+            parecidas = difflib.get_close_matches(chave, list(por_chave), n=1, cutoff=0.85)
+            destino = por_chave[parecidas[0]] if parecidas else None
+        if destino is None or destino in usadas:
+            destino = IGNORAR
+        usadas.add(destino)
+        mapeamento[coluna] = destino
+    return mapeamento
+
+
+def _normalizar_serie(serie):
+    # "5", "5º ano", "5o Ano", "5° ANO", "5ª série" -> "5º Ano"; fora de 1..9 fica vazio (rejeitado)
+    numero = serie.str.extract(r"^\s*([1-9])(?!\d)", expand=False)
+    return (numero + "º Ano").fillna("")
+
+
+def _normalizar_data(serie):
+    texto = serie.str.strip()
+    iso = pd.to_datetime(texto, format="%Y-%m-%d", errors="coerce")
+    br = pd.to_datetime(texto, format="%d/%m/%Y", errors="coerce")
+    datas = iso.fillna(br)
+    invalidas = (texto != "") & datas.isna()
+    return datas.dt.strftime("%Y-%m-%d").fillna(""), invalidas
+
+
+def processar_pedaco(pedaco, mapeamento):
+    # Devolve (DataFrame válido nas colunas de HEADERS, DataFrame de rejeitadas), ambos com o
+    # índice de `pedaco` (número da linha no arquivo, ou a posição do registro na API)
+    origem = {c: d for c, d in mapeamento.items() if d != IGNORAR and c in pedaco.columns}
+    df = pedaco[list(origem)].rename(columns=origem).astype(str).apply(lambda s: s.str.strip())
+    df = df.reindex(columns=HEADERS, fill_value="")
+    motivos = pd.Series("", index=df.index, dtype=object)
+
+    def rejeitar(mask, motivo):
+        motivos[mask] = motivos[mask] + np.where(motivos[mask] == "", "", "; ") + motivo
+
+    rejeitar(df["nm_estudante"] == "", "nome do estudante vazio")
+
+    serie = _normalizar_serie(df["ano_serie"])
+    rejeitar(serie == "", "série inválida")
+    df["ano_serie"] = serie
+
+    for coluna in ("dt_nasc_estudante", "dt_nasc_responsavel"):
+        df[coluna], invalidas = _normalizar_data(df[coluna])
+        rejeitar(invalidas, f"data inválida em {coluna}")
+
+    # Bairro vazio é aceito (fica fora do mapa); preenchido e não reconhecido é rejeitado
+    df["bairro"] = normalizar_bairros(df["bairro"])
+    rejeitar((df["bairro"] != "") & ~df["bairro"].isin(BAIRROS_MARICA), "bairro desconhecido")
+    df["municipio"] = df["municipio"].where(df["municipio"] != "", "Maricá")
+    df["data_registro"] = df["data_registro"].where(df["data_registro"] != "", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    for coluna in NAO_INFORMADO:
+        df[coluna] = df[coluna].where(df[coluna] != "", "Não informado")
+    for coluna in ("qtd_pessoas_domicilio", "qtd_banheiros"):
+        # Vazio vira NA; texto ou fração é rejeitado em vez de virar INSE 0 calado
+        numeros = pd.to_numeric(df[coluna].str.replace(",", ".", regex=False), errors="coerce")
+        rejeitar((df[coluna] != "") & numeros.isna(), f"valor não numérico em {coluna}")
+        rejeitar(numeros.notna() & (numeros % 1 != 0), f"valor não inteiro em {coluna}")
+        df[coluna] = numeros.where(numeros % 1 == 0).astype("Int64")
+
+    validas = motivos == ""
+    rejeitadas = pedaco.loc[~validas].assign(motivo=motivos[~validas])
+    df = calcular_inse_batch(df[validas])
+    return df, rejeitadas
+
+
+def linhas_planilha(df):
+    # Mesmo formato que o formulário grava (números como int, vazios como "")
+    valores = df[HEADERS].astype(object).where(df[HEADERS].notna(), "")
+    return [[v.item() if isinstance(v, np.generic) else v for v in linha] for linha in valores.values.tolist()]
+
+
+def importar(pedacos, mapeamento, gravar=None, tamanho_lote=TAMANHO_PEDACO, ao_progredir=None):
+    # `gravar(linhas)` recebe lotes prontos para append_rows; sem ele só valida (simulação).
+    # Devolve (total de linhas gravadas, DataFrame de rejeitadas).
+    gravadas, rejeitadas, buffer, lidas = 0, [], [], 0
+    for pedaco in pedacos:
+        validas, rej = processar_pedaco(pedaco, mapeamento)
+        lidas = int(pedaco.index[-1]) - 1  # linha 1 = cabeçalho
+        if not rej.empty:
+            rejeitadas.append(rej)
+        buffer.extend(linhas_planilha(validas))
+        while len(buffer) >= tamanho_lote:
+            lote, buffer = buffer[:tamanho_lote], buffer[tamanho_lote:]
+            if gravar: gravar(lote)
+            gravadas += len(lote)
+        if ao_progredir: ao_progredir(lidas, gravadas)
+    if buffer:
+        if gravar: gravar(buffer)
+        gravadas += len(buffer)
+    if ao_progredir: ao_progredir(lidas, gravadas)
+    relatorio = pd.concat(rejeitadas) if rejeitadas else pd.DataFrame(columns=["motivo"])
+    return gravadas, relatorio.rename_axis("linha_arquivo").reset_index()
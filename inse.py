@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# 📐 CÁLCULO DO INSE (ESCALAR E VETORIZADO)
+# ==============================================================================
+# calcular_inse pontua um registro (formulário); calcular_inse_batch aplica a mesma
+# rubrica à tabela inteira de uma vez, para recalcular tudo quando a rubrica mudar.
+
+MAPA_ESCOLARIDADE = {
+    "Não alfabetizado": 0, "Fundamental Incompleto": 1, "Fundamental Completo": 2,
+    "Médio Incompleto": 3, "Médio Completo": 4, "Superior Incompleto": 5, "Superior Completo": 6,
+    "Não informado": 0
+}
+BONUS_BENS = {"Carro": 3, "Computador/Notebook": 2}
+FAIXAS_INSE = [5, 10, 18, 25]
+CLASSES_INSE = ["Baixo", "Médio-Baixo", "Médio", "Médio-Alto", "Alto"]
+
+
+def _lista_bens(bens):
+    # Texto salvo na planilha vem como "TV, Carro": separa e tira os espaços
+    if isinstance(bens, str): return [b.strip() for b in bens.split(",") if b.strip()]
+    elif isinstance(bens, list): return bens
+    else: return []
+
+
+def classificar_inse(pontos):
+    for limite, classe in zip(FAIXAS_INSE, CLASSES_INSE):
+        if pontos <= limite: return classe
+    return CLASSES_INSE[-1]
+
+
+def calcular_inse(escolaridade1, escolaridade2, bens, banheiros, qtd_pessoas):
+    pontos = 0
+    pontos += MAPA_ESCOLARIDADE.get(escolaridade1, 0) * 2
+    if escolaridade2: pontos += MAPA_ESCOLARIDADE.get(escolaridade2, 0)
+
+    lista_bens = _lista_bens(bens)
+    pontos += len(lista_bens)
+    pontos += int(banheiros) * 2
+    for bem, bonus in BONUS_BENS.items():
+        if bem in lista_bens: pontos += bonus
+
+    return pontos, classificar_inse(pontos)
+
+
+def _pesos_escolaridade(serie):
+    # Posições no mapa indexam um vetor de pesos; valores fora do mapa (posição -1) valem 0
+    codigos = pd.Index(list(MAPA_ESCOLARIDADE)).get_indexer(pd.Series(serie).astype(object))
+    pesos = np.append(np.array(list(MAPA_ESCOLARIDADE.values()), dtype=np.int64), 0)
+    return pesos[codigos]
+
+
+def calcular_inse_batch(df):
+    n = len(df)
+    vazio = pd.Series([""] * n, index=df.index, dtype=object)
+
+    esc1 = _pesos_escolaridade(df.get("escolaridade_resp1", vazio))
+    esc2 = _pesos_escolaridade(df.get("escolaridade_resp2", vazio))
+
+    bens = df.get("bens", vazio)
+    bens = bens.map(lambda v: ",".join(map(str, v)) if isinstance(v, list) else v)
+    bens = bens.where(bens.map(lambda v: isinstance(v, str)), "").astype(str)
+    # Normaliza separadores e remove itens vazios: "TV, , Carro" -> "TV,Carro"
+    bens = bens.str.replace(r"\s*,\s*", ",", regex=True).str.replace(r",{2,}", ",", regex=True).str.strip(", ")
+    n_bens = np.where(bens.str.len().to_numpy() > 0, bens.str.count(",").to_numpy() + 1, 0)
+    one_hot = bens.str.get_dummies(sep=",")
+    bonus = np.zeros(n, dtype=np.int64)
+    for bem, valor in BONUS_BENS.items():
+        if bem in one_hot.columns:
+            bonus += one_hot[bem].to_numpy(dtype=np.int64) * valor
+
+    banheiros = pd.to_numeric(df.get("qtd_banheiros", vazio), errors="coerce").fillna(0).to_numpy().astype(np.int64)
+
+    pontos = esc1 * 2 + esc2 + n_bens + banheiros * 2 + bonus
+    classes = np.array(CLASSES_INSE, dtype=object)[np.searchsorted(FAIXAS_INSE, pontos, side="left")]
+    return df.assign(inse_pontos=pontos, inse_classificacao=classes)
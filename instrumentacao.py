@@ -0,0 +1,113 @@
+import functools
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# ⏱️ INSTRUMENTAÇÃO DOS CAMINHOS QUENTES
+# ==============================================================================
+# Cada etapa medida (decorator @medir ou bloco `with etapa(...)`) vira um registro com
+# duração, linhas e chamadas à API feitas dentro dela, guardado num buffer circular.
+# O painel de Administração resume p50/p95 por etapa e a cota do Sheets consumida.
+
+TAMANHO_BUFFER = 5000
+# Cota padrão do Google Sheets: 60 leituras e 60 escritas por minuto, por usuário e projeto
+COTA_POR_MINUTO = {"leitura": 60, "escrita": 60}
+
+_registros = deque(maxlen=TAMANHO_BUFFER)
+_chamadas_api = deque(maxlen=TAMANHO_BUFFER)
+_lock = threading.Lock()
+_local = threading.local()
+_contador_reruns = itertools.count(1)
+
+
+def _pilha():
+    if not hasattr(_local, "pilha"):
+        _local.pilha = []
+    return _local.pilha
+
+
+def iniciar_rerun():
+    _local.rerun = next(_contador_reruns)
+    return _local.rerun
+
+
+def registrar_chamada_api(tipo, metodo=""):
+    # tipo: "leitura" ou "escrita". Soma a chamada em todas as etapas abertas nesta thread.
+    with _lock:
+        _chamadas_api.append((time.time(), tipo, metodo))
+    for info in _pilha():
+        info["chamadas_api"] += 1
+
+
+@contextmanager
+def etapa(nome, linhas=None):
+    info = {"etapa": nome, "rerun": getattr(_local, "rerun", None), "linhas": linhas, "chamadas_api": 0}
+    _pilha().append(info)
+    inicio = time.perf_counter()
+    try:
+        yield info
+    finally:
+        info["duracao_ms"] = (time.perf_counter() - inicio) * 1000
+        info["momento"] = time.time()
+        _pilha().remove(info)
+        with _lock:
+            _registros.append(info)
+
+
+def medir(nome):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with etapa(nome) as info:
+                resultado = fn(*args, **kwargs)
+                if info["linhas"] is None and isinstance(resultado, pd.DataFrame):
+                    info["linhas"] = len(resultado)
+                return resultado
+        return wrapper
+    return decorator
+
+
+def registros():
+    with _lock:
+        return pd.DataFrame(list(_registros), columns=["momento", "rerun", "etapa", "duracao_ms", "linhas", "chamadas_api"])
+
+
+def resumo():
+    df = registros()
+    if df.empty:
+        return df
+    return df.groupby("etapa").agg(
+        n=("duracao_ms", "size"),
+        p50_ms=("duracao_ms", lambda s: np.percentile(s, 50)),
+        p95_ms=("duracao_ms", lambda s: np.percentile(s, 95)),
+        max_ms=("duracao_ms", "max"),
+        chamadas_api_media=("chamadas_api", "mean"),
+        linhas_media=("linhas", "mean"),
+    ).round(2).sort_values("p95_ms", ascending=False)
+
+
+def uso_cota(janela=60):
+    limite = time.time() - janela
+    with _lock:
+        recentes = [tipo for momento, tipo, _ in _chamadas_api if momento >= limite]
+    return {tipo: (recentes.count(tipo), cota) for tipo, cota in COTA_POR_MINUTO.items()}
+
+
+def exportar(formato="json"):
+    df = registros()
+    if formato == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+    return json.dumps(df.to_dict(orient="records"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def limpar():
+    with _lock:
+        _registros.clear()
+        _chamadas_api.clear()
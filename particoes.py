@@ -0,0 +1,175 @@
+import io
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from schema import TABS
+from duplicados import chaves_aluno
+
+# ==============================================================================
+# 🗂️ PARTIÇÕES POR ANO LETIVO E UNIDADE ESCOLAR
+# ==============================================================================
+# Cada partição (ano, unidade) tem a sua aba de Novas e a de Rematrículas, configuradas em
+# [[particoes.lista]] no secrets.toml. Sem configuração existe uma partição só, com as abas de
+# sempre. O Dashboard carrega apenas as partições escolhidas nos filtros; os comparativos
+# entre anos usam agregados pequenos por partição (contagens, INSE e hashes de alunos).
+# Só o ano letivo atual é lido e revalidado ao vivo; os anos encerrados têm o agregado
+# persistido em disco (AgregadosDisco) e as abas brutas deles só são lidas de novo quando
+# uma escrita do app nelas mexe no contador do canal (ver coordenacao.py).
+
+ANO_PADRAO = 2026
+UNIDADE_PADRAO = "NAVE Lúcio Thome"
+AGREGADOS_PATH_PADRAO = os.path.join("dados", "agregados")
+
+
+@dataclass(frozen=True)
+class Particao:
+    ano: int
+    unidade: str
+    novas: str
+    rematriculas: str
+
+    @property
+    def tabs(self):
+        return (self.novas, self.rematriculas)
+
+    @property
+    def rotulo(self):
+        return f"{self.ano} · {self.unidade}"
+
+    def colunas(self, tab_name):
+        # Colunas acrescentadas às linhas desta aba na tabela combinada
+        tipo = "Nova Matrícula" if tab_name == self.novas else "Rematrícula"
+        return {"tipo_matricula": tipo, "ano_letivo": self.ano, "unidade": self.unidade}
+
+
+def carregar_particoes(config):
+    config = config or {}
+    lista = config.get("lista") or []
+    if not lista:
+        # Instalação antiga: as duas abas de sempre formam a única partição
+        return [Particao(int(config.get("ano", ANO_PADRAO)), str(config.get("unidade", UNIDADE_PADRAO)), *TABS)]
+    particoes = [
+        Particao(int(p["ano"]), str(p.get("unidade", config.get("unidade", UNIDADE_PADRAO))), str(p["novas"]), str(p["rematriculas"]))
+        for p in lista
+    ]
+    tabs = [t for p in particoes for t in p.tabs]
+    repetidas = sorted({t for t in tabs if tabs.count(t) > 1})
+    if repetidas:
+        raise ValueError(f"Aba usada em mais de uma partição: {', '.join(repetidas)}")
+    return sorted(particoes, key=lambda p: (p.ano, p.unidade))
+
+
+def ano_atual(particoes):
+    return max(p.ano for p in particoes)
+
+
+def podar(particoes, anos=None, unidades=None):
+    # Só as partições que os filtros pedem (lista vazia = sem filtro naquela dimensão)
+    return [p for p in particoes if (not anos or p.ano in anos) and (not unidades or p.unidade in unidades)]
+
+
+def tabs_de(particoes):
+    return [t for p in particoes for t in p.tabs]
+
+
+def colunas_por_aba(particoes):
+    # {aba: colunas extras}; abas fora das partições seguem TIPO_MATRICULA
+    return {t: p.colunas(t) for p in particoes for t in p.tabs}
+
+
+def agregar(particao, tabelas):
+    # Resumo de uma partição a partir das linhas brutas das suas duas abas
+    novas, rematriculas = (tabelas.get(t, pd.DataFrame()) for t in particao.tabs)
+    partes = [df for df in (novas, rematriculas) if not df.empty]
+    todas = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    pontos = pd.to_numeric(todas["inse_pontos"], errors="coerce") if "inse_pontos" in todas.columns else pd.Series(dtype=float)
+    classes = todas["inse_classificacao"].astype(str) if "inse_classificacao" in todas.columns else pd.Series(dtype=str)
+    return {
+        "novas": len(novas), "rematriculas": len(rematriculas),
+        "inse_classes": classes[classes != ""].value_counts().to_dict(),
+        "inse_pontos_soma": float(pontos.sum()), "inse_pontos_n": int(pontos.notna().sum()),
+        # Identidade do aluno (nome + nascimento) como hash: basta para cruzar anos
+        "alunos": np.unique(chaves_aluno(todas)),
+        "alunos_rematricula": np.unique(chaves_aluno(rematriculas)),
+    }
+
+
+def retencao(particoes, agregados):
+    # Alunos de um ano (Novas + Rematrículas) que aparecem nas Rematrículas do ano seguinte, por unidade
+    por_chave = {(p.ano, p.unidade): agregados[p] for p in particoes if p in agregados}
+    linhas = []
+    for (ano, unidade), ag in sorted(por_chave.items()):
+        seguinte = por_chave.get((ano + 1, unidade))
+        if seguinte is None:
+            continue
+        base = len(ag["alunos"])
+        retidos = len(np.intersect1d(ag["alunos"], seguinte["alunos_rematricula"], assume_unique=True))
+        linhas.append({
+            "unidade": unidade, "de": ano, "para": ano + 1, "alunos": base, "rematriculados": retidos,
+            "retencao_pct": round(100 * retidos / base, 1) if base else None,
+        })
+    return pd.DataFrame(linhas, columns=["unidade", "de", "para", "alunos", "rematriculados", "retencao_pct"])
+
+
+def tendencia_inse(particoes, agregados):
+    linhas = []
+    for p in particoes:
+        ag = agregados.get(p)
+        if ag is None:
+            continue
+        total = sum(ag["inse_classes"].values())
+        media = ag["inse_pontos_soma"] / ag["inse_pontos_n"] if ag["inse_pontos_n"] else None
+        for classe, n in ag["inse_classes"].items():
+            linhas.append({
+                "ano_letivo": p.ano, "unidade": p.unidade, "inse_classificacao": classe, "count": n,
+                "percent": round(100 * n / total, 1) if total else 0.0,
+                "inse_pontos_medio": round(media, 2) if media is not None else None,
+            })
+    return pd.DataFrame(linhas, columns=["ano_letivo", "unidade", "inse_classificacao", "count", "percent", "inse_pontos_medio"])
+
+
+class AgregadosDisco:
+    # Um <ano>_<unidade>.npz por partição encerrada: os hashes de alunos como arrays e o resto
+    # (contagens, INSE, origem e a chave de versão das abas) num JSON dentro do mesmo arquivo
+    def __init__(self, pasta=AGREGADOS_PATH_PADRAO, origem=""):
+        self.pasta = pasta
+        self.origem = origem
+
+    def _caminho(self, particao):
+        return os.path.join(self.pasta, re.sub(r"\W+", "_", f"{particao.ano}_{particao.unidade}") + ".npz")
+
+    def carregar(self, particao, chave):
+        # Agregado salvo com a mesma origem e a mesma chave de versão, ou None
+        try:
+            with np.load(self._caminho(particao), allow_pickle=False) as arquivo:
+                meta = json.loads(str(arquivo["meta"]))
+                if meta.pop("origem") != self.origem or meta.pop("chave") != json.loads(json.dumps(chave)):
+                    return None
+                return {**meta, "alunos": arquivo["alunos"], "alunos_rematricula": arquivo["alunos_rematricula"]}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def salvar(self, particao, chave, agregado):
+        meta = {k: v for k, v in agregado.items() if k not in ("alunos", "alunos_rematricula")}
+        meta.update(origem=self.origem, chave=chave)
+        buffer = io.BytesIO()
+        np.savez(buffer, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                 alunos=agregado["alunos"], alunos_rematricula=agregado["alunos_rematricula"])
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self._caminho(particao)
+        # Grava ao lado e troca: quem lê nunca pega o arquivo pela metade
+        with open(caminho + ".tmp", "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(caminho + ".tmp", caminho)
+
+    def descartar(self):
+        # Recarga pedida pelo usuário: os anos encerrados são resumidos de novo na próxima leitura
+        if os.path.isdir(self.pasta):
+            for nome in os.listdir(self.pasta):
+                if nome.endswith(".npz"):
+                    os.remove(os.path.join(self.pasta, nome))
@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+from collections import Counter
+
+from gspread.utils import a1_to_rowcol, numericise_all
+
+# ==============================================================================
+# 🧪 PLANILHA EM MEMÓRIA (SUBSTITUTA DO gspread PARA TESTES E BENCHMARKS)
+# ==============================================================================
+# Implementa só o pedaço da API do gspread que o GoogleSheetsBackend usa, guardando
+# as células em listas. `latencia` (segundos) simula o custo de cada chamada à API e
+# `chamadas` conta quantas requisições cada operação teria feito.
+
+
+class _Celula:
+    def __init__(self, value):
+        self.value = value
+
+
+class WorksheetMemoria:
+    def __init__(self, planilha, title, id):
+        self._planilha = planilha
+        self.title = title
+        self.id = id
+        self.valores = []
+
+    def _chamada(self, nome):
+        self._planilha._chamada(nome)
+
+    def acell(self, label):
+        self._chamada("acell")
+        linha, coluna = a1_to_rowcol(label)
+        try:
+            return _Celula(self.valores[linha - 1][coluna - 1])
+        except IndexError:
+            return _Celula(None)
+
+    def append_row(self, values, **kwargs):
+        self._chamada("append_row")
+        self._planilha._modificar()
+        self.valores.append(list(values))
+
+    def append_rows(self, values, **kwargs):
+        self._chamada("append_rows")
+        self._planilha._modificar()
+        self.valores.extend(list(v) for v in values)
+
+    def get_all_records(self, **kwargs):
+        self._chamada("get_all_records")
+        if not self.valores:
+            return []
+        cabecalho = self.valores[0]
+        return [
+            dict(zip(cabecalho, numericise_all(l + [""] * (len(cabecalho) - len(l)), default_blank="")))
+            for l in self.valores[1:]
+        ]
+
+    def _intervalo(self, range_name):
+        # Suporta "A5:AG" e "A5:AG100" (colunas sempre a partir de A)
+        m = re.fullmatch(r"(?:'?[^!]*'?!)?([A-Z]+)(\d+):([A-Z]+)(\d*)", range_name)
+        inicio, fim = int(m.group(2)), int(m.group(4)) if m.group(4) else len(self.valores)
+        n_colunas = a1_to_rowcol(f"{m.group(3)}1")[1]
+        return [[str(v) if v != "" else "" for v in l[:n_colunas]] for l in self.valores[inicio - 1:fim]]
+
+    def get(self, range_name=None, **kwargs):
+        self._chamada("get")
+        return self._intervalo(range_name)
+
+    def clear(self):
+        self._chamada("clear")
+        self._planilha._modificar()
+        self.valores = []
+
+    def update(self, range_name='A1', values=None, **kwargs):
+        self._chamada("update")
+        self._planilha._modificar()
+        linha = a1_to_rowcol(range_name)[0]
+        for i, v in enumerate(values or []):
+            while len(self.valores) < linha + i:
+                self.valores.append([])
+            self.valores[linha - 1 + i] = list(v)
+
+
+class PlanilhaMemoria:
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.chamadas = Counter()
+        self._abas = {}
+        self._lock = threading.Lock()
+        self._modificacoes = 0
+
+    def _chamada(self, nome):
+        with self._lock:
+            self.chamadas[nome] += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _modificar(self):
+        with self._lock:
+            self._modificacoes += 1
+
+    def get_lastUpdateTime(self):
+        # No gspread é o modifiedTime do arquivo no Drive; aqui um contador de escritas
+        self._chamada("get_lastUpdateTime")
+        with self._lock:
+            return str(self._modificacoes)
+
+    def worksheet(self, title):
+        # Abas são criadas na primeira referência (na planilha real elas já existem)
+        self._chamada("worksheet")
+        with self._lock:
+            if title not in self._abas:
+                self._abas[title] = WorksheetMemoria(self, title, len(self._abas))
+            return self._abas[title]
+
+    def values_batch_get(self, ranges, params=None):
+        # Uma chamada para vários intervalos no formato "'Aba'!A1:AG"; aba inexistente é erro, como na API
+        self._chamada("values_batch_get")
+        resposta = []
+        for intervalo in ranges:
+            aba, _, celulas = intervalo.rpartition("!")
+            aba = aba.strip("'")
+            with self._lock:
+                if aba not in self._abas:
+                    raise ValueError(f"Unable to parse range: {intervalo}")
+                ws = self._abas[aba]
+            valores = ws._intervalo(celulas)
+            resposta.append({"range": intervalo, "values": valores} if valores else {"range": intervalo})
+        return {"valueRanges": resposta}
+
+    def batch_update(self, body):
+        self._chamada("batch_update")
+        por_id = {ws.id: ws for ws in self._abas.values()}
+        # Aplica numa cópia e só troca no fim: atômico como o batchUpdate real
+        copias = {i: [list(l) for l in ws.valores] for i, ws in por_id.items()}
+        for req in body["requests"]:
+            if "updateCells" in req:
+                inicio = req["updateCells"]["start"]
+                valores = copias[inicio["sheetId"]]
+                for di, linha in enumerate(req["updateCells"]["rows"]):
+                    for dj, celula in enumerate(linha["values"]):
+                        i, j = inicio["rowIndex"] + di, inicio["columnIndex"] + dj
+                        valores[i] += [""] * (j + 1 - len(valores[i]))
+                        valores[i][j] = _valor_celula(celula)
+            elif "deleteDimension" in req:
+                intervalo = req["deleteDimension"]["range"]
+                del copias[intervalo["sheetId"]][intervalo["startIndex"]:intervalo["endIndex"]]
+            elif "appendCells" in req:
+                copias[req["appendCells"]["sheetId"]].extend(
+                    [_valor_celula(c) for c in linha["values"]] for linha in req["appendCells"]["rows"]
+                )
+            else:
+                raise ValueError(f"Requisição não suportada: {list(req)}")
+        for i, ws in por_id.items():
+            ws.valores = copias[i]
+        self._modificar()
+        return {"replies": [{} for _ in body["requests"]]}
+
+
+def _valor_celula(celula):
+    valor = celula.get("userEnteredValue", {})
+    return next(iter(valor.values()), "")
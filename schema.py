@@ -0,0 +1,90 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+HEADERS = [
+    "data_registro", "nm_estudante", "dt_nasc_estudante", "nm_responsavel", "dt_nasc_responsavel",
+    "parentesco", "telefone", "email", "logradouro", "numero", "bairro", "municipio", "cep",
+    "ano_serie", "turno", "escola_origem", "consentimento", "raca", "genero",
+    "escolaridade_resp1", "escolaridade_resp2", "qtd_pessoas_domicilio", "qtd_banheiros", "bens",
+    "livros_qtd", "bolsa_familia", "inse_pontos", "inse_classificacao",
+    "pratica_local_estudo", "pratica_horario_fixo", "pratica_acompanhamento_pais",
+    "pratica_leitura_compartilhada", "pratica_conversa_escola"
+]
+
+TABS = ["Novas_Matriculas", "Rematriculas"]
+TIPO_MATRICULA = {"Novas_Matriculas": "Nova Matrícula", "Rematriculas": "Rematrícula"}
+
+COORDENADAS_BAIRROS = {
+    "Araçatiba": {"lat": -22.9275, "lon": -42.8098}, "Bambuí": {"lat": -22.9231, "lon": -42.7482},
+    "Barra de Maricá": {"lat": -22.9567, "lon": -42.8374}, "Boqueirão": {"lat": -22.9224, "lon": -42.8336},
+    "Centro": {"lat": -22.9194, "lon": -42.8183}, "Cordeirinho": {"lat": -22.9602, "lon": -42.7561},
+    "Inoã": {"lat": -22.9188, "lon": -42.8712}, "Itaipuaçu": {"lat": -22.9658, "lon": -42.9242},
+    "Itapeba": {"lat": -22.9080, "lon": -42.8300}, "Ponta Negra": {"lat": -22.9610, "lon": -42.6930},
+    "São José do Imbassaí": {"lat": -22.9380, "lon": -42.8440}, "Ubatiba": {"lat": -22.8800, "lon": -42.7900}
+}
+BAIRROS_MARICA = sorted(list(COORDENADAS_BAIRROS.keys()))
+
+# --- Esquema tipado usado pelo Dashboard (aplicado uma vez por versão dos dados) ---
+# Categóricas, inteiros pequenos e datas ocupam uma fração da memória de colunas object
+# e deixam groupby/isin bem mais rápidos. A tabela bruta (Admin, diff) continua como veio.
+COLUNAS_CATEGORICAS = [
+    "parentesco", "bairro", "municipio", "ano_serie", "turno", "consentimento", "raca", "genero",
+    "escolaridade_resp1", "escolaridade_resp2", "livros_qtd", "bolsa_familia", "inse_classificacao",
+    "pratica_local_estudo", "pratica_horario_fixo", "pratica_acompanhamento_pais",
+    "pratica_leitura_compartilhada", "pratica_conversa_escola", "tipo_matricula", "unidade"
+]
+COLUNAS_INTEIRAS = {"qtd_pessoas_domicilio": "Int8", "qtd_banheiros": "Int8", "inse_pontos": "Int16", "ano_letivo": "Int16"}
+COLUNAS_DATAS = ["data_registro", "dt_nasc_estudante", "dt_nasc_responsavel"]
+
+GRUPOS_RACA = {"Preta": "Negra (Preta+Parda)", "Parda": "Negra (Preta+Parda)"}
+
+
+def aplicar_esquema(df):
+    colunas = {}
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns:
+            colunas[col] = df[col].astype("category")
+    for col, tipo in COLUNAS_INTEIRAS.items():
+        if col in df.columns:
+            numeros = pd.to_numeric(df[col], errors="coerce").round()
+            # Fora da faixa do tipo (ex.: 300 banheiros digitados por engano) vira NA em vez de derrubar a tipagem
+            limites = np.iinfo(tipo.lower())
+            colunas[col] = numeros.where(numeros.between(limites.min, limites.max)).astype(tipo)
+    for col in COLUNAS_DATAS:
+        if col in df.columns:
+            colunas[col] = pd.to_datetime(df[col], errors="coerce")
+    return df.assign(**colunas)
+
+
+def agrupar_raca(df):
+    if 'raca' not in df.columns: return df
+    raca = df['raca'] if isinstance(df['raca'].dtype, pd.CategoricalDtype) else df['raca'].astype("category")
+    # Mapeia as categorias (poucas) e reaproveita os códigos, sem percorrer as linhas
+    grupos = [GRUPOS_RACA.get(c, c) for c in raca.cat.categories]
+    categorias = list(dict.fromkeys(grupos))
+    mapa_codigos = np.array([categorias.index(g) for g in grupos] + [-1], dtype=np.int64)
+    codigos = mapa_codigos[raca.cat.codes.to_numpy()]
+    return df.assign(raca_grupo=pd.Categorical.from_codes(codigos, categories=categorias))
+
+
+def combinar_abas(tabelas, extras=None):
+    # {aba: DataFrame bruto} -> uma tabela tipada com a coluna tipo_matricula.
+    # `extras` ({aba: {coluna: valor}}, ver particoes.py) acrescenta ano_letivo/unidade por aba;
+    # sem ele, abas fora de TIPO_MATRICULA usam o próprio nome como tipo.
+    extras = extras or {}
+    partes = [
+        df.assign(**{"tipo_matricula": TIPO_MATRICULA.get(tab, tab), **extras.get(tab, {})})
+        for tab, df in tabelas.items() if not df.empty
+    ]
+    if not partes:
+        return pd.DataFrame()
+    return agrupar_raca(aplicar_esquema(pd.concat(partes, ignore_index=True)))
+
+
+def chave_texto(texto):
+    # Minúsculas, sem acentos e com espaços simples: "  São  José " -> "sao jose"
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\s+", " ", texto).strip().lower()
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+# ==============================================================================
+# 💽 SNAPSHOT EM DISCO DAS ABAS (PARQUET + CARIMBO DE VERSÃO)
+# ==============================================================================
+# A última versão boa de cada aba fica em dados/snapshot/<aba>.parquet, com um
+# <aba>.json ao lado (origem, versão do backend, quando foi salva). Ao reiniciar o
+# processo o SincronizadorDelta serve o snapshot na hora e revalida em segundo plano;
+# se a API estiver fora do ar, o snapshot continua valendo.
+#
+# As colunas da planilha misturam números e texto, então vão para o Parquet como texto
+# e voltam com a mesma conversão numérica do gspread (só quando o texto volta idêntico:
+# "007" e "1.50" continuam texto). Assim o hash de cada linha bate com o da carga ao vivo.
+
+SNAPSHOT_PATH_PADRAO = os.path.join("dados", "snapshot")
+_INTEIRO = re.compile(r"-?(0|[1-9]\d*)")
+
+
+def _restaurar_valor(texto):
+    if _INTEIRO.fullmatch(texto):
+        return int(texto)
+    try:
+        numero = float(texto)
+    except ValueError:
+        return texto
+    return numero if repr(numero) == texto else texto
+
+
+def _restaurar_coluna(serie):
+    serie = serie.fillna("").astype(str)
+    return serie.map({v: _restaurar_valor(v) for v in serie.unique()}).astype(object)
+
+
+class SnapshotDisco:
+    def __init__(self, pasta=SNAPSHOT_PATH_PADRAO, origem=""):
+        self.pasta = pasta
+        self.origem = origem
+        self._lock = threading.Lock()
+        self._gravados = {}
+        try:
+            import pyarrow  # noqa: F401
+            self.disponivel = True
+        except ImportError:
+            self.disponivel = False
+
+    def _caminhos(self, tab_name):
+        base = os.path.join(self.pasta, tab_name)
+        return base + ".parquet", base + ".json"
+
+    def carregar(self, tab_name):
+        # (DataFrame, carimbo) ou None se não houver snapshot desta origem
+        if not self.disponivel:
+            return None
+        arquivo, carimbo_arquivo = self._caminhos(tab_name)
+        try:
+            with open(carimbo_arquivo, encoding="utf-8") as f:
+                carimbo = json.load(f)
+            if carimbo.get("origem") != self.origem:
+                return None
+            df = pd.read_parquet(arquivo)
+        except (OSError, ValueError):
+            return None
+        if isinstance(carimbo.get("versao_backend"), list):
+            carimbo["versao_backend"] = tuple(carimbo["versao_backend"])
+        return df.apply(_restaurar_coluna), carimbo
+
+    def salvar(self, tab_name, df, versao_backend=None, verificado_em=None, pedido=None):
+        if not self.disponivel:
+            return
+        pedido = time.monotonic() if pedido is None else pedido
+        arquivo, carimbo_arquivo = self._caminhos(tab_name)
+        carimbo = {
+            "origem": self.origem, "versao_backend": versao_backend, "linhas": len(df),
+            "salvo_em": time.time(), "verificado_em": verificado_em or time.time(),
+        }
+        with self._lock:
+            # Gravações em segundo plano podem chegar fora de ordem: não sobrescreve uma mais nova
+            if pedido < self._gravados.get(tab_name, float("-inf")):
+                return
+            self._gravados[tab_name] = pedido
+            os.makedirs(self.pasta, exist_ok=True)
+            # Grava em arquivos temporários e troca no fim: quem lê nunca vê um snapshot pela metade
+            df.astype(str).to_parquet(arquivo + ".tmp", index=False)
+            with open(carimbo_arquivo + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(carimbo, f)
+            os.replace(arquivo + ".tmp", arquivo)
+            os.replace(carimbo_arquivo + ".tmp", carimbo_arquivo)
+
+    def salvar_em_segundo_plano(self, tab_name, df, versao_backend=None, verificado_em=None):
+        # O DataFrame da aba nunca é alterado no lugar (cada sincronização troca a referência)
+        threading.Thread(
+            target=self.salvar, args=(tab_name, df, versao_backend, verificado_em, time.monotonic()), daemon=True
+        ).start()
@@ -0,0 +1,433 @@
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from schema import HEADERS
+from diff import ConflitoEdicao, conflitos
+from instrumentacao import registrar_chamada_api
+
+# ==============================================================================
+# 💾 CAMADA DE ARMAZENAMENTO (GOOGLE SHEETS OU SQLITE LOCAL)
+# ==============================================================================
+# Todos os backends expõem a mesma interface usada pelo app:
+#   init_headers(tab), read_all(tab), append_rows(tab, rows), replace_all(tab, df)
+#   read_many(tabs) -> {tab: DataFrame}, todas as abas numa ida só (ou em paralelo)
+#   read_values(tab, inicio) -> linhas de dados a partir da posição `inicio` (0 = primeira após o cabeçalho)
+#   iter_chunks(tab, tamanho) -> DataFrames de até `tamanho` linhas, na ordem da aba (exportação)
+#   versao(tab) -> (n_linhas, n_edicoes) barato de consultar, ou None se o backend não souber informar
+#   modificado_em() -> marca da última alteração do arquivo inteiro (modifiedTime do Drive), ou None
+#   apply_diff(tab, diff) -> grava um DiffTabela (células, linhas novas e excluídas) de forma atômica,
+#                            ou levanta ConflitoEdicao se as linhas tocadas mudaram desde a edição (ver diff.py)
+# O backend é escolhido na seção [storage] do secrets.toml.
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+SPREADSHEET_KEY = "1lKH8BrZ0LVi_tufuv9_kEeOhJGLueSQahh-6Ft1_idA"
+KEYFILE_PADRAO = "rwilliammelo-7509a86c9df0.json"
+SQLITE_PATH_PADRAO = os.path.join("dados", "matriculas.db")
+
+
+def _status_http(e):
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+
+def _reconecta(metodo):
+    # Se o token expirou ou foi revogado (401), reautoriza uma vez e repete a chamada
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        except Exception as e:
+            if _status_http(e) != 401 or self._abrir is None:
+                raise
+            self.reconectar()
+            return metodo(self, *args, **kwargs)
+    return wrapper
+
+
+def _linha_completa(row):
+    # Garante exatamente uma célula por coluna de HEADERS
+    row = list(row)[:len(HEADERS)]
+    return row + [""] * (len(HEADERS) - len(row))
+
+
+class GoogleSheetsBackend:
+    nome = "gsheets"
+
+    def __init__(self, sh, abrir=None):
+        self.sh = sh
+        self._abrir = abrir
+        self._worksheets = {}
+        self._tabs_prontas = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def conectar(cls, config, spreadsheet_key=SPREADSHEET_KEY):
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        def abrir():
+            if "gsheets" in config:
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(config["gsheets"]), SCOPES)
+            else:
+                creds = ServiceAccountCredentials.from_json_keyfile_name(KEYFILE_PADRAO, SCOPES)
+            # A sessão autorizada do gspread já renova o access token sozinha e reaproveita
+            # conexões (keep-alive); aumentamos o pool para o worker da fila e as sessões simultâneas.
+            client = gspread.authorize(creds)
+            sessao = getattr(client, "session", None) or getattr(getattr(client, "http_client", None), "session", None)
+            if sessao is not None:
+                from requests.adapters import HTTPAdapter
+                sessao.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            registrar_chamada_api("leitura", "open_by_key")
+            return client.open_by_key(spreadsheet_key)
+
+        return cls(abrir(), abrir)
+
+    def reconectar(self):
+        sh = self._abrir()
+        with self._lock:
+            self.sh, self._worksheets = sh, {}
+
+    def worksheet(self, tab_name):
+        # Handles memorizados: sh.worksheet() busca os metadados da planilha a cada chamada
+        with self._lock:
+            ws = self._worksheets.get(tab_name)
+        if ws is None:
+            registrar_chamada_api("leitura", "worksheet")
+            ws = self.sh.worksheet(tab_name)
+            with self._lock:
+                self._worksheets[tab_name] = ws
+        return ws
+
+    @_reconecta
+    def init_headers(self, tab_name):
+        # Uma verificação por aba e processo: depois do cabeçalho criado ele não some
+        if tab_name in self._tabs_prontas:
+            return
+        ws = self.worksheet(tab_name)
+        registrar_chamada_api("leitura", "acell")
+        if not ws.acell('A1').value:
+            registrar_chamada_api("escrita", "append_row")
+            ws.append_row(HEADERS)
+        self._tabs_prontas.add(tab_name)
+
+    @_reconecta
+    def read_all(self, tab_name):
+        worksheet = self.worksheet(tab_name)
+        registrar_chamada_api("leitura", "get_all_records")
+        return pd.DataFrame(worksheet.get_all_records())
+
+    @_reconecta
+    def _read_batch(self, tabs):
+        from gspread.utils import numericise_all, rowcol_to_a1
+
+        col_final = re.sub(r"\d", "", rowcol_to_a1(1, len(HEADERS)))
+        registrar_chamada_api("leitura", "values_batch_get")
+        resposta = self.sh.values_batch_get([f"'{tab}'!A1:{col_final}" for tab in tabs])
+        tabelas = {}
+        for tab_name, intervalo in zip(tabs, resposta.get("valueRanges", [])):
+            valores = intervalo.get("values", [])
+            if not valores:
+                tabelas[tab_name] = pd.DataFrame()
+                continue
+            # Mesmo resultado do get_all_records: cabeçalho da 1ª linha e conversão numérica
+            cabecalho = valores[0]
+            linhas = [numericise_all((r + [""] * len(cabecalho))[:len(cabecalho)], empty2zero=False, default_blank="")
+                      for r in valores[1:]]
+            tabelas[tab_name] = pd.DataFrame(linhas, columns=cabecalho)
+        return tabelas
+
+    def read_many(self, tabs):
+        # Um único spreadsheets.values.batchGet para todas as abas; se falhar (ex.: aba ainda
+        # não existe), cada aba é lida em paralelo pelo caminho normal
+        tabs = list(tabs)
+        try:
+            return self._read_batch(tabs)
+        except Exception:
+            with ThreadPoolExecutor(max_workers=min(8, len(tabs)) or 1) as pool:
+                return dict(zip(tabs, pool.map(self.read_all, tabs)))
+
+    def read_values(self, tab_name, inicio=0):
+        # Intervalo aberto (ex.: A120:AG) devolve só as linhas que existem a partir de `inicio`
+        return self._ler_intervalo(tab_name, inicio)
+
+    @_reconecta
+    def _ler_intervalo(self, tab_name, inicio, fim=None):
+        from gspread.utils import numericise_all, rowcol_to_a1
+
+        # Posições `inicio` (inclusive) a `fim` (exclusive); a linha 1 da aba é o cabeçalho
+        col_final = re.sub(r"\d", "", rowcol_to_a1(1, len(HEADERS)))
+        worksheet = self.worksheet(tab_name)
+        registrar_chamada_api("leitura", "get")
+        valores = worksheet.get(f"A{inicio + 2}:{col_final}{'' if fim is None else fim + 1}")
+        # Mesma conversão numérica do get_all_records, para as linhas baterem com a carga completa
+        return [numericise_all(_linha_completa(r), empty2zero=False, default_blank="") for r in valores]
+
+    def iter_chunks(self, tab_name, tamanho=5000):
+        # Uma leitura por faixa de linhas: a aba nunca é carregada inteira de uma vez
+        inicio = 0
+        while True:
+            linhas = self._ler_intervalo(tab_name, inicio, inicio + tamanho)
+            if not linhas:
+                return
+            yield pd.DataFrame(linhas, columns=HEADERS)
+            if len(linhas) < tamanho:
+                return
+            inicio += tamanho
+
+    def versao(self, tab_name):
+        return None
+
+    def modificado_em(self):
+        # Sinal barato de mudança: o modifiedTime do arquivo no Drive (só metadados, nenhuma célula).
+        # Muda com qualquer escrita, inclusive edição à mão; None se o Drive não responder.
+        # O SincronizadorDelta lê uma vez por rodada de sincronização, para todas as abas.
+        try:
+            return self._ler_marca()
+        except Exception:
+            return None
+
+    @_reconecta
+    def _ler_marca(self):
+        registrar_chamada_api("leitura", "get_lastUpdateTime")
+        return self.sh.get_lastUpdateTime()
+
+    @_reconecta
+    def append_rows(self, tab_name, rows):
+        if rows:
+            worksheet = self.worksheet(tab_name)
+            registrar_chamada_api("escrita", "append_rows")
+            worksheet.append_rows([list(r) for r in rows])
+
+    @_reconecta
+    def replace_all(self, tab_name, df):
+        worksheet = self.worksheet(tab_name)
+        registrar_chamada_api("escrita", "clear")
+        worksheet.clear()
+        # fillna("") evita erros de NaN no JSON do Google
+        dados_lista = [df.columns.values.tolist()] + df.fillna("").values.tolist()
+        registrar_chamada_api("escrita", "update")
+        worksheet.update(range_name='A1', values=dados_lista)
+
+    @_reconecta
+    def apply_diff(self, tab_name, diff):
+        # Um único spreadsheets.batchUpdate: a API aplica todas as requisições ou nenhuma,
+        # então uma falha no meio não deixa a aba pela metade.
+        ws = self.worksheet(tab_name)
+        if diff.versoes:
+            # Sem transação no Sheets: relê as linhas tocadas logo antes de gravar (janela curta)
+            inicio, fim = min(diff.versoes), max(diff.versoes) + 1
+            linhas = self._ler_intervalo(tab_name, inicio, fim)
+            atuais = {p: [dict(zip(HEADERS, linhas[p - inicio])).get(c, "") for c in diff.colunas]
+                      if p - inicio < len(linhas) else None for p in diff.versoes}
+            alteradas = conflitos(diff, atuais)
+            if alteradas:
+                raise ConflitoEdicao(alteradas)
+        requests = []
+        for posicao, coluna, valor in diff.celulas:
+            requests.append({"updateCells": {
+                "rows": [{"values": [_celula_api(valor)]}],
+                "fields": "userEnteredValue",
+                "start": {"sheetId": ws.id, "rowIndex": posicao + 1, "columnIndex": diff.colunas.index(coluna)},
+            }})
+        # Exclusões de baixo para cima, para as posições anteriores continuarem válidas
+        for posicao in sorted(diff.excluidas, reverse=True):
+            requests.append({"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": posicao + 1, "endIndex": posicao + 2,
+            }}})
+        if diff.novas:
+            requests.append({"appendCells": {
+                "sheetId": ws.id,
+                "rows": [{"values": [_celula_api(v) for v in linha]} for linha in diff.novas],
+                "fields": "userEnteredValue",
+            }})
+        if requests:
+            registrar_chamada_api("escrita", "batch_update")
+            self.sh.batch_update({"requests": requests})
+
+
+def _celula_api(valor):
+    if isinstance(valor, bool):
+        return {"userEnteredValue": {"boolValue": valor}}
+    if isinstance(valor, (int, float)):
+        return {"userEnteredValue": {"numberValue": valor}}
+    return {"userEnteredValue": {"stringValue": str(valor)}}
+
+
+class SQLiteBackend:
+    # Uma tabela SQLite por aba; a ordem das linhas (rowid) espelha a ordem da planilha.
+    nome = "sqlite"
+
+    def __init__(self, caminho=SQLITE_PATH_PADRAO):
+        pasta = os.path.dirname(caminho)
+        if pasta and caminho != ":memory:":
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._tabs_prontas = set()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    @staticmethod
+    def _tabela(tab_name):
+        if not re.fullmatch(r"[A-Za-z0-9_]+", tab_name):
+            raise ValueError(f"Nome de aba inválido: {tab_name}")
+        return f'"{tab_name}"'
+
+    def init_headers(self, tab_name):
+        if tab_name in self._tabs_prontas:
+            return
+        tabela = self._tabela(tab_name)
+        # Colunas sem tipo declarado: números continuam números, como no get_all_records
+        colunas = ", ".join(f'"{c}"' for c in HEADERS)
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ({colunas})")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS _controle (tab TEXT PRIMARY KEY, edicoes INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO _controle VALUES (?, 0)", (tab_name,))
+            for coluna in ("bairro", "ano_serie", "nm_estudante"):
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{tab_name}_{coluna}" ON {tabela} ("{coluna}")'
+                )
+        self._tabs_prontas.add(tab_name)
+
+    def read_all(self, tab_name):
+        self.init_headers(tab_name)
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT * FROM {self._tabela(tab_name)} ORDER BY rowid", self._conn)
+        return df.fillna("")
+
+    def read_many(self, tabs):
+        # Arquivo local: ler em sequência já é mais rápido que abrir conexões em paralelo
+        return {tab_name: self.read_all(tab_name) for tab_name in tabs}
+
+    def read_values(self, tab_name, inicio=0):
+        self.init_headers(tab_name)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM {self._tabela(tab_name)} ORDER BY rowid LIMIT -1 OFFSET ?", (int(inicio),)
+            )
+            return [["" if v is None else v for v in r] for r in cursor]
+
+    def iter_chunks(self, tab_name, tamanho=5000):
+        # Conexão própria de leitura: o cursor fica aberto entre os pedaços sem segurar o lock
+        self.init_headers(tab_name)
+        if self.caminho == ":memory:":
+            yield self.read_all(tab_name)
+            return
+        conn = sqlite3.connect(self.caminho)
+        try:
+            for pedaco in pd.read_sql_query(
+                f"SELECT * FROM {self._tabela(tab_name)} ORDER BY rowid", conn, chunksize=tamanho
+            ):
+                yield pedaco.fillna("")
+        finally:
+            conn.close()
+
+    def versao(self, tab_name):
+        self.init_headers(tab_name)
+        with self._lock:
+            n_linhas = self._conn.execute(f"SELECT COUNT(*) FROM {self._tabela(tab_name)}").fetchone()[0]
+            edicoes = self._conn.execute("SELECT edicoes FROM _controle WHERE tab = ?", (tab_name,)).fetchone()[0]
+        return n_linhas, edicoes
+
+    def modificado_em(self):
+        # versao() já é exata e barata aqui
+        return None
+
+    def _registrar_edicao(self, tab_name):
+        # Chamado dentro da transação de qualquer escrita que não seja um simples append
+        self._conn.execute("UPDATE _controle SET edicoes = edicoes + 1 WHERE tab = ?", (tab_name,))
+
+    def append_rows(self, tab_name, rows):
+        if not rows:
+            return
+        self.init_headers(tab_name)
+        marcadores = ", ".join("?" * len(HEADERS))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO {self._tabela(tab_name)} VALUES ({marcadores})",
+                [_linha_completa(r) for r in rows],
+            )
+
+    def replace_all(self, tab_name, df):
+        # DELETE + INSERT na mesma transação: ou grava tudo ou não altera nada
+        self.init_headers(tab_name)
+        linhas = df.reindex(columns=HEADERS).fillna("").values.tolist()
+        marcadores = ", ".join("?" * len(HEADERS))
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._tabela(tab_name)}")
+            self._conn.executemany(f"INSERT INTO {self._tabela(tab_name)} VALUES ({marcadores})", linhas)
+            self._registrar_edicao(tab_name)
+
+    def apply_diff(self, tab_name, diff):
+        # Tudo numa transação: qualquer erro desfaz as alterações já feitas (rollback)
+        self.init_headers(tab_name)
+        tabela = self._tabela(tab_name)
+        marcadores = ", ".join("?" * len(HEADERS))
+        with self._lock, self._conn:
+            # IMMEDIATE: outro processo não grava entre a checagem das versões e o UPDATE
+            self._conn.execute("BEGIN IMMEDIATE")
+            rowids = [r[0] for r in self._conn.execute(f"SELECT rowid FROM {tabela} ORDER BY rowid")]
+            if diff.versoes:
+                desconhecidas = [c for c in diff.colunas if c not in HEADERS]
+                if desconhecidas:
+                    raise ValueError(f"Coluna desconhecida: {desconhecidas[0]}")
+                colunas = ", ".join(f'"{c}"' for c in diff.colunas)
+                atuais = {
+                    p: list(self._conn.execute(f"SELECT {colunas} FROM {tabela} WHERE rowid = ?", (rowids[p],)).fetchone())
+                    if p < len(rowids) else None for p in diff.versoes
+                }
+                alteradas = conflitos(diff, atuais)
+                if alteradas:
+                    raise ConflitoEdicao(alteradas)
+            for posicao, coluna, valor in diff.celulas:
+                if coluna not in HEADERS:
+                    raise ValueError(f"Coluna desconhecida: {coluna}")
+                self._conn.execute(f'UPDATE {tabela} SET "{coluna}" = ? WHERE rowid = ?', (valor, rowids[posicao]))
+            if diff.excluidas:
+                self._conn.executemany(
+                    f"DELETE FROM {tabela} WHERE rowid = ?", [(rowids[p],) for p in diff.excluidas]
+                )
+            if diff.novas:
+                novas = [dict(zip(diff.colunas, linha)) for linha in diff.novas]
+                self._conn.executemany(
+                    f"INSERT INTO {tabela} VALUES ({marcadores})",
+                    [[linha.get(c, "") for c in HEADERS] for linha in novas],
+                )
+            self._registrar_edicao(tab_name)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def criar_backend(config):
+    opcoes = dict(config.get("storage", {}))
+    tipo = opcoes.get("backend", "gsheets")
+    if tipo == "sqlite":
+        return SQLiteBackend(opcoes.get("sqlite_path", SQLITE_PATH_PADRAO))
+    if tipo == "gsheets":
+        return GoogleSheetsBackend.conectar(config, opcoes.get("spreadsheet_key", SPREADSHEET_KEY))
+    raise ValueError(f"Backend de armazenamento desconhecido: {tipo}")
+
+
+def chave_backend(config):
+    # Identifica a origem dos dados (backend + planilha/arquivo + credencial)
+    credencial = dict(config.get("gsheets", {})).get("client_email", "")
+    return json.dumps([dict(config.get("storage", {})), credencial], sort_keys=True, default=str)
+
+
+def obter_backend(config):
+    # Um backend por configuração, compartilhado pelo processo inteiro (reruns, sessões e worker
+    # da fila): autorização e metadados da planilha são feitos uma vez só.
+    chave = chave_backend(config)
+    with _backends_lock:
+        if chave not in _backends:
+            _backends[chave] = criar_backend(config)
+        return _backends[chave]
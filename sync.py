@@ -0,0 +1,345 @@
+import threading
+import time
+
+import pandas as pd
+
+from duplicados import chaves_duplicata, indexar
+
+# ==============================================================================
+# 🔁 SINCRONIZAÇÃO INCREMENTAL (DELTA) DAS ABAS
+# ==============================================================================
+# Mantém um DataFrame local por aba e, a cada sincronização, busca só o que mudou:
+# - backends com versao() (SQLite): compara (n_linhas, n_edicoes) e baixa só as linhas novas;
+# - backends sem versao() (Google Sheets): confere o modifiedTime do arquivo (modificado_em);
+#   se não mudou, não lê nada. Se mudou por uma escrita anunciada pelo app (marcar_alterada, aqui ou
+#   pelo canal), relê a última linha conhecida como âncora junto com as novas; se mudou sem aviso
+#   (edição à mão em qualquer linha) ou a âncora mudou, faz uma carga completa. Sem o sinal do
+#   Drive, e como rede de segurança no caminho da âncora, há carga completa a cada INTERVALO_VERIFICACAO.
+# A `versao` de cada aba só muda quando o conteúdo muda, para os caches de gráficos reaproveitarem.
+# Cada aba também mantém o índice de duplicatas (ver duplicados.py), atualizado junto com o delta.
+#
+# Stale-while-revalidate: com TTL vencido a leitura devolve o que já está em memória (ou o
+# snapshot em disco, ao reiniciar) e sincroniza numa thread. Só bloqueia quando não há dado
+# nenhum, quando o próprio app acabou de gravar (marcar_alterada) ou com forcar=True.
+# Se o backend falhar, a aba continua com a última versão boa e guarda o erro.
+#
+# Dois locks: `_lock_sync` serializa as sincronizações e fica preso durante a rede; `_lock` só
+# protege a troca do par (df, versao) e do índice de duplicatas, que são publicados juntos.
+# A leitura nunca espera uma revalidação e sempre devolve cada DataFrame com a sua própria versão.
+#
+# Com várias réplicas, `canal` (ver coordenacao.py) leva as escritas de uma réplica às outras:
+# marcar_alterada publica o contador da aba e cada leitura confere se outra réplica gravou.
+
+TTL_PADRAO = 60
+INTERVALO_VERIFICACAO = 600
+
+
+def hash_linhas(df):
+    if df.empty:
+        return pd.Series([], dtype="uint64")
+    return pd.util.hash_pandas_object(df.astype(str), index=False).reset_index(drop=True)
+
+
+class EstadoAba:
+    def __init__(self, tab_name, lock=None):
+        self.tab_name = tab_name
+        self.lock = lock or threading.Lock()
+        self.df = None
+        self.hashes = pd.Series([], dtype="uint64")
+        self.versao_backend = None
+        self.marca_arquivo = None  # modificado_em() do backend na última leitura confirmada
+        self.versao = 0
+        self.ultima_sync = 0.0
+        self.ultima_verificacao = 0.0
+        self.carga_completa_pendente = False
+        self.indice = {}
+        self.recentes = set()  # chaves gravadas pelo app que ainda não voltaram numa sincronização
+        self.alterada = False
+        self.atualizado_em = None  # última confirmação com o backend
+        self.fonte = None          # "backend" ou "snapshot"
+        self.erro = None
+
+    def _trocar_df(self, df):
+        novos_hashes = hash_linhas(df)
+        mudou = self.df is None or len(novos_hashes) != len(self.hashes) or not novos_hashes.equals(self.hashes)
+        if not mudou:
+            return False
+        df = df.reset_index(drop=True)
+        indice = indexar({}, chaves_duplicata(df))
+        with self.lock:
+            self.df, self.hashes, self.indice = df, novos_hashes, indice
+            self.versao += 1
+            self.recentes -= indice.keys()
+        return True
+
+    def carga_completa(self, backend, df=None, marca=None):
+        # `df` já lido por um read_many; senão lê só esta aba. O cabeçalho só é conferido
+        # se a aba veio vazia (init_headers fica memorizado no backend depois da 1ª vez).
+        # `marca` (modificado_em) é lida pelo chamador antes dos dados: uma escrita no meio do
+        # caminho aparece na próxima conferência.
+        if df is None or df.empty:
+            try:
+                backend.init_headers(self.tab_name)
+            except Exception:
+                pass
+        if df is None:
+            df = backend.read_all(self.tab_name)
+        self.versao_backend = backend.versao(self.tab_name)
+        self.marca_arquivo = marca
+        self.ultima_sync = self.ultima_verificacao = time.time()
+        self.carga_completa_pendente = False
+        return self._trocar_df(df)
+
+    def restaurar(self, df, carimbo):
+        self._trocar_df(df)
+        self.versao_backend = carimbo.get("versao_backend")
+        self.ultima_verificacao = self.atualizado_em = carimbo.get("verificado_em", 0.0)
+        self.fonte = "snapshot"
+
+    def confirmar(self):
+        self.atualizado_em = time.time()
+        self.fonte, self.erro, self.alterada = "backend", None, False
+
+    def falhou(self, erro):
+        # Sem nada para servir o erro sobe; com dados (em memória ou snapshot) a aba segue com eles
+        if self.df is None:
+            raise erro
+        self.erro = str(erro) or type(erro).__name__
+        self.ultima_sync = time.time()
+
+    def precisa_carga_completa(self):
+        return self.df is None or self.df.empty or self.carga_completa_pendente
+
+    def _anexar(self, linhas):
+        if not linhas:
+            return False
+        colunas = list(self.df.columns)
+        novas = pd.DataFrame([list(r)[:len(colunas)] + [""] * (len(colunas) - len(r)) for r in linhas], columns=colunas)
+        chaves = chaves_duplicata(novas)
+        df = pd.concat([self.df, novas], ignore_index=True)
+        hashes = pd.concat([self.hashes, hash_linhas(novas)], ignore_index=True)
+        with self.lock:
+            indexar(self.indice, chaves, inicio=len(self.df))
+            self.recentes -= self.indice.keys()
+            self.df, self.hashes = df, hashes
+            self.versao += 1
+        return True
+
+    def sincronizar(self, backend, marca=None, forcar=False):
+        # `marca`: modificado_em() lido uma vez por rodada de sincronização, antes de qualquer dado
+        self.ultima_sync = time.time()
+        if self.precisa_carga_completa():
+            return self.carga_completa(backend, marca=marca)
+
+        n_local = len(self.df)
+        versao_backend = backend.versao(self.tab_name)
+        if versao_backend is not None:
+            n_remoto, edicoes = versao_backend
+            if versao_backend == self.versao_backend:
+                return False
+            if self.versao_backend is None or edicoes != self.versao_backend[1] or n_remoto < n_local:
+                return self.carga_completa(backend, marca=marca)
+            mudou = self._anexar(backend.read_values(self.tab_name, n_local))
+            self.versao_backend = versao_backend
+            return mudou
+
+        if marca is not None and not self.alterada and (marca != self.marca_arquivo or not forcar):
+            # Sem escrita anunciada, o sinal do Drive decide: se mudou, pode ter sido qualquer linha.
+            # Com `forcar` e sinal parado ainda confere a âncora (o modifiedTime do Drive pode atrasar)
+            return False if marca == self.marca_arquivo else self.carga_completa(backend, marca=marca)
+        if time.time() - self.ultima_verificacao > INTERVALO_VERIFICACAO:
+            return self.carga_completa(backend, marca=marca)
+        linhas = backend.read_values(self.tab_name, n_local - 1)
+        if not linhas:
+            # A última linha conhecida sumiu: houve exclusão
+            return self.carga_completa(backend, marca=marca)
+        ancora = pd.DataFrame([linhas[0][:len(self.df.columns)]], columns=self.df.columns)
+        if hash_linhas(ancora).iloc[0] != self.hashes.iloc[-1]:
+            return self.carga_completa(backend, marca=marca)
+        self.marca_arquivo = marca
+        return self._anexar(linhas[1:])
+
+
+class SincronizadorDelta:
+    def __init__(self, ttl=TTL_PADRAO, snapshot=None, canal=None):
+        self.ttl = ttl
+        self.snapshot = snapshot
+        self.canal = canal
+        self._vistas = {}  # aba -> (mudancas, edicoes) do canal já tratadas por esta réplica
+        self._estados = {}
+        self._lock = threading.Lock()
+        self._lock_sync = threading.Lock()
+        self._lock_revalidacao = threading.Lock()
+        self._revalidando = set()
+
+    def _estado(self, tab_name):
+        # Não chamar com self._lock: restaurar o snapshot publica o df pelo mesmo lock
+        estado = self._estados.get(tab_name)
+        if estado is None:
+            estado = EstadoAba(tab_name, self._lock)
+            salvo = self.snapshot.carregar(tab_name) if self.snapshot is not None else None
+            if salvo is not None:
+                estado.restaurar(*salvo)
+            estado = self._estados.setdefault(tab_name, estado)
+        return estado
+
+    def _sincronizar(self, backend, tabs, forcar=False):
+        # Chamado com self._lock_sync (nunca com self._lock: aqui há rede). Abas que precisam de carga completa vêm todas num read_many.
+        # O sinal de mudança do arquivo é lido uma vez por rodada, sempre na hora (nunca de uma rodada anterior).
+        if not tabs:
+            return
+        versoes = {t: self._estados[t].versao for t in tabs}
+        marca = backend.modificado_em()
+        lote = [t for t in tabs if self._estados[t].precisa_carga_completa()]
+        if len(lote) > 1:
+            try:
+                for tab_name, df in backend.read_many(lote).items():
+                    self._estados[tab_name].carga_completa(backend, df, marca)
+                    self._estados[tab_name].confirmar()
+            except Exception as e:
+                for tab_name in lote:
+                    self._estados[tab_name].falhou(e)
+        else:
+            lote = []
+        for tab_name in tabs:
+            if tab_name in lote:
+                continue
+            estado = self._estados[tab_name]
+            try:
+                estado.sincronizar(backend, marca, forcar)
+                estado.confirmar()
+            except Exception as e:
+                estado.falhou(e)
+        if self.snapshot is not None:
+            for tab_name in tabs:
+                estado = self._estados[tab_name]
+                if estado.versao != versoes[tab_name] and estado.fonte == "backend":
+                    self.snapshot.salvar_em_segundo_plano(tab_name, estado.df, estado.versao_backend, estado.ultima_verificacao)
+
+    def _revalidar(self, backend, tabs):
+        with self._lock_revalidacao:
+            tabs = [t for t in tabs if t not in self._revalidando]
+            self._revalidando.update(tabs)
+        if not tabs:
+            return
+
+        def rodar():
+            try:
+                with self._lock_sync:
+                    self._sincronizar(backend, [t for t in tabs if time.time() - self._estados[t].ultima_sync > self.ttl])
+            finally:
+                with self._lock_revalidacao:
+                    self._revalidando.difference_update(tabs)
+        threading.Thread(target=rodar, daemon=True).start()
+
+    def _ouvir_canal(self, tabs):
+        # Escritas publicadas por outras réplicas viram marcar_alterada local (sem republicar)
+        if self.canal is None:
+            return
+        try:
+            versoes = self.canal.versoes(tabs)
+        except Exception:
+            return
+        for tab_name, versao in versoes.items():
+            vista = self._vistas.get(tab_name)
+            self._vistas[tab_name] = versao
+            if vista is not None and versao != vista:
+                self._marcar(tab_name, completa=versao[1] != vista[1])
+
+    def obter_varias(self, backend, tabs, forcar=False):
+        # Devolve ({aba: DataFrame}, {aba: versao}), lidos juntos: a versão é sempre a do DataFrame
+        # entregue, então serve de chave de cache. `backend=None` (sem conexão) serve só o que já existe.
+        self._ouvir_canal(tabs)
+        estados = [self._estados.get(t) for t in tabs]
+        pronto = not forcar and all(e is not None and e.df is not None and not e.alterada for e in estados)
+        if not pronto:
+            # Sem lock no caminho rápido: uma revalidação em andamento não trava a leitura
+            with self._lock_sync:
+                estados = [self._estado(t) for t in tabs]
+                bloqueantes = [e.tab_name for e in estados if forcar or e.df is None or e.alterada]
+                if backend is not None and bloqueantes:
+                    self._sincronizar(backend, bloqueantes, forcar)
+        agora = time.time()
+        vencidas = [e.tab_name for e in estados if e.df is not None and agora - e.ultima_sync > self.ttl]
+        if backend is not None and vencidas:
+            self._revalidar(backend, vencidas)
+        with self._lock:
+            leitura = [(e.tab_name, e.df, e.versao) for e in estados]
+        tabelas = {t: df.copy(deep=False) if df is not None else pd.DataFrame() for t, df, _ in leitura}
+        return tabelas, {t: versao for t, _, versao in leitura}
+
+    def obter(self, backend, tab_name, forcar=False):
+        return self.obter_varias(backend, [tab_name], forcar)[0][tab_name]
+
+    def situacao(self, *tabs):
+        # {aba: (atualizado_em, fonte, erro, revalidando)} para o aviso de dados desatualizados
+        with self._lock_revalidacao:
+            revalidando = set(self._revalidando)
+        return {
+            t: (e.atualizado_em, e.fonte, e.erro, t in revalidando)
+            for t, e in ((t, self._estados.get(t)) for t in tabs) if e is not None
+        }
+
+    def versao(self, *tabs):
+        # Sem lock e sem criar estado; para chave de cache use as versões de obter_varias
+        estados = [self._estados.get(t) for t in tabs]
+        return tuple(e.versao if e is not None else 0 for e in estados)
+
+    def marcar_alterada(self, tab_name, completa=False):
+        # Após uma escrita do próprio app: sincroniza na próxima leitura, sem esperar o TTL,
+        # e avisa as outras réplicas pelo canal
+        self._marcar(tab_name, completa)
+        if self.canal is not None:
+            try:
+                self._vistas[tab_name] = self.canal.publicar(tab_name, completa)
+            except Exception:
+                pass
+
+    def _marcar(self, tab_name, completa=False):
+        estado = self._estado(tab_name)
+        with self._lock:
+            estado.ultima_sync = 0.0
+            estado.alterada = True
+            if completa:
+                estado.carga_completa_pendente = True
+
+    def _estados_de(self, tabs):
+        # Só as abas pedidas (ex.: as partições do ano letivo), ou todas as já carregadas
+        return [(t, e) for t, e in list(self._estados.items()) if tabs is None or t in tabs]
+
+    def buscar_duplicata(self, chave, tabs=None, backend=None):
+        # [(aba, posição)] com a mesma chave; posição None = gravado agora há pouco, ainda na fila.
+        # Nunca espera a rede: consulta o índice em memória (ou do snapshot) e os `recentes`; com
+        # `backend`, abas vencidas, alteradas ou ainda vazias sincronizam numa thread.
+        if tabs is not None:
+            self._ouvir_canal(tabs)
+            estados = [self._estado(t) for t in tabs]
+            agora = time.time()
+            atrasadas = [e.tab_name for e in estados if e.df is None or e.alterada or agora - e.ultima_sync > self.ttl]
+            if backend is not None and atrasadas:
+                self._revalidar(backend, atrasadas)
+        with self._lock:
+            estados = self._estados_de(tabs)
+            achados = [(tab, p) for tab, estado in estados for p in estado.indice.get(chave, [])]
+            achados += [(tab, None) for tab, estado in estados if chave in estado.recentes]
+        return achados
+
+    def registrar_salva(self, tab_name, chave):
+        if chave:
+            estado = self._estado(tab_name)
+            with self._lock:
+                estado.recentes.add(chave)
+
+    def duplicatas_exatas(self, tabs=None):
+        # chave -> [(aba, posição)] para as chaves que aparecem mais de uma vez (nas abas pedidas somadas)
+        with self._lock:
+            todas = {}
+            for tab, estado in self._estados_de(tabs):
+                for chave, posicoes in estado.indice.items():
+                    todas.setdefault(chave, []).extend((tab, p) for p in posicoes)
+        return {chave: locais for chave, locais in todas.items() if len(locais) > 1}
+
+    def marcar_todas(self, completa=False):
+        # Recarga pedida pelo usuário: só nesta réplica, nada foi gravado
+        for tab_name in list(self._estados):
+            self._marcar(tab_name, completa)
@@ -0,0 +1,53 @@
+import os
+import threading
+
+from coordenacao import CanalVersoes
+
+# ==============================================================================
+# 🧪 CANAL DE VERSÕES COM DUAS CONEXÕES PUBLICANDO AO MESMO TEMPO
+# ==============================================================================
+# Cada CanalVersoes tem a sua conexão ao mesmo arquivo, como réplicas diferentes do app.
+
+
+class _ConexaoComIntrusa:
+    # Repassa tudo à conexão real; logo depois do INSERT, a outra réplica publica a mesma aba
+    def __init__(self, conn, outra, resultados):
+        self._conn, self._outra, self._resultados = conn, outra, resultados
+        self.intrusa = None
+
+    def execute(self, sql, *args):
+        cursor = self._conn.execute(sql, *args)
+        if sql.startswith("INSERT") and self.intrusa is None:
+            self.intrusa = threading.Thread(target=lambda: self._resultados.append(self._outra.publicar("Aba")))
+            self.intrusa.start()
+            self.intrusa.join(0.3)
+        return cursor
+
+
+def test_publicar_de_duas_conexoes(tmp_path):
+    caminho = os.path.join(tmp_path, "canal.db")
+    canal, outra, resultados = CanalVersoes(caminho), CanalVersoes(caminho), []
+    canal._conn = conexao = _ConexaoComIntrusa(canal._conn, outra, resultados)
+    minha = canal.publicar("Aba")
+    conexao.intrusa.join()
+    # Cada publicação devolve um contador diferente: nenhuma réplica lê o incremento da outra
+    assert sorted([minha[0], resultados[0][0]]) == [1, 2]
+    assert outra.versoes(["Aba"])["Aba"] == (2, 0)
+
+
+def test_publicacoes_simultaneas_nao_se_perdem(tmp_path):
+    caminho = os.path.join(tmp_path, "canal.db")
+    canais, vistas = [CanalVersoes(caminho), CanalVersoes(caminho)], [[], []]
+    largada = threading.Barrier(2)
+
+    def publicar(i):
+        largada.wait()
+        vistas[i].extend(canais[i].publicar("Aba", completa=k % 10 == 0)[0] for k in range(200))
+
+    threads = [threading.Thread(target=publicar, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(vistas[0] + vistas[1]) == list(range(1, 401))
+    assert canais[0].versoes(["Aba"])["Aba"] == (400, 40)
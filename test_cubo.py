@@ -0,0 +1,37 @@
+import pandas as pd
+
+import cubo
+from fake_data import gerar_linhas_fake
+from schema import HEADERS, combinar_abas
+
+# ==============================================================================
+# 🧪 CUBO DE AGREGADOS CONTRA AS LINHAS BRUTAS
+# ==============================================================================
+
+COLUNAS = ["ano_serie", "livros_qtd", "bairro"]
+
+
+def _dados():
+    return combinar_abas({"Aba": pd.DataFrame(gerar_linhas_fake(3000, seed=4)[1], columns=HEADERS)})
+
+
+def test_totais_sem_filtro_batem_com_o_bruto():
+    df = _dados()
+    c = cubo.construir_cubo(df, COLUNAS)
+    for coluna in COLUNAS:
+        obtido = cubo.contagem_por_raca(cubo.tabela(c, coluna, {"bairro": []}), coluna)
+        bruto = df.groupby([coluna, "raca_grupo"], observed=True).size().reset_index(name="count")
+        esperado = cubo.contagem_por_raca(bruto, coluna)
+        assert len(c[cubo.TOTAIS][coluna]) < len(c[coluna])
+        pd.testing.assert_frame_equal(obtido.sort_values([coluna, "raca_grupo"], ignore_index=True),
+                                      esperado.sort_values([coluna, "raca_grupo"], ignore_index=True), check_dtype=False)
+
+
+def test_filtro_recorta_o_cubo():
+    df = _dados()
+    c = cubo.construir_cubo(df, COLUNAS)
+    bairros = sorted(df["bairro"].astype(str).unique())[:2]
+    filtros = {"bairro": bairros, "ano_serie": []}
+    recorte = df[df["bairro"].astype(str).isin(bairros)]
+    assert int(cubo.tabela(c, "livros_qtd", filtros)["count"].sum()) == len(recorte)
+    assert cubo.indicadores(cubo.filtrar(c[cubo.BASE], filtros))["total"] == len(recorte)
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from diff import ConflitoEdicao, calcular_diff
+from planilha_memoria import PlanilhaMemoria
+from schema import HEADERS
+from storage import GoogleSheetsBackend, SQLiteBackend
+
+# ==============================================================================
+# 🧪 DIFF POR CÉLULA E CONCORRÊNCIA OTIMISTA NOS DOIS BACKENDS
+# ==============================================================================
+# Duas pessoas partem da mesma leitura da aba; quem salva depois só grava se as linhas
+# que tocou não mudaram nesse meio tempo. O Sheets roda sobre a PlanilhaMemoria.
+
+
+def _linha(nome):
+    valores = dict(zip(HEADERS, [""] * len(HEADERS)), nm_estudante=nome, bairro="Centro")
+    return [valores[c] for c in HEADERS]
+
+
+@pytest.fixture(params=["sqlite", "gsheets"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "app.db"))
+    else:
+        backend = GoogleSheetsBackend(PlanilhaMemoria())
+    backend.init_headers("Aba")
+    backend.append_rows("Aba", [_linha(f"Aluno {i}") for i in range(5)])
+    return backend
+
+
+def _nomes(backend):
+    return backend.read_all("Aba")["nm_estudante"].tolist()
+
+
+def test_calcular_diff_so_leva_o_que_mudou():
+    original = pd.DataFrame([_linha(f"Aluno {i}") for i in range(4)], columns=HEADERS)
+    editado = original.drop(index=3).copy()
+    editado.at[1, "nm_estudante"] = "Aluno Um"
+    editado.loc[10] = _linha("Aluno Novo")
+    editado.loc[11] = [""] * len(HEADERS)
+    diff = calcular_diff(original, editado)
+    assert diff.celulas == [(1, "nm_estudante", "Aluno Um")]
+    assert diff.excluidas == [3]
+    assert [l[HEADERS.index("nm_estudante")] for l in diff.novas] == ["Aluno Novo"]
+    assert sorted(diff.versoes) == [1, 3]
+
+
+def test_edicao_concorrente_na_mesma_linha_conflita_sem_gravar_nada(backend):
+    inicio = backend.read_all("Aba")
+    minha = inicio.copy()
+    minha.at[1, "nm_estudante"] = "Minha edição"
+    minha.at[2, "nm_estudante"] = "Outra célula minha"
+    minha.loc[99] = _linha("Linha nova minha")
+    diff = calcular_diff(inicio, minha)
+
+    alheia = inicio.copy()
+    alheia.at[1, "nm_estudante"] = "Edição de outra pessoa"
+    backend.apply_diff("Aba", calcular_diff(inicio, alheia))
+
+    with pytest.raises(ConflitoEdicao) as erro:
+        backend.apply_diff("Aba", diff)
+    assert erro.value.posicoes == [1]
+    assert _nomes(backend) == ["Aluno 0", "Edição de outra pessoa", "Aluno 2", "Aluno 3", "Aluno 4"]
+
+
+def test_exclusao_concorrente_conflita(backend):
+    inicio = backend.read_all("Aba")
+    minha = inicio.copy()
+    minha.at[4, "nm_estudante"] = "Minha edição"
+    backend.apply_diff("Aba", calcular_diff(inicio, inicio.drop(index=[3, 4])))
+    with pytest.raises(ConflitoEdicao) as erro:
+        backend.apply_diff("Aba", calcular_diff(inicio, minha))
+    assert erro.value.posicoes == [4]
+
+
+def test_linhas_diferentes_nao_conflitam(backend):
+    inicio = backend.read_all("Aba")
+    minha, alheia = inicio.copy(), inicio.copy()
+    minha.at[0, "nm_estudante"] = "Minha edição"
+    alheia.at[3, "nm_estudante"] = "Edição de outra pessoa"
+    alheia.loc[50] = _linha("Nova de outra pessoa")
+    backend.apply_diff("Aba", calcular_diff(inicio, alheia))
+    backend.apply_diff("Aba", calcular_diff(inicio, minha))
+    assert _nomes(backend) == ["Minha edição", "Aluno 1", "Aluno 2", "Edição de outra pessoa", "Aluno 4", "Nova de outra pessoa"]
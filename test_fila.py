@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+import fila
+from fila import FilaEscrita
+
+# ==============================================================================
+# 🧪 JOURNAL DA FILA DE ESCRITA: FALHAS, NOVAS TENTATIVAS E RESERVAS
+# ==============================================================================
+# O backend falso falha nas primeiras chamadas (`erros`) e depois grava em memória.
+
+
+class _Backend:
+    def __init__(self, *erros):
+        self.erros = list(erros)
+        self.linhas = []
+
+    def init_headers(self, tab_name):
+        pass
+
+    def append_rows(self, tab_name, linhas):
+        if self.erros:
+            raise self.erros.pop(0)
+        self.linhas += [(tab_name, l) for l in linhas]
+
+
+class _ErroApi(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status)
+
+
+def _fila(tmp_path):
+    f = FilaEscrita(str(tmp_path / "fila.db"))
+    f.enfileirar("Aba", [["Aluno 1"], ["Aluno 2"]])
+    return f
+
+
+def _tentativas(f):
+    return [t for (t,) in f._conn.execute("SELECT tentativas FROM pendentes ORDER BY id")]
+
+
+def test_falha_temporaria_devolve_o_lote_e_a_proxima_drenagem_envia(tmp_path):
+    f, backend = _fila(tmp_path), _Backend(_ErroApi(429), ConnectionError("rede"))
+    for _ in range(2):
+        with pytest.raises(Exception):
+            f.drenar_lote(backend)
+        assert f.pendentes() == {"Aba": 2}
+    assert _tentativas(f) == [2, 2]
+    assert f.drenar_lote(backend) == ("Aba", 2)
+    assert backend.linhas == [("Aba", ["Aluno 1"]), ("Aba", ["Aluno 2"])]
+    assert f.pendentes() == {} and f.falhas() == []
+
+
+def test_erro_permanente_vira_falha_depois_do_limite(tmp_path):
+    f = _fila(tmp_path)
+    backend = _Backend(*[ValueError("linha inválida")] * fila.MAX_TENTATIVAS_ERRO_PERMANENTE)
+    for _ in range(fila.MAX_TENTATIVAS_ERRO_PERMANENTE):
+        with pytest.raises(ValueError):
+            f.drenar_lote(backend)
+    assert f.pendentes() == {}
+    assert [(tab, n) for _, tab, n, _ in f.falhas()] == [("Aba", fila.MAX_TENTATIVAS_ERRO_PERMANENTE)] * 2
+    assert f.drenar_lote(backend) == (None, 0)
+
+
+def test_erro_temporario_nunca_vira_falha(tmp_path):
+    f = _fila(tmp_path)
+    backend = _Backend(*[_ErroApi(503)] * (fila.MAX_TENTATIVAS_ERRO_PERMANENTE + 1))
+    for _ in range(fila.MAX_TENTATIVAS_ERRO_PERMANENTE + 1):
+        with pytest.raises(_ErroApi):
+            f.drenar_lote(backend)
+    assert f.falhas() == [] and f.pendentes() == {"Aba": 2}
+
+
+def test_reserva_de_processo_morto_expira_e_outro_processo_envia(tmp_path):
+    morto = _fila(tmp_path)
+    tab_name, lote = morto._reservar()
+    assert tab_name == "Aba" and len(lote) == 2
+    # Outro processo abre o mesmo journal: enquanto a reserva vale, não pega o lote
+    vivo, backend = FilaEscrita(morto.caminho), _Backend()
+    assert vivo.drenar_lote(backend) == (None, 0)
+    with vivo._lock:
+        vivo._conn.execute("UPDATE pendentes SET reservado_em = reservado_em - ?", (fila.RESERVA_EXPIRA + 1,))
+    assert vivo.drenar_lote(backend) == ("Aba", 2)
+    assert [l for _, l in backend.linhas] == [["Aluno 1"], ["Aluno 2"]]
+    assert vivo.pendentes() == {}
@@ -0,0 +1,75 @@
+import io
+
+from openpyxl import Workbook
+
+import importacao
+
+# ==============================================================================
+# 🧪 IMPORTAÇÃO EM LOTE: NÚMERO DA LINHA E MOTIVOS DAS REJEITADAS
+# ==============================================================================
+
+CABECALHO = ["Nome do aluno", "Data de nascimento", "Série", "bairro"]
+LINHAS = [
+    ["Ana Souza", "03/05/2015", "5º ano", "Centro"],    # linha 2
+    None,                                                 # linha 3, em branco
+    ["", "2015-01-01", "4", "Centro"],                    # linha 4: nome vazio
+    ["Bruno Lima", "31/02/2015", "3", "Itaipuaçu"],      # linha 5: data inválida
+]
+
+
+def _xlsx(linhas, tamanho=2):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(CABECALHO)
+    for linha in linhas:
+        ws.append(linha or [])
+    arquivo = io.BytesIO()
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return importacao.ler_pedacos(arquivo, "lista.xlsx", tamanho)
+
+
+def _csv(linhas, tamanho=2):
+    texto = "\n".join([";".join(CABECALHO)] + [";".join(l) if l else "" for l in linhas]) + "\n"
+    return importacao.ler_pedacos(io.BytesIO(texto.encode("utf-8")), "lista.csv", tamanho)
+
+
+def _rejeitadas(pedacos):
+    pedacos = list(pedacos)
+    mapeamento = importacao.sugerir_mapeamento(list(pedacos[0].columns))
+    gravadas, relatorio = importacao.importar(pedacos, mapeamento)
+    return gravadas, dict(zip(relatorio["linha_arquivo"], relatorio["motivo"]))
+
+
+def test_linha_das_rejeitadas_apos_linha_em_branco_xlsx():
+    gravadas, rejeitadas = _rejeitadas(_xlsx(LINHAS))
+    assert gravadas == 1
+    assert rejeitadas == {4: "nome do estudante vazio", 5: "data inválida em dt_nasc_estudante"}
+
+
+def test_linha_das_rejeitadas_apos_linha_em_branco_csv():
+    gravadas, rejeitadas = _rejeitadas(_csv(LINHAS))
+    assert gravadas == 1
+    assert rejeitadas == {4: "nome do estudante vazio", 5: "data inválida em dt_nasc_estudante"}
+
+
+def _processar(**colunas):
+    pedaco = importacao.pd.DataFrame({"nm_estudante": "Ana", "ano_serie": "5", **colunas})
+    return importacao.processar_pedaco(pedaco, {c: c for c in pedaco.columns})
+
+
+def test_contagens_nao_numericas_sao_rejeitadas():
+    validas, rejeitadas = _processar(qtd_banheiros=["2", "dois", "", "1,5"], qtd_pessoas_domicilio=["4", "4", "x", "3"])
+    assert validas.index.tolist() == [0]
+    assert validas["qtd_banheiros"].tolist() == [2]
+    assert rejeitadas["motivo"].to_dict() == {
+        1: "valor não numérico em qtd_banheiros",
+        2: "valor não numérico em qtd_pessoas_domicilio",
+        3: "valor não inteiro em qtd_banheiros",
+    }
+
+
+def test_bairro_desconhecido_e_rejeitado():
+    validas, rejeitadas = _processar(bairro=["itaipuacu", "", "Bairro Inventado"])
+    assert validas["bairro"].tolist() == ["Itaipuaçu", ""]
+    assert rejeitadas["motivo"].to_dict() == {2: "bairro desconhecido"}
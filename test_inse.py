@@ -0,0 +1,59 @@
+import random
+
+import pandas as pd
+import pytest
+
+from inse import BONUS_BENS, MAPA_ESCOLARIDADE, calcular_inse, calcular_inse_batch
+
+# ==============================================================================
+# 🧪 EQUIVALÊNCIA ENTRE O INSE ESCALAR (FORMULÁRIO) E O VETORIZADO (RECÁLCULO)
+# ==============================================================================
+# Linhas aleatórias (semente fixa) no domínio que o app grava: escolaridades do mapa ou
+# fora dele, bens como lista do multiselect ou texto da planilha com espaços e vírgulas
+# sobrando, banheiros como número ou texto. Rodar: python -m pytest -q test_inse.py
+
+ESCOLARIDADES = list(MAPA_ESCOLARIDADE) + ["", None, "Pós-graduação"]
+BENS = list(BONUS_BENS) + ["TV", "Geladeira", "Máquina de lavar", "Internet"]
+
+
+def _bens_aleatorios(rng):
+    escolhidos = rng.sample(BENS, rng.randint(0, len(BENS)))
+    forma = rng.choice(["lista", "texto", "texto_sujo", "vazio"])
+    if forma == "lista":
+        return escolhidos
+    if forma == "texto":
+        return ", ".join(escolhidos)
+    if forma == "texto_sujo":
+        return " , ".join(escolhidos) + rng.choice(["", ",", ", , "])
+    return rng.choice(["", None])
+
+
+def _linha_aleatoria(rng):
+    banheiros = rng.randint(0, 6)
+    return {
+        "escolaridade_resp1": rng.choice(ESCOLARIDADES),
+        "escolaridade_resp2": rng.choice(ESCOLARIDADES),
+        "bens": _bens_aleatorios(rng),
+        "qtd_banheiros": rng.choice([banheiros, str(banheiros)]),
+        "qtd_pessoas_domicilio": rng.randint(1, 10),
+    }
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_batch_igual_ao_escalar(semente):
+    rng = random.Random(semente)
+    df = pd.DataFrame([_linha_aleatoria(rng) for _ in range(500)])
+    resultado = calcular_inse_batch(df)
+    for i, linha in df.iterrows():
+        esperado = calcular_inse(
+            linha["escolaridade_resp1"], linha["escolaridade_resp2"], linha["bens"],
+            linha["qtd_banheiros"], linha["qtd_pessoas_domicilio"],
+        )
+        obtido = (int(resultado.at[i, "inse_pontos"]), resultado.at[i, "inse_classificacao"])
+        assert obtido == esperado, f"linha {i}: {linha.to_dict()}"
+
+
+def test_batch_sem_colunas():
+    resultado = calcular_inse_batch(pd.DataFrame(index=range(3)))
+    assert resultado["inse_pontos"].tolist() == [0, 0, 0]
+    assert resultado["inse_classificacao"].tolist() == [calcular_inse(None, None, None, 0, 0)[1]] * 3
@@ -0,0 +1,33 @@
+import pandas as pd
+
+import particoes
+
+# ==============================================================================
+# 🧪 AGREGADOS PERSISTIDOS DOS ANOS LETIVOS ENCERRADOS
+# ==============================================================================
+
+PARTICAO = particoes.Particao(2025, "NAVE Lúcio Thome", "Novas_2025", "Rematriculas_2025")
+
+
+def _agregado():
+    novas = pd.DataFrame({
+        "nm_estudante": ["Ana", "Bruno"], "dt_nasc_estudante": ["2015-01-01", "2014-02-02"],
+        "inse_pontos": [7, 12], "inse_classificacao": ["Médio-Baixo", "Médio"],
+    })
+    return particoes.agregar(PARTICAO, {"Novas_2025": novas})
+
+
+def test_agregado_volta_igual_com_a_mesma_chave(tmp_path):
+    disco, agregado = particoes.AgregadosDisco(str(tmp_path), origem="sqlite"), _agregado()
+    disco.salvar(PARTICAO, [(3, 0), None], agregado)
+    lido = disco.carregar(PARTICAO, [(3, 0), None])
+    assert {k: v for k, v in lido.items() if not k.startswith("alunos")} == {k: v for k, v in agregado.items() if not k.startswith("alunos")}
+    assert (lido["alunos"] == agregado["alunos"]).all() and lido["alunos"].dtype == agregado["alunos"].dtype
+
+
+def test_agregado_invalido_com_outra_chave_ou_origem(tmp_path):
+    particoes.AgregadosDisco(str(tmp_path), origem="sqlite").salvar(PARTICAO, [(3, 0), None], _agregado())
+    assert particoes.AgregadosDisco(str(tmp_path), origem="sqlite").carregar(PARTICAO, [(4, 0), None]) is None
+    assert particoes.AgregadosDisco(str(tmp_path), origem="gsheets").carregar(PARTICAO, [(3, 0), None]) is None
+    particoes.AgregadosDisco(str(tmp_path), origem="sqlite").descartar()
+    assert particoes.AgregadosDisco(str(tmp_path), origem="sqlite").carregar(PARTICAO, [(3, 0), None]) is None
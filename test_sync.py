@@ -0,0 +1,79 @@
+import time
+
+from duplicados import chave_duplicata
+from planilha_memoria import PlanilhaMemoria
+from schema import HEADERS
+from storage import GoogleSheetsBackend
+from sync import SincronizadorDelta
+
+# ==============================================================================
+# 🧪 SINCRONIZAÇÃO INCREMENTAL SOBRE A PLANILHA EM MEMÓRIA
+# ==============================================================================
+# A PlanilhaMemoria faz o papel do gspread; `latencia` simula a rede da API.
+
+
+def _linha(nome, nascimento="2015-01-01", telefone="21999990000"):
+    valores = dict(zip(HEADERS, [""] * len(HEADERS)), nm_estudante=nome, dt_nasc_estudante=nascimento, telefone=telefone)
+    return [valores[c] for c in HEADERS]
+
+
+def _backend(n_linhas=0, latencia=0.0):
+    sh = PlanilhaMemoria(latencia)
+    backend = GoogleSheetsBackend(sh)
+    backend.init_headers("Aba")
+    backend.append_rows("Aba", [_linha(f"Aluno {i}") for i in range(n_linhas)])
+    return sh, backend
+
+
+def test_buscar_duplicata_nao_espera_a_rede():
+    sh, backend = _backend(10)
+    sinc = SincronizadorDelta(ttl=60)
+    sinc.obter(backend, "Aba")
+    # Escrita do próprio app (fila drenada): a aba fica alterada, mas a checagem não sincroniza na hora
+    backend.append_rows("Aba", [_linha("Aluno Novo")])
+    sinc.marcar_alterada("Aba")
+    sinc.registrar_salva("Aba", chave_duplicata("Aluno Novo", "2015-01-01", "21999990000"))
+    sh.latencia = 0.5
+    inicio = time.monotonic()
+    achados = sinc.buscar_duplicata(chave_duplicata("Aluno 3", "2015-01-01", "21999990000"), ["Aba"], backend)
+    recente = sinc.buscar_duplicata(chave_duplicata("Aluno Novo", "2015-01-01", "21999990000"), ["Aba"], backend)
+    assert time.monotonic() - inicio < 0.2
+    assert achados == [("Aba", 3)]
+    assert recente == [("Aba", None)]
+
+
+def test_forcar_traz_linhas_gravadas_fora_do_app():
+    sh, backend = _backend(47)
+    sinc = SincronizadorDelta(ttl=60)
+    assert len(sinc.obter(backend, "Aba")) == 47
+    backend.append_rows("Aba", [_linha(f"Externo {i}") for i in range(5)])
+    assert len(sinc.obter(backend, "Aba", forcar=True)) == 52
+
+
+def test_forcar_sem_mudanca_nao_le_a_aba_inteira():
+    sh, backend = _backend(20)
+    sinc = SincronizadorDelta(ttl=60)
+    sinc.obter(backend, "Aba")
+    sh.chamadas.clear()
+    sinc.obter(backend, "Aba", forcar=True)
+    assert "get_all_records" not in sh.chamadas and "values_batch_get" not in sh.chamadas
+
+
+def test_escrita_anunciada_vai_pelo_delta():
+    sh, backend = _backend(20)
+    sinc = SincronizadorDelta(ttl=60)
+    sinc.obter(backend, "Aba")
+    backend.append_rows("Aba", [_linha("Aluno Novo")])
+    sinc.marcar_alterada("Aba")
+    sh.chamadas.clear()
+    df = sinc.obter(backend, "Aba")
+    assert len(df) == 21 and df["nm_estudante"].iloc[-1] == "Aluno Novo"
+    assert sh.chamadas["get"] == 1 and "get_all_records" not in sh.chamadas
+
+
+def test_edicao_a_mao_no_meio_da_aba_recarrega():
+    sh, backend = _backend(20)
+    sinc = SincronizadorDelta(ttl=60)
+    sinc.obter(backend, "Aba")
+    sh.worksheet("Aba").update("A5", [_linha("Editado à mão")])
+    assert sinc.obter(backend, "Aba", forcar=True)["nm_estudante"].iloc[3] == "Editado à mão"